@@ -16,6 +16,10 @@ app.conf.CELERYBEAT_SCHEDULE = {
         'task': 'documents.tasks.check_document_expiry',
         'schedule': crontab(minute=0, hour='*/24'),
     },
+    'subscription_expiry': {
+        'task': 'subscriptions.tasks.check_subscription_expiry',
+        'schedule': crontab(minute=0, hour='*/24'),
+    },
 }
 
 app.conf.CELERY_TIMEZONE = 'UTC'
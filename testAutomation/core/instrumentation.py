@@ -0,0 +1,236 @@
+"""
+Query counts, database time, template render time and latency of every view.
+
+`InstrumentationMiddleware` measures each request and keeps the last samples of every
+URL name in a rolling window, so their percentiles can be read with
+`stats.get_percentiles(url_name)` and are logged each time a window fills up. Every
+sample is also logged at DEBUG and, with `INSTRUMENTATION_STATSD` set to 'host:port',
+sent to a statsd compatible server over UDP.
+
+Views declare the most queries a request should take with a `query_budget` class
+attribute. Requests over budget are logged as warnings, and
+`RequestTestCase.assertWithinQueryBudget` holds views to their budget in the tests.
+
+Django 1.11 has no `connection.execute_wrapper`, so queries are counted and timed by
+turning on the debug cursor for the request and reading `connection.queries_log`.
+"""
+import logging
+import math
+import socket
+from collections import Counter, defaultdict, deque, namedtuple
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+# Times are in milliseconds.
+Sample = namedtuple('Sample', ('queries', 'db_time', 'render_time', 'total_time'))
+
+
+def get_query_budget(view):
+    """Return the `query_budget` of a view class or of the view it's `as_view()`."""
+    view_class = getattr(view, 'view_class', view)
+    return getattr(view_class, 'query_budget', None)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of sorted values."""
+    rank = math.ceil(len(values) * percent / 100)
+    return values[max(rank - 1, 0)]
+
+
+class RollingStats:
+    """The last `size` samples of each URL name in this process."""
+    def __init__(self, size):
+        self.size = size
+        self.samples = defaultdict(lambda: deque(maxlen=self.size))
+        self.counts = Counter()
+
+    def add(self, name, sample):
+        """Add a sample and return if it completes a new window of the URL name."""
+        self.samples[name].append(sample)
+        self.counts[name] += 1
+        return self.counts[name] % self.size == 0
+
+    def get_percentiles(self, name):
+        """
+        Return the percentiles of the recent samples of a URL name, of the form:
+        {
+            'queries': {50: 4, 95: 6, 99: 9},
+            'db_time': {50: 3.1, 95: 5.6, 99: 12.0},
+            'render_time': {...},
+            'total_time': {...},
+        }
+        """
+        # Copied as other threads may be adding to it.
+        samples = list(self.samples.get(name, ()))
+        if not samples:
+            return {}
+        result = {}
+        for field in Sample._fields:
+            values = sorted(getattr(sample, field) for sample in samples)
+            result[field] = {
+                percent: percentile(values, percent)
+                for percent in PERCENTILES
+            }
+        return result
+
+    def get_names(self):
+        return sorted(self.samples)
+
+    def clear(self):
+        self.samples.clear()
+        self.counts.clear()
+
+
+stats = RollingStats(settings.INSTRUMENTATION_WINDOW)
+
+
+class StatsdSink:
+    """
+    Send the samples to a statsd compatible server without waiting for it.
+
+    Each measure is sent as a timer, `<prefix>.<url name>.<measure>`, so the server
+    works out the percentiles across every process.
+    """
+    def __init__(self, address, prefix):
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, name, sample):
+        name = name.replace(':', '_').replace('.', '_')
+        return '\n'.join(
+            '{}.{}.{}:{}|ms'.format(self.prefix, name, field, round(value, 3))
+            for field, value in zip(Sample._fields, sample)
+        )
+
+    def send(self, name, sample):
+        try:
+            self.socket.sendto(self.format(name, sample).encode(), self.address)
+        except OSError:
+            logger.debug('Could not send %s to statsd', name, exc_info=True)
+
+
+class MeasuredStream:
+    """
+    The content of a streaming response, calling `on_close` once when it's closed.
+
+    The response closes it after it's sent, even if it was never read.
+    """
+    def __init__(self, content, on_close):
+        self.content = iter(content)
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.content)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.on_close()
+
+
+class InstrumentationMiddleware(MiddlewareMixin):
+    """
+    Measure each request to a named URL and record it in `stats`.
+
+    Best placed first so the time of the other middleware is included.
+    """
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.sink = None
+        if settings.INSTRUMENTATION_STATSD:
+            self.sink = StatsdSink(
+                settings.INSTRUMENTATION_STATSD,
+                settings.INSTRUMENTATION_STATSD_PREFIX,
+            )
+
+    def process_request(self, request):
+        request._instrumentation = {
+            'start': perf_counter(),
+            'queries_start': len(connection.queries_log),
+            'force_debug_cursor': connection.force_debug_cursor,
+            'render_time': 0,
+            'name': None,
+            'budget': None,
+        }
+        connection.force_debug_cursor = True
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = getattr(request, '_instrumentation', None)
+        if state is not None:
+            state['name'] = request.resolver_match.view_name
+            state['budget'] = get_query_budget(view_func)
+
+    def process_template_response(self, request, response):
+        state = getattr(request, '_instrumentation', None)
+        if state is not None:
+            render_start = perf_counter()
+
+            def rendered(response):
+                state['render_time'] += perf_counter() - render_start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response):
+        state = getattr(request, '_instrumentation', None)
+        if state is None:
+            return response
+
+        if response.streaming:
+            # Streamed exports query as they are sent, so measure once the stream
+            # is closed by the server.
+            response.streaming_content = MeasuredStream(
+                response.streaming_content,
+                lambda: self.finish(state),
+            )
+        else:
+            self.finish(state)
+        return response
+
+    def finish(self, state):
+        connection.force_debug_cursor = state['force_debug_cursor']
+
+        queries = list(connection.queries_log)[state['queries_start']:]
+        sample = Sample(
+            queries=len(queries),
+            db_time=sum(float(query['time']) for query in queries) * 1000,
+            render_time=state['render_time'] * 1000,
+            total_time=(perf_counter() - state['start']) * 1000,
+        )
+        # Requests that didn't resolve to a view (like 404s) aren't recorded.
+        if state['name'] is not None:
+            self.record(state['name'], sample, state['budget'])
+
+    def record(self, name, sample, budget=None):
+        logger.debug(
+            '%s queries=%d db=%.1fms render=%.1fms total=%.1fms',
+            name,
+            *sample
+        )
+        if budget is not None and sample.queries > budget:
+            logger.warning(
+                '%s took %d queries, over its budget of %d',
+                name,
+                sample.queries,
+                budget,
+            )
+
+        if stats.add(name, sample):
+            logger.info('%s percentiles %s', name, stats.get_percentiles(name))
+
+        if self.sink is not None:
+            self.sink.send(name, sample)
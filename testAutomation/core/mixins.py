@@ -4,9 +4,10 @@ from collections import OrderedDict
 
 from django.core.exceptions import ImproperlyConfigured
 from django.http import Http404
-from rolepermissions.roles import get_user_roles
 
-from .utils import Sidebar
+from users.roles import get_roles
+
+from .utils import get_sidebar
 
 
 class AppMixin:
@@ -24,26 +25,10 @@ class AppMixin:
                 "You must specify 'sidebar_item' or override 'get_sidebar'."
             )
 
-        filtered_sidebar = OrderedDict()
-
         if user.is_anonymous:
-            return filtered_sidebar
-
-        sidebar = Sidebar().set_sidebar_item_active(
-            self.sidebar_section,
-            self.sidebar_item
-        )
-
-        user_roles = set([role.get_name() for role in get_user_roles(user)])
-
-        for type in sidebar:
-            filtered_sidebar[type] = OrderedDict()
-            for item in sidebar[type]:
-                roles = set(sidebar[type][item]['roles'])
-                if(user_roles & roles):
-                    filtered_sidebar[type][item] = sidebar[type][item]
+            return OrderedDict()
 
-        return filtered_sidebar
+        return get_sidebar(get_roles(user), self.sidebar_section, self.sidebar_item)
 
     def get_page_title(self):
         if self.page_title is None:
@@ -4,6 +4,8 @@ from unittest.runner import TextTestRunner
 from colour_runner.result import ColourTextTestResult
 from django.test.runner import DiscoverRunner
 
+from core import celery_app
+
 
 class TimedColourTextTestResult(ColourTextTestResult):
     def __init__(self, *args, **kwargs):
@@ -67,6 +69,12 @@ class TestRunner(DiscoverRunner):
             help='Tests that take longer than this threshold will be output.',
         )
 
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Tasks queued by the code under test go to an in-memory broker, so a test
+        # that doesn't patch `delay()` can't block on connecting to a real one.
+        celery_app.conf.broker_url = 'memory://'
+
     def get_test_runner_kwargs(self):
         kwargs = super().get_test_runner_kwargs()
         kwargs['slow_test_threshold'] = self.slow_test_threshold
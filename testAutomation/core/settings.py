@@ -109,6 +109,7 @@ MIGRATION_MODULES = {
 }
 
 MIDDLEWARE_CLASSES = (
+    'core.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -260,6 +261,26 @@ RAVEN_CONFIG = {
     'release': os.environ.get('DISTELLI_RELREVISION'),
 }
 
+# Per view query and latency instrumentation, see `core.instrumentation`.
+INSTRUMENTATION_WINDOW = int(os.environ.get('INSTRUMENTATION_WINDOW', 500))
+INSTRUMENTATION_STATSD = os.environ.get('INSTRUMENTATION_STATSD')
+INSTRUMENTATION_STATSD_PREFIX = os.environ.get('INSTRUMENTATION_STATSD_PREFIX', 'views')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 ROLEPERMISSIONS_MODULE = 'core.roles'
 
@@ -50,17 +50,19 @@
     var assessment = app.assessment = app.assessment || {};
 
     // Callback to set elements required based on their value and the
-    // `required-on-change` data
+    // `required-on-change` data, the values requiring each field of the same form.
     // Also hides the due_date and sets it disabled when not required.
     assessment.requiredOnChange = function() {
         var $el = $(this);
         var data = $el.data('required-on-change');
         var value = $el.val();
-        $.each(data, function(lookup, values) {
+        // The fields share the prefix of the `value` field, e.g. `level_1_2-`.
+        var prefix = $el.attr('name').replace(/value$/, '');
+        $.each(data, function(fieldName, values) {
             var required = $.inArray(value, values) > -1;
-            var target = $(lookup);
+            var target = $('#div_id_' + prefix + fieldName);
             var targetValues = {required: required};
-            var isDueDate = (lookup.indexOf('due_date')) >= 0 ? true : false;
+            var isDueDate = fieldName === 'due_date';
             if(isDueDate) {
                 targetValues.disabled = !required;
                 target.toggle(required);
@@ -94,6 +96,21 @@
     };
 
 
+    // Load the answer forms of a hidden level the first time it is shown
+    assessment.loadLevel = function (element) {
+        var $level = $(element).find('.js-section-level[data-url]');
+        if (!$level.length) {
+            return;
+        }
+        var url = $level.data('url');
+        $level.removeAttr('data-url');
+        $level.load(url, function() {
+            app.initGlobal($level);
+            assessment.initAnswerForm($level);
+        });
+    };
+
+
     // load method called once on page load
     // Used for one time initialisation code (e.g. `$(document.body).on()`)
     assessment.load = function () {
@@ -124,6 +141,7 @@
             var $box = $('#level_' + $level);
             if ($btn_text.toLowerCase() === 'show') {
                 $(this).val('Hide');
+                assessment.loadLevel($box);
                 $box.collapse('show');
                 if($level_icon.length) {
                     $level_icon.addClass('fa-rotate-90');
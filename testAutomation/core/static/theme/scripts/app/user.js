@@ -5,47 +5,45 @@ window.user = {};
 
     var nav_el = '#user-nav',
         list_el = '#user-list',
-        tagFilter = '',
-        filter = '',
-        navList, list, noticed = false;
-    $(document).on('click', nav_el + ' a', function() {
-        tagFilter = $(this).find('.nav-text').text();
-        filter = '';
-        if (tagFilter == 'All') tagFilter = '';
-        $('input.search').attr('placeholder', 'Search ' + tagFilter);
-        update(list);
-        $('#content-aside').modal('hide');
+        navList, searchTimeout, request;
+
+    // Replace the results with the first page of organisations matching the form.
+    $(document).on('input', list_el + ' input.search', function() {
+        var form = $(this).closest('form');
+        clearTimeout(searchTimeout);
+        searchTimeout = setTimeout(function() {
+            load(form.data('results-url') + '?' + form.serialize(), false);
+        }, 300);
     });
 
-    $(document).on('click', '#filter a', function() {
-        filter = $(this).text().toLowerCase();
-        update(list);
+    $(document).on('submit', list_el + ' form', function(e) {
+        e.preventDefault();
+        clearTimeout(searchTimeout);
+        load($(this).data('results-url') + '?' + $(this).serialize(), false);
     });
 
-    function update(list) {
-        if (!list.filter) return;
-        list.filter(function(item) {
-            if (item.values().tag.indexOf(tagFilter) > -1) {
-                if (filter !== '') {
-                    if (item.values()['item-title'].toLowerCase().indexOf(filter) == 0) {
-                        return true;
-                    } else {
-                        return false;
-                    }
-                } else {
-                    return true;
-                }
+    // Append the next page of organisations.
+    $(document).on('click', list_el + ' [data-next-url]', function(e) {
+        e.preventDefault();
+        load($(this).data('next-url'), true);
+    });
+
+    function load(url, append) {
+        if (request) request.abort();
+        request = $.ajax({
+            url: url,
+            headers: {'X-Requested-With': 'XMLHttpRequest'}
+        }).done(function(html) {
+            var results = $('.list', list_el);
+            if (append) {
+                $('.load-more', results).remove();
+                results.append(html);
             } else {
-                return false;
+                results.html(html);
             }
+            var count = $('.list-item', results).not('.load-more').length;
+            $('.no-result', list_el).toggleClass('hide', count > 0);
         });
-
-        list.update();
-        $('.list', list_el).removeClass('hide').addClass('animate fadeIn');
-    }
-
-    function updateCount(count) {
-        $('#count').text(count);
     }
 
     var init = function() {
@@ -63,30 +61,6 @@ window.user = {};
                 }
             ]
         });
-
-        // list
-        if ($(list_el).length) {
-            list = new List(list_el.substr(1), {
-                valueNames: [
-                    'item-title',
-                    'item-except',
-                    'tag'
-                ]
-            });
-
-            list.on('updated', function(list) {
-                updateCount(list.matchingItems.length);
-                if (list.matchingItems.length > 0) {
-                    $('.no-result').addClass('hide');
-                } else {
-                    $('.no-result').removeClass('hide');
-                }
-            });
-
-            updateCount(list.items.length);
-            update(list);
-        }
-
     }
 
     // for ajax to init again
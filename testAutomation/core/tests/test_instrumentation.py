@@ -0,0 +1,200 @@
+from unittest.mock import patch
+
+from django.core.signals import request_finished
+from django.core.urlresolvers import resolve, reverse
+from django.db import close_old_connections, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.template.response import SimpleTemplateResponse
+from django.test import RequestFactory, TestCase
+
+from users.models import User
+from users.views import DirectoryView
+from .. import instrumentation
+from ..instrumentation import (
+    get_query_budget,
+    InstrumentationMiddleware,
+    percentile,
+    RollingStats,
+    Sample,
+    StatsdSink,
+)
+
+
+class TestGetQueryBudget(TestCase):
+    def test_view_class(self):
+        self.assertEqual(get_query_budget(DirectoryView), DirectoryView.query_budget)
+
+    def test_as_view(self):
+        view = DirectoryView.as_view()
+        self.assertEqual(get_query_budget(view), DirectoryView.query_budget)
+
+    def test_none(self):
+        self.assertIsNone(get_query_budget(lambda request: None))
+
+
+class TestPercentile(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 11))
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 95), 10)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_single(self):
+        self.assertEqual(percentile([3], 99), 3)
+
+
+class TestRollingStats(TestCase):
+    def test_add(self):
+        stats = RollingStats(2)
+        self.assertFalse(stats.add('home', Sample(1, 1, 1, 1)))
+        self.assertTrue(stats.add('home', Sample(2, 2, 2, 2)))
+        self.assertFalse(stats.add('home', Sample(3, 3, 3, 3)))
+        # Only the window is kept.
+        self.assertEqual(list(stats.samples['home']), [(2, 2, 2, 2), (3, 3, 3, 3)])
+
+    def test_get_percentiles(self):
+        stats = RollingStats(100)
+        for queries in range(1, 101):
+            stats.add('home', Sample(queries, queries / 10, 0, queries * 2))
+
+        result = stats.get_percentiles('home')
+        self.assertEqual(result['queries'], {50: 50, 95: 95, 99: 99})
+        self.assertEqual(result['db_time'], {50: 5, 95: 9.5, 99: 9.9})
+        self.assertEqual(result['render_time'], {50: 0, 95: 0, 99: 0})
+        self.assertEqual(result['total_time'], {50: 100, 95: 190, 99: 198})
+
+    def test_get_percentiles_empty(self):
+        stats = RollingStats(2)
+        self.assertEqual(stats.get_percentiles('home'), {})
+        self.assertEqual(stats.get_names(), [])
+
+
+class TestStatsdSink(TestCase):
+    def setUp(self):
+        self.sink = StatsdSink('localhost:8125', 'views')
+
+    def tearDown(self):
+        self.sink.socket.close()
+
+    def test_format(self):
+        lines = self.sink.format('users:directory', Sample(4, 1.5, 2, 10.1234))
+        self.assertEqual(lines.split('\n'), [
+            'views.users_directory.queries:4|ms',
+            'views.users_directory.db_time:1.5|ms',
+            'views.users_directory.render_time:2|ms',
+            'views.users_directory.total_time:10.123|ms',
+        ])
+
+    def test_send(self):
+        with patch.object(self.sink, 'socket') as mock_socket:
+            self.sink.send('home', Sample(1, 1, 1, 1))
+        data, address = mock_socket.sendto.call_args[0]
+        self.assertEqual(address, ('localhost', 8125))
+        self.assertIn(b'views.home.queries:1|ms', data)
+
+    def test_send_error(self):
+        with patch.object(self.sink, 'socket') as mock_socket:
+            mock_socket.sendto.side_effect = OSError
+            self.sink.send('home', Sample(1, 1, 1, 1))
+
+
+class TestInstrumentationMiddleware(TestCase):
+    def setUp(self):
+        self.stats = RollingStats(10)
+        patcher = patch.object(instrumentation, 'stats', self.stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.middleware = InstrumentationMiddleware()
+        self.request = RequestFactory().get(reverse('directory'))
+        self.request.resolver_match = resolve(reverse('directory'))
+
+    def process(self, response, queries=0):
+        self.middleware.process_request(self.request)
+        self.middleware.process_view(self.request, DirectoryView.as_view(), (), {})
+        for _ in range(queries):
+            User.objects.count()
+        if hasattr(response, 'render'):
+            response = self.middleware.process_template_response(self.request, response)
+            response.render()
+        return self.middleware.process_response(self.request, response)
+
+    def close(self, response):
+        # Like the test client, keep the test's connection open when the response
+        # sends request_finished.
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+
+    def test_process(self):
+        self.process(HttpResponse(), queries=2)
+
+        sample, = self.stats.samples['directory']
+        self.assertEqual(sample.queries, 2)
+        self.assertGreaterEqual(sample.db_time, 0)
+        self.assertEqual(sample.render_time, 0)
+        self.assertGreater(sample.total_time, 0)
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_process_template_response(self):
+        template = engines['django'].from_string('Rendered')
+        self.process(SimpleTemplateResponse(template))
+
+        sample, = self.stats.samples['directory']
+        self.assertGreater(sample.render_time, 0)
+        self.assertLessEqual(sample.render_time, sample.total_time)
+
+    def test_process_streaming(self):
+        """Streamed responses are measured once they are sent."""
+        def content():
+            for _ in range(3):
+                User.objects.count()
+                yield b'row\n'
+
+        response = self.process(StreamingHttpResponse(content()))
+        self.assertEqual(self.stats.get_names(), [])
+        self.assertTrue(connection.force_debug_cursor)
+
+        self.assertEqual(b''.join(response.streaming_content), b'row\n' * 3)
+        self.close(response)
+
+        sample, = self.stats.samples['directory']
+        self.assertEqual(sample.queries, 3)
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_process_streaming_unread(self):
+        response = self.process(StreamingHttpResponse(iter([b'row'])))
+        self.close(response)
+        self.assertEqual(len(self.stats.samples['directory']), 1)
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_process_unresolved(self):
+        self.middleware.process_request(self.request)
+        self.middleware.process_response(self.request, HttpResponse(status=404))
+        self.assertEqual(self.stats.get_names(), [])
+
+    def test_over_budget(self):
+        budget = DirectoryView.query_budget
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            self.process(HttpResponse(), queries=budget + 1)
+        self.assertIn('over its budget of {}'.format(budget), logs.output[0])
+
+    def test_percentiles_logged(self):
+        self.stats.size = 1
+        self.stats.samples.clear()
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            self.process(HttpResponse())
+        self.assertIn('directory percentiles', logs.output[0])
+
+    def test_statsd(self):
+        with self.settings(INSTRUMENTATION_STATSD='localhost:8125'):
+            self.middleware = InstrumentationMiddleware()
+        self.addCleanup(self.middleware.sink.socket.close)
+
+        with patch.object(self.middleware.sink, 'send') as send:
+            self.process(HttpResponse())
+        name, sample = send.call_args[0]
+        self.assertEqual(name, 'directory')
@@ -78,6 +78,19 @@ class TestAppMixin(RequestTestCase):
         self.assertTrue('invites' in sidebar['main'])
         self.assertTrue('users' in sidebar['settings'])
 
+    def test_get_sidebar_cached(self):
+        assign_role(self.user, 'manager')
+        self.view.sidebar_item = 'dashboard'
+        self.view.get_sidebar(self.user)
+
+        self.view.sidebar_item = 'faq'
+        with self.assertNumQueries(0):
+            sidebar = self.view.get_sidebar(self.user)
+
+        self.assertEqual(sidebar['main']['faq']['class'], 'active')
+        self.assertNotIn('class', sidebar['main']['dashboard'])
+        self.assertTrue('invites' in sidebar['main'])
+
     def test_get_sidebar_anonymous(self):
         self.view.sidebar_item = 'dashboard'
         sidebar = self.view.get_sidebar(AnonymousUser())
@@ -4,12 +4,16 @@ from io import BytesIO
 
 from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from incuna_test_utils.testcases.request import BaseRequestTestCase
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import ui
 from selenium.webdriver.support import expected_conditions as EC
 
+from core.instrumentation import get_query_budget
+from surveys import structure
 from users.tests.factories import UserFactory
 
 from selenium.webdriver.chrome.options import Options
@@ -92,6 +96,12 @@ class AnonymouseTestMixin:
 class RequestTestCase(BaseRequestTestCase):
     user_factory = UserFactory
 
+    def setUp(self):
+        super().setUp()
+        # Survey structures are kept in process, and one built in an earlier test
+        # from rows that were rolled back would otherwise still be read.
+        structure.invalidate()
+
     def create_request_ajax(self, *args, **kwargs):
         return self.create_request(
             *args,
@@ -99,6 +109,32 @@ class RequestTestCase(BaseRequestTestCase):
             **kwargs
         )
 
+    def assertWithinQueryBudget(self, view, request, *args, **kwargs):
+        """
+        Render the response of a view to the request and fail if it takes more
+        queries than the `query_budget` of the view. Returns the response.
+        """
+        budget = get_query_budget(view)
+        if budget is None:
+            self.fail('{} has no query_budget'.format(view))
+
+        with CaptureQueriesContext(connection) as captured:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+
+        queries = '\n'.join(query['sql'] for query in captured.captured_queries)
+        self.assertLessEqual(
+            len(captured),
+            budget,
+            '{} queries is over the budget of {}:\n{}'.format(
+                len(captured),
+                budget,
+                queries,
+            ),
+        )
+        return response
+
 
 class WaitForPageLoad:
     """
@@ -79,3 +79,38 @@ class Sidebar():
     def set_sidebar_item_active(self, section, item):
         self.sidebar[section][item]['class'] = 'active'
         return self.sidebar
+
+
+# Sidebars already built by this process, keyed by a frozenset of role names. They're
+# shared between requests so must never be changed.
+_sidebars = {}
+
+
+def get_sidebar(roles, section, item):
+    """
+    Return the sidebar items available to any of the roles with `item` of `section`
+    marked as active.
+
+    The items of each combination of roles are only built, and their urls reversed, once
+    per process. Only the sections and the active item are copied for each call.
+    """
+    roles = frozenset(roles)
+    sidebar = _sidebars.get(roles)
+    if sidebar is None:
+        sidebar = OrderedDict(
+            (
+                name,
+                OrderedDict(
+                    (key, value)
+                    for key, value in items.items()
+                    if roles & set(value['roles'])
+                ),
+            )
+            for name, items in Sidebar().get().items()
+        )
+        _sidebars[roles] = sidebar
+
+    sidebar = OrderedDict((name, OrderedDict(items)) for name, items in sidebar.items())
+    if item in sidebar[section]:
+        sidebar[section][item] = dict(sidebar[section][item], **{'class': 'active'})
+    return sidebar
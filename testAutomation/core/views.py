@@ -1,11 +1,11 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, render
 from django.views.generic import TemplateView
-from rolepermissions.checkers import has_role
 
 from documents.models import Document
 from surveys.models import Survey
 from users.models import Invitation
+from users.roles import has_role
 
 from .mixins import AppMixin
 
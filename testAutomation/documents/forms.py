@@ -8,6 +8,30 @@ from django import forms
 from .models import Document
 
 
+class DocumentLookupSelect(forms.Select):
+    """
+    A select for a `ModelChoiceField` of documents that only renders the selected
+    document. The rest are searched by select2 through the `document-lookup` view.
+    """
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        field = choices.field
+        selected = [pk for pk in value if pk]
+        try:
+            documents = list(choices.queryset.filter(pk__in=selected))
+        except (TypeError, ValueError):
+            documents = []
+
+        self.choices = [('', field.empty_label)] + [
+            (field.prepare_value(document), field.label_from_instance(document))
+            for document in documents
+        ]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+
 class AddDocumentForm(forms.ModelForm):
     class Meta:
         model = Document
@@ -1,59 +1,86 @@
 from __future__ import absolute_import, unicode_literals
 
+from collections import defaultdict
 from datetime import date, timedelta
 
 from celery import shared_task
 
-from dateutil.relativedelta import relativedelta
-
 from django.contrib.sites.models import Site
-
-from incuna_mail import send
-
-from rolepermissions.checkers import has_role
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
 
 from documents.models import Document
 from users.models import User
 
 
-def _send_notification(documents):
-    site = Site.objects.get_current()
-    subject = 'Action required - Document expiry notice.'
+EXPIRY_DAYS = (14, 0)
+
+
+def _get_expires_in_message(expiry, today):
+    expires_in_days = (expiry - today).days
+    if expires_in_days == 0:
+        return "today"
+    return "in {} days".format(expires_in_days)
+
+
+def _get_digests(today):
+    """
+    Return each admin and manager with a list of their organisation's documents that
+    expire today or in 14 days.
+
+    Uses two queries however many documents and organisations there are.
+    """
+    documents = Document.objects.filter(
+        expiry__in=[today + timedelta(days=days) for days in EXPIRY_DAYS],
+    ).order_by('expiry', 'name')
+    documents_lookup = defaultdict(list)
     for document in documents:
-        users = User.objects.filter(organisation=document.organisation)
-        for user in users:
-            if has_role(user, ['admin', 'manager']):
-                expires_in_days = relativedelta(document.expiry, date.today()).days
-                if expires_in_days == 0:
-                    expires_in_message = "today"
-                else:
-                    expires_in_message = "in {} days".format(expires_in_days)
-                context = {
-                    'site': site,
-                    'site_domain': site.domain,
-                    'site_name': site.name,
-                    'email': user.email,
-                    'document_expiry': document.expiry,
-                    'document': document.name,
-                    'organisation_name': user.organisation.legal_name,
-                    'user_name': user.name,
-                    'expires_in_message': expires_in_message,
-                }
-                send(
-                    to=user.email,
-                    subject=subject,
-                    template_name='documents/document_expiry_email.txt',
-                    context=context,
-                )
+        documents_lookup[document.organisation_id].append(document)
+    if not documents_lookup:
+        return []
+
+    users = User.objects.filter(
+        organisation_id__in=documents_lookup,
+    ).with_role('admin', 'manager').order_by('pk')
+    return [(user, documents_lookup[user.organisation_id]) for user in users]
 
 
-def _to_be_expired(expiry_days=14):
-    expiry_date = date.today() + timedelta(days=expiry_days)
-    documents = Document.objects.filter(expiry=expiry_date)
-    _send_notification(documents)
+def _send_notification(digests, today):
+    """Send each user one email listing all their expiring documents."""
+    site = Site.objects.get_current()
+    subject = 'Action required - Document expiry notice.'
+    template = get_template('documents/document_expiry_email.txt')
+    messages = []
+    for user, documents in digests:
+        context = {
+            'site': site,
+            'site_domain': site.domain,
+            'site_name': site.name,
+            'email': user.email,
+            'user_name': user.name,
+            'documents': [
+                {
+                    'name': document.name,
+                    'expiry': document.expiry,
+                    'expires_in_message': _get_expires_in_message(
+                        document.expiry,
+                        today,
+                    ),
+                }
+                for document in documents
+            ],
+        }
+        messages.append(EmailMessage(
+            subject=subject,
+            body=template.render(context),
+            to=[user.email],
+        ))
+    if not messages:
+        return 0
+    return get_connection().send_messages(messages)
 
 
 @shared_task
 def check_document_expiry():
-    _to_be_expired(expiry_days=14)
-    _to_be_expired(expiry_days=0)
+    today = date.today()
+    _send_notification(_get_digests(today), today)
@@ -1,6 +1,9 @@
+from django import forms
 from django.test import TestCase
 
-from ..forms import AddDocumentForm, EditDocumentForm
+from .factories import DocumentFactory
+from ..forms import AddDocumentForm, DocumentLookupSelect, EditDocumentForm
+from ..models import Document
 
 
 class TestAddDocumentForm(TestCase):
@@ -28,3 +31,30 @@ class TestEditDocumentForm(TestCase):
         form = self.form(data={})
         self.assertFalse(form.is_valid())
         self.assertLessEqual(required_fields, form.errors.keys())
+
+
+class TestDocumentLookupSelect(TestCase):
+    def setUp(self):
+        self.document, self.other = DocumentFactory.create_batch(2)
+        self.field = forms.ModelChoiceField(
+            queryset=Document.objects.all(),
+            widget=DocumentLookupSelect,
+        )
+
+    def test_render_selected(self):
+        with self.assertNumQueries(1):
+            html = self.field.widget.render('document', self.document.pk)
+
+        self.assertIn(self.document.name, html)
+        self.assertNotIn(self.other.name, html)
+
+    def test_render_empty(self):
+        with self.assertNumQueries(0):
+            html = self.field.widget.render('document', None)
+
+        self.assertNotIn(self.document.name, html)
+        self.assertNotIn(self.other.name, html)
+
+    def test_render_invalid(self):
+        html = self.field.widget.render('document', 'invalid')
+        self.assertNotIn(self.document.name, html)
@@ -1,5 +1,6 @@
 from datetime import date, timedelta
 
+from django.contrib.sites.models import Site
 from django.core import mail
 from django.test import override_settings, TestCase
 
@@ -72,3 +73,48 @@ class TestDocumentCeleryTasks(TestCase):
 
         check_document_expiry()
         self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_email_digest(self):
+        """Each user gets one email listing every expiring document."""
+        manager = UserFactory.create(organisation=self.organisation)
+        assign_role(manager, 'manager')
+        UserFactory.create(organisation=self.organisation)
+        expiring_today = DocumentFactory.create(
+            expiry=date.today(),
+            organisation=self.organisation
+        )
+        expiring_later = DocumentFactory.create(
+            expiry=date.today() + timedelta(days=14),
+            organisation=self.organisation
+        )
+
+        check_document_expiry()
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted([self.user.email, manager.email]),
+        )
+        body = mail.outbox[0].body
+        self.assertIn('"{}" expires today'.format(expiring_today.name), body)
+        self.assertIn('"{}" expires in 14 days'.format(expiring_later.name), body)
+
+    def test_send_email_organisations(self):
+        """Documents of every organisation are found with two queries."""
+        other_user = UserFactory.create()
+        assign_role(other_user, 'admin')
+        DocumentFactory.create(expiry=date.today(), organisation=self.organisation)
+        other_document = DocumentFactory.create(
+            expiry=date.today(),
+            organisation=other_user.organisation
+        )
+        Site.objects.get_current()
+
+        with self.assertNumQueries(2):
+            check_document_expiry()
+
+        self.assertEqual(len(mail.outbox), 2)
+        message = next(message for message in mail.outbox if message.to == [
+            other_user.email,
+        ])
+        self.assertIn(other_document.name, message.body)
@@ -10,3 +10,10 @@ class TestDocuments(URLTestCase):
             expected_url='/document/',
             url_name='document-home',
         )
+
+    def test_document_lookup(self):
+        self.assert_url_matches_view(
+            view=views.DocumentLookup,
+            expected_url='/document/lookup',
+            url_name='document-lookup',
+        )
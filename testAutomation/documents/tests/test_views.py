@@ -1,6 +1,8 @@
+import json
 from datetime import date
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
 
 from core.tests.utils import AnonymouseTestMixin, RequestTestCase
 from users.tests.factories import UserFactory
@@ -116,3 +118,68 @@ class TestDocumentEdit(AnonymouseTestMixin, RequestTestCase):
             'Failed to update document',
             request._messages.store[0],
         )
+
+
+class TestDocumentLookup(AnonymouseTestMixin, RequestTestCase):
+    view = views.DocumentLookup
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        self.policy = DocumentFactory.create(
+            name='Water policy',
+            organisation=self.user.organisation,
+        )
+        self.procedure = DocumentFactory.create(
+            name='Audit procedure',
+            organisation=self.user.organisation,
+        )
+        DocumentFactory.create(name='Other policy')
+
+    def get(self, **data):
+        view = self.view.as_view()
+        request = self.create_request_ajax(user=self.user, data=data)
+        response = view(request)
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_get_anonymous(self):
+        view = self.view.as_view()
+        request = self.create_request_ajax(auth=False)
+        response = view(request)
+        self.assertRedirectToLogin(response)
+
+    def test_get_not_ajax(self):
+        view = self.view.as_view()
+        request = self.create_request(user=self.user)
+        with self.assertRaises(Http404):
+            view(request)
+
+    def test_get(self):
+        content = self.get()
+        self.assertEqual(content, {
+            'results': [
+                {'id': self.procedure.pk, 'text': 'Audit procedure'},
+                {'id': self.policy.pk, 'text': 'Water policy'},
+            ],
+            'pagination': {'more': False},
+        })
+
+    def test_get_term(self):
+        content = self.get(term='POLICY')
+        self.assertEqual(content['results'], [
+            {'id': self.policy.pk, 'text': 'Water policy'},
+        ])
+
+    def test_get_pages(self):
+        DocumentFactory.create_batch(
+            self.view.paginate_by,
+            organisation=self.user.organisation,
+        )
+
+        content = self.get()
+        self.assertEqual(len(content['results']), self.view.paginate_by)
+        self.assertTrue(content['pagination']['more'])
+
+        content = self.get(page=2)
+        self.assertEqual(len(content['results']), 2)
+        self.assertFalse(content['pagination']['more'])
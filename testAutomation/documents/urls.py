@@ -1,8 +1,9 @@
 from django.conf.urls import url
 
-from .views import DocumentEdit, DocumentHome
+from .views import DocumentEdit, DocumentHome, DocumentLookup
 
 urlpatterns = [
     url(r'^$', DocumentHome.as_view(), name='document-home'),
     url(r'^edit/(?P<pk>\d+)/?$', DocumentEdit.as_view(), name='document-edit'),
+    url(r'^lookup/?$', DocumentLookup.as_view(), name='document-lookup'),
 ]
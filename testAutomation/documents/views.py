@@ -2,9 +2,10 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 from django.core.urlresolvers import reverse_lazy
-from django.views.generic import CreateView, UpdateView
+from django.http import JsonResponse
+from django.views.generic import CreateView, ListView, UpdateView
 
-from core.mixins import AppMixin
+from core.mixins import AjaxMixin, AppMixin
 
 from .forms import AddDocumentForm, EditDocumentForm
 from .models import Document
@@ -74,3 +75,33 @@ class DocumentEdit(DocumentMixin, UpdateView):
         ), extra_tags='show-icon')
 
         return super().form_invalid(form)
+
+
+class DocumentLookup(LoginRequiredMixin, AjaxMixin, ListView):
+    """
+    Search the organisation's documents by name for select2's `ajax` option.
+
+    Takes select2's `term` and `page` parameters and replies with
+    `{"results": [{"id": 1, "text": "Name"}], "pagination": {"more": true}}`.
+    """
+    paginate_by = 20
+
+    def get_queryset(self):
+        queryset = Document.objects.filter(
+            organisation_id=self.request.user.organisation_id,
+        ).only('name').order_by('name', 'pk')
+
+        term = self.request.GET.get('term', '').strip()
+        if term:
+            queryset = queryset.filter(name__icontains=term)
+        return queryset
+
+    def render_to_response(self, context, **response_kwargs):
+        results = [
+            {'id': document.pk, 'text': document.name}
+            for document in context['object_list']
+        ]
+        return JsonResponse({
+            'results': results,
+            'pagination': {'more': context['page_obj'].has_next()},
+        })
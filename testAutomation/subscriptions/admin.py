@@ -58,6 +58,19 @@ class OrderAdmin(admin.ModelAdmin):
         AssessmentPurchaseInline,
     ]
     list_filter = ('organisation', 'status',)
+    actions = ['approve_orders', 'cancel_orders']
+
+    def _set_status(self, request, queryset, status, verb):
+        count = queryset.set_status(status)
+        self.message_user(request, '{} {} order(s).'.format(verb, count))
+
+    def approve_orders(self, request, queryset):
+        self._set_status(request, queryset, Order.STATUS_APPROVED, 'Approved')
+    approve_orders.short_description = 'Mark selected orders as paid'
+
+    def cancel_orders(self, request, queryset):
+        self._set_status(request, queryset, Order.STATUS_CANCELED, 'Canceled')
+    cancel_orders.short_description = 'Cancel selected orders'
 
 
 class AssessmentPackageAdmin(admin.ModelAdmin):
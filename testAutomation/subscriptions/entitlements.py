@@ -0,0 +1,103 @@
+"""
+A cached summary of what an organisation's orders entitle it to.
+
+The summary is kept in the Django cache for a day at most and rebuilt when the date
+changes, as subscriptions start and end with it. Saving or deleting an order,
+subscription, purchase or invitation drops it (see `subscriptions.signals`).
+"""
+from collections import namedtuple
+from datetime import date
+
+from django.core.cache import cache
+
+
+ENTITLEMENT_CACHE_KEY = 'subscriptions:entitlement:{organisation_id}'
+ENTITLEMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+Entitlement = namedtuple('Entitlement', (
+    'date',
+    'active_subscription',
+    'latest_subscription',
+    'remaining_invites',
+    'pending_purchases',
+))
+
+
+def get_cache_key(organisation_id):
+    return ENTITLEMENT_CACHE_KEY.format(organisation_id=organisation_id)
+
+
+def build_entitlement(organisation_id, today):
+    """
+    Build the entitlement of an organisation from its orders in a single query.
+
+    Each order comes with its subscription, its purchase and the number of invitations
+    the purchase has been used for, and they're summed up here like
+    `SubscriptionQueryset.active_for_organisation`, `latest_for_organisation`,
+    `InvitationQueryset.get_remaining_invites` and
+    `AssessmentPurchaseQueryset.get_pending_approval` do.
+    """
+    from django.db.models import Count
+    from subscriptions.models import Order
+
+    orders = Order.objects.filter(
+        organisation=organisation_id,
+    ).exclude(
+        status=Order.STATUS_CANCELED,
+    ).select_related(
+        # The order of a subscription is set from here, to tell if it's expired.
+        'subscription',
+        'assessment_purchase',
+    ).annotate(
+        number_used=Count('assessment_purchase__invitations'),
+    ).order_by()
+
+    subscriptions = []
+    remaining_invites = 0
+    pending = []
+    for order in orders:
+        if hasattr(order, 'subscription'):
+            subscriptions.append(order.subscription)
+
+        if not hasattr(order, 'assessment_purchase'):
+            continue
+        number_included = order.assessment_purchase.number_included
+        if number_included is None:
+            continue
+        if order.status == Order.STATUS_APPROVED:
+            remaining_invites += max(number_included - order.number_used, 0)
+        else:
+            pending.append(number_included)
+
+    subscriptions.sort(key=lambda subscription: subscription.start_date, reverse=True)
+    active = (
+        subscription for subscription in subscriptions
+        if subscription.order.status == Order.STATUS_APPROVED and
+        subscription.start_date <= today <= subscription.end_date
+    )
+    return Entitlement(
+        date=today,
+        active_subscription=next(active, None),
+        latest_subscription=subscriptions[0] if subscriptions else None,
+        remaining_invites=remaining_invites,
+        pending_purchases=sum(pending) if pending else None,
+    )
+
+
+def get_entitlement(organisation_id):
+    """Return the `Entitlement` of an organisation, building it if required."""
+    today = date.today()
+    key = get_cache_key(organisation_id)
+    entitlement = cache.get(key)
+    if entitlement is None or entitlement.date != today:
+        entitlement = build_entitlement(organisation_id, today)
+        cache.set(key, entitlement, ENTITLEMENT_CACHE_TIMEOUT)
+    return entitlement
+
+
+def invalidate(*organisation_ids):
+    cache.delete_many([
+        get_cache_key(organisation_id)
+        for organisation_id in organisation_ids
+        if organisation_id is not None
+    ])
@@ -0,0 +1,43 @@
+"""
+Approve or cancel many orders at once, e.g. when invoices are paid at month end.
+
+The orders are updated in one transaction and their emails are sent in batches from
+Celery afterwards.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from subscriptions.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Approve or cancel orders and email their organisations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'status',
+            choices=[Order.STATUS_APPROVED, Order.STATUS_CANCELED],
+            help='The new status of the orders.',
+        )
+        parser.add_argument(
+            'orders',
+            nargs='+',
+            type=int,
+            help='The numbers of the orders to update.',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(pk__in=options['orders'])
+        missing = set(options['orders']) - set(orders.values_list('pk', flat=True))
+        if missing:
+            raise CommandError('There are no orders numbered {}.'.format(
+                ', '.join('{:07d}'.format(pk) for pk in sorted(missing)),
+            ))
+
+        count = orders.set_status(options['status'])
+
+        if options['verbosity']:
+            self.stdout.write('Updated {} of {} orders to "{}".'.format(
+                count,
+                len(options['orders']),
+                options['status'],
+            ))
@@ -3,15 +3,14 @@ from datetime import date
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.contrib.sites.models import Site
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from incuna_mail import send
-from rolepermissions.checkers import has_role
 
 from users.models import Organisation, User
 
-from .querysets import AssessmentPurchaseQueryset, SubscriptionQueryset
+from .querysets import AssessmentPurchaseQueryset, OrderQueryset, SubscriptionQueryset
 
 
 def get_end_date():
@@ -45,6 +44,8 @@ class Order(models.Model):
     paid_date = models.DateTimeField(editable=False, null=True)
     _init_order_status = None
 
+    objects = OrderQueryset.as_manager()
+
     class Meta:
         ordering = ['-created']
 
@@ -108,43 +109,55 @@ class Order(models.Model):
         self._send_order_email(subject, template_name)
 
     def _send_order_email(self, subject, template_name):
-        users = User.objects.filter(organisation=self.organisation)
+        users = User.objects.filter(organisation=self.organisation).with_role('admin')
         site = Site.objects.get_current()
         order_number = '{:07d}'.format(self.pk)
         organisation_name = self.organisation.legal_name
         order_items, order_total = self.get_order_details()
         for user in users:
-            if has_role(user, ['admin']):
-                context = {
-                    'site': site,
-                    'site_domain': site.domain,
-                    'site_name': site.name,
-                    'organisation_name': organisation_name,
-                    'order_items': order_items,
-                    'order_total': '{0:.2f}'.format(order_total),
-                    'order_number': order_number,
-                    'user_name': user.name
-                }
-
-                send(
-                    to=user.email,
-                    subject=subject,
-                    template_name=template_name,
-                    context=context,
-                    sender=settings.DEFAULT_SUBSCRIPTION_FROM_EMAIL
-                )
+            context = {
+                'site': site,
+                'site_domain': site.domain,
+                'site_name': site.name,
+                'organisation_name': organisation_name,
+                'order_items': order_items,
+                'order_total': '{0:.2f}'.format(order_total),
+                'order_number': order_number,
+                'user_name': user.name
+            }
+
+            send(
+                to=user.email,
+                subject=subject,
+                template_name=template_name,
+                context=context,
+                sender=settings.DEFAULT_SUBSCRIPTION_FROM_EMAIL
+            )
+
+    def notify(self, email):
+        """
+        Send one of the order emails ('confirmation', 'completion' or 'cancelation')
+        from a task once the current transaction is committed.
+        """
+        from .tasks import send_order_email
+        order_id = self.pk
+        transaction.on_commit(lambda: send_order_email.delay(order_id, email))
 
     def get_formatted_id(self):
         return '{:07d}'.format(self.pk)
 
     def save(self, *args, **kwargs):
+        email = None
         if self._init_order_status != self.status:
             if self.status == Order.STATUS_APPROVED:
                 self.paid_date = timezone.now()
-                self.send_order_completion()
+                email = 'completion'
             elif self.status == Order.STATUS_CANCELED:
-                self.send_order_cancelation()
+                email = 'cancelation'
         super().save(*args, **kwargs)
+        self._init_order_status = self.status
+        if email:
+            self.notify(email)
 
 
 class Subscription(models.Model):
@@ -218,3 +231,18 @@ class AssessmentPurchase(models.Model):
 
     def __str__(self):
         return '{:07d} - {:%x %X}'.format(self.pk, self.created)
+
+
+class SubscriptionNotification(models.Model):
+    """A record of an expiry notice sent to a user, so it's never sent twice."""
+    subscription = models.ForeignKey(
+        Subscription,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    expiry_days = models.PositiveSmallIntegerField()
+    sent = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        unique_together = (('subscription', 'user', 'expiry_days'),)
@@ -1,6 +1,51 @@
 from datetime import date
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+
+ORDER_EMAIL_BATCH_SIZE = 50
+
+
+class OrderQueryset(models.QuerySet):
+    def set_status(self, status):
+        """
+        Approve or cancel these orders with a single UPDATE and queue their completion
+        or cancelation emails in batches once the transaction is committed.
+
+        Orders that already have the status are left alone. `post_save` isn't sent,
+        so the entitlements of the organisations are dropped here instead. Returns the
+        number of orders changed.
+        """
+        from subscriptions import entitlements
+        from subscriptions.tasks import send_order_emails
+
+        email = {
+            self.model.STATUS_APPROVED: 'completion',
+            self.model.STATUS_CANCELED: 'cancelation',
+        }[status]
+        fields = {'status': status}
+        if status == self.model.STATUS_APPROVED:
+            fields['paid_date'] = timezone.now()
+
+        with transaction.atomic():
+            orders = list(self.exclude(status=status).select_for_update().values_list(
+                'pk',
+                'organisation_id',
+            ))
+            order_ids = [order_id for order_id, _ in orders]
+            self.model.objects.filter(pk__in=order_ids).update(**fields)
+
+            organisation_ids = {organisation_id for _, organisation_id in orders}
+            entitlements.invalidate(*organisation_ids)
+            transaction.on_commit(lambda: entitlements.invalidate(*organisation_ids))
+
+            for start in range(0, len(order_ids), ORDER_EMAIL_BATCH_SIZE):
+                batch = order_ids[start:start + ORDER_EMAIL_BATCH_SIZE]
+                transaction.on_commit(
+                    lambda batch=batch: send_order_emails.delay(batch, email),
+                )
+        return len(order_ids)
 
 
 class SubscriptionQueryset(models.QuerySet):
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from subscriptions import entitlements
+from subscriptions.models import AssessmentPurchase, Order, Subscription
+from users.models import Invitation
+
+
+def _invalidate(*organisation_ids):
+    """
+    Drop the entitlements now and again once the change is committed, so one rebuilt
+    from the old rows in the meantime isn't kept.
+    """
+    entitlements.invalidate(*organisation_ids)
+    transaction.on_commit(lambda: entitlements.invalidate(*organisation_ids))
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order_entitlement(sender, instance, **kwargs):
+    _invalidate(instance.organisation_id)
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+@receiver([post_save, post_delete], sender=AssessmentPurchase)
+def invalidate_purchase_entitlement(sender, instance, **kwargs):
+    organisation_id = Order.objects.filter(
+        pk=instance.order_id,
+    ).values_list('organisation_id', flat=True).first()
+    _invalidate(organisation_id)
+
+
+@receiver([post_save, post_delete], sender=Invitation)
+def invalidate_invitation_entitlement(sender, instance, **kwargs):
+    _invalidate(instance.grantor_id)
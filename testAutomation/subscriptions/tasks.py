@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 
 from datetime import date
+from smtplib import SMTPException
 
 from celery import shared_task
 
@@ -8,65 +9,200 @@ from dateutil.relativedelta import relativedelta
 
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
 from django.template.defaultfilters import date as datefilter
+from django.template.loader import get_template
 
-from incuna_mail import send
+from subscriptions.models import Order, Subscription, SubscriptionNotification
+from users.models import User
 
-from rolepermissions.checkers import has_role
 
-from subscriptions.models import Order, Subscription
+EXPIRY_DAYS = (30, 7, 0)
+EXPIRY_SUBJECTS = {
+    30: 'Action required: Your GGC subscription will expire in 1 month',
+    7: 'Action required: Your GGC subscription will expire in 1 week',
+    0: 'Action required: Your GGC subscription has expired',
+}
+NOTIFICATION_BATCH_SIZE = 50
+ORDER_EMAILS = {
+    'confirmation': 'send_order_confirmation',
+    'completion': 'send_order_completion',
+    'cancelation': 'send_order_cancelation',
+}
 
 
-def _send_notification(subscriptions, expiry_days):
-    site = Site.objects.get_current()
-    if expiry_days == 30:
-        subject = 'Action required: Your GGC subscription will expire in 1 month'
-    elif expiry_days == 7:
-        subject = 'Action required: Your GGC subscription will expire in 1 week'
+def _get_pending_notifications(today):
+    """
+    Return the `(subscription_id, user_id, expiry_days)` of every expiry notice due
+    today that hasn't been sent yet.
+
+    Uses three queries however many subscriptions and admins there are.
+    """
+    expiry_dates = {
+        today + relativedelta(days=expiry_days): expiry_days
+        for expiry_days in EXPIRY_DAYS
+    }
+    subscriptions = Subscription.objects.filter(
+        end_date__in=expiry_dates,
+        order__status=Order.STATUS_APPROVED,
+    ).values_list('pk', 'order__organisation_id', 'end_date')
+    subscriptions = [
+        (pk, organisation_id, expiry_dates[end_date])
+        for pk, organisation_id, end_date in subscriptions
+    ]
+    if not subscriptions:
+        return []
+
+    admins = User.objects.filter(
+        organisation_id__in={organisation_id for _, organisation_id, _ in subscriptions},
+    ).with_role('admin').values_list('pk', 'organisation_id')
+    admins_lookup = {}
+    for user_id, organisation_id in admins:
+        admins_lookup.setdefault(organisation_id, []).append(user_id)
+
+    sent = set(SubscriptionNotification.objects.filter(
+        subscription_id__in=[pk for pk, _, _ in subscriptions],
+    ).values_list('subscription_id', 'user_id', 'expiry_days'))
+
+    return sorted({
+        (subscription_id, user_id, expiry_days)
+        for subscription_id, organisation_id, expiry_days in subscriptions
+        for user_id in admins_lookup.get(organisation_id, ())
+    } - sent)
+
+
+def _get_message(template, site, subscription, user, expiry_days):
+    if expiry_days == 0:
+        renewal_message = "has expired"
     else:
-        subject = 'Action required: Your GGC subscription has expired'
-
-    for subscription in subscriptions:
-        organisation = subscription.order.organisation
-        users = subscription.order.organisation.user_set.all()
-        end_date = subscription.end_date
-        for user in users:
-            if has_role(user, ['admin']):
-                if expiry_days == 0:
-                    renewal_message = "has expired"
-                else:
-                    renewal_message = "is due for renewal on {}".format(
-                        datefilter(end_date)
+        renewal_message = "is due for renewal on {}".format(
+            datefilter(subscription.end_date)
+        )
+    context = {
+        'site': site,
+        'site_domain': site.domain,
+        'site_name': site.name,
+        'email': user.email,
+        'organisation_name': subscription.order.organisation.legal_name,
+        'renewal_message': renewal_message,
+        'user_name': user.name
+    }
+    return EmailMessage(
+        subject=EXPIRY_SUBJECTS[expiry_days],
+        body=template.render(context),
+        from_email=settings.DEFAULT_SUBSCRIPTION_FROM_EMAIL,
+        to=[user.email],
+    )
+
+
+@shared_task(rate_limit='10/m')
+def send_subscription_expiry_notifications(notifications):
+    """
+    Send a batch of `(subscription_id, user_id, expiry_days)` expiry notices over one
+    connection.
+
+    Each notice is logged as it's sent, and anything logged already is skipped. A
+    batch that fails part way can be run again without resending what was sent.
+    """
+    notifications = {tuple(notification) for notification in notifications}
+    subscription_ids = {subscription_id for subscription_id, _, _ in notifications}
+    notifications -= set(SubscriptionNotification.objects.filter(
+        subscription_id__in=subscription_ids,
+    ).values_list('subscription_id', 'user_id', 'expiry_days'))
+    if not notifications:
+        return 0
+
+    subscriptions = Subscription.objects.select_related('order__organisation').in_bulk(
+        subscription_ids,
+    )
+    users = User.objects.in_bulk({user_id for _, user_id, _ in notifications})
+    notifications = sorted(
+        (subscription_id, user_id, expiry_days)
+        for subscription_id, user_id, expiry_days in notifications
+        if subscription_id in subscriptions and user_id in users
+    )
+
+    site = Site.objects.get_current()
+    template = get_template('subscriptions/emails/order_renewal.txt')
+    messages = [
+        _get_message(
+            template,
+            site,
+            subscriptions[subscription_id],
+            users[user_id],
+            expiry_days,
+        )
+        for subscription_id, user_id, expiry_days in notifications
+    ]
+
+    sent = 0
+    with get_connection() as connection:
+        for (subscription_id, user_id, expiry_days), message in zip(
+            notifications,
+            messages,
+        ):
+            # Each notice is logged in its own transaction, committed once its email
+            # is sent. If sending fails, the notices already sent stay logged and
+            # only the failed one is rolled back. The log row is written before the
+            # email, so a concurrent run hits the unique constraint and skips the
+            # notice instead of sending it again.
+            try:
+                with transaction.atomic():
+                    SubscriptionNotification.objects.create(
+                        subscription_id=subscription_id,
+                        user_id=user_id,
+                        expiry_days=expiry_days,
                     )
-                context = {
-                    'site': site,
-                    'site_domain': site.domain,
-                    'site_name': site.name,
-                    'email': user.email,
-                    'organisation_name': organisation.legal_name,
-                    'renewal_message': renewal_message,
-                    'user_name': user.name
-                }
-                send(
-                    to=user.email,
-                    subject=subject,
-                    template_name='subscriptions/emails/order_renewal.txt',
-                    context=context,
-                    sender=settings.DEFAULT_SUBSCRIPTION_FROM_EMAIL
-                )
-
-
-def _to_be_expired(expiry_days=0):
-    expiry_date = date.today() + relativedelta(days=expiry_days)
-    subscriptions = Subscription.objects.filter(
-        end_date=expiry_date,
-        order__status=Order.STATUS_APPROVED
-    ).prefetch_related('order__organisation__user_set')
-    _send_notification(subscriptions, expiry_days)
+                    sent += connection.send_messages([message])
+            except IntegrityError:
+                continue
+    return sent
 
 
 @shared_task
 def check_subscription_expiry():
-    _to_be_expired(expiry_days=30)
-    _to_be_expired(expiry_days=7)
-    _to_be_expired(expiry_days=0)
+    """
+    Find every admin due a subscription expiry notice today and send the notices in
+    batches.
+    """
+    notifications = _get_pending_notifications(date.today())
+    for start in range(0, len(notifications), NOTIFICATION_BATCH_SIZE):
+        send_subscription_expiry_notifications.delay(
+            notifications[start:start + NOTIFICATION_BATCH_SIZE],
+        )
+
+
+def _get_orders():
+    """Orders with everything `Order.get_order_details` needs."""
+    return Order.objects.select_related(
+        'organisation',
+        'subscription',
+        'assessment_purchase',
+    )
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_order_email(self, order_id, email):
+    """
+    Send an order email to the admins of the ordering organisation.
+
+    The order is loaded with everything `get_order_details` needs in one query, and
+    sending is retried when the mail server can't be reached.
+    """
+    try:
+        order = _get_orders().get(pk=order_id)
+    except Order.DoesNotExist:
+        return
+
+    try:
+        getattr(order, ORDER_EMAILS[email])()
+    except (SMTPException, OSError) as e:
+        raise self.retry(exc=e)
+
+
+@shared_task(rate_limit='10/m')
+def send_order_emails(order_ids, email):
+    """Send the same order email for each of a batch of orders."""
+    for order in _get_orders().filter(pk__in=order_ids):
+        getattr(order, ORDER_EMAILS[email])()
@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from users.tests.factories import InvitationFactory, OrganisationFactory
+
+from .factories import AssessmentPurchaseFactory, OrderFactory, SubscriptionFactory
+from .. import entitlements
+from ..models import Order
+
+
+@patch('subscriptions.signals.transaction.on_commit', lambda func: func())
+class TestEntitlement(TestCase):
+    def setUp(self):
+        # Canceling the order queues its email.
+        patcher = patch('subscriptions.tasks.send_order_email.delay')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.organisation = OrganisationFactory.create()
+        self.order = OrderFactory.create(
+            organisation=self.organisation,
+            status=Order.STATUS_APPROVED,
+        )
+        self.subscription = SubscriptionFactory.create(order=self.order)
+        self.purchase = AssessmentPurchaseFactory.create(
+            order=self.order,
+            number_included=3,
+        )
+        entitlements.invalidate(self.organisation.pk)
+
+    def test_build(self):
+        """
+        Building the entitlement takes one query, of the organisation's orders with
+        their subscriptions, purchases and invitations used.
+        """
+        with self.assertNumQueries(1):
+            entitlement = entitlements.get_entitlement(self.organisation.pk)
+
+        self.assertEqual(entitlement.date, date.today())
+        self.assertEqual(entitlement.active_subscription, self.subscription)
+        self.assertEqual(entitlement.latest_subscription, self.subscription)
+        self.assertEqual(entitlement.remaining_invites, 3)
+        self.assertIsNone(entitlement.pending_purchases)
+
+    def test_build_orders(self):
+        earlier = OrderFactory.create(
+            organisation=self.organisation,
+            status=Order.STATUS_APPROVED,
+        )
+        SubscriptionFactory.create(
+            order=earlier,
+            start_date=date.today() - timedelta(days=400),
+            end_date=date.today() - timedelta(days=35),
+        )
+        later = OrderFactory.create(organisation=self.organisation)
+        later_subscription = SubscriptionFactory.create(
+            order=later,
+            start_date=date.today() + timedelta(days=1),
+        )
+        canceled = OrderFactory.create(
+            organisation=self.organisation,
+            status=Order.STATUS_CANCELED,
+        )
+        AssessmentPurchaseFactory.create(order=canceled, number_included=7)
+        pending = OrderFactory.create(
+            organisation=self.organisation,
+            status=Order.STATUS_IN_PROGRESS,
+        )
+        AssessmentPurchaseFactory.create(order=pending, number_included=2)
+        InvitationFactory.create_batch(
+            2,
+            grantor=self.organisation,
+            purchase=self.purchase,
+        )
+        used = OrderFactory.create(
+            organisation=self.organisation,
+            status=Order.STATUS_APPROVED,
+        )
+        used_purchase = AssessmentPurchaseFactory.create(order=used, number_included=1)
+        InvitationFactory.create(grantor=self.organisation, purchase=used_purchase)
+        entitlements.invalidate(self.organisation.pk)
+
+        with self.assertNumQueries(1):
+            entitlement = entitlements.get_entitlement(self.organisation.pk)
+
+        self.assertEqual(entitlement.active_subscription, self.subscription)
+        self.assertEqual(entitlement.latest_subscription, later_subscription)
+        self.assertEqual(entitlement.remaining_invites, 1)
+        self.assertEqual(entitlement.pending_purchases, 2)
+
+    def test_cached(self):
+        entitlements.get_entitlement(self.organisation.pk)
+        with self.assertNumQueries(0):
+            entitlement = entitlements.get_entitlement(self.organisation.pk)
+            self.assertFalse(entitlement.active_subscription.get_is_expired())
+
+    def test_stale_date(self):
+        """An entitlement built on an earlier day is rebuilt."""
+        entitlement = entitlements.get_entitlement(self.organisation.pk)
+        cache.set(
+            entitlements.get_cache_key(self.organisation.pk),
+            entitlement._replace(date=date.today() - timedelta(days=1)),
+        )
+        with self.assertNumQueries(1):
+            entitlement = entitlements.get_entitlement(self.organisation.pk)
+        self.assertEqual(entitlement.date, date.today())
+
+    def test_organisation(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.organisation.active_subscription, self.subscription)
+            self.assertEqual(self.organisation.latest_subscription, self.subscription)
+            self.assertEqual(self.organisation.remaining_invites, 3)
+            self.assertIsNone(self.organisation.pending_purchases)
+
+    def test_invalidated_by_order(self):
+        entitlements.get_entitlement(self.organisation.pk)
+        self.order.status = Order.STATUS_CANCELED
+        self.order.save()
+
+        entitlement = entitlements.get_entitlement(self.organisation.pk)
+        self.assertIsNone(entitlement.active_subscription)
+        self.assertIsNone(entitlement.latest_subscription)
+        self.assertEqual(entitlement.remaining_invites, 0)
+
+    def test_invalidated_by_subscription(self):
+        entitlements.get_entitlement(self.organisation.pk)
+        self.subscription.end_date = date.today() - timedelta(days=1)
+        self.subscription.save()
+
+        entitlement = entitlements.get_entitlement(self.organisation.pk)
+        self.assertIsNone(entitlement.active_subscription)
+
+    def test_invalidated_by_purchase(self):
+        entitlements.get_entitlement(self.organisation.pk)
+        order = OrderFactory.create(organisation=self.organisation)
+        AssessmentPurchaseFactory.create(order=order, number_included=5)
+
+        entitlement = entitlements.get_entitlement(self.organisation.pk)
+        self.assertEqual(entitlement.pending_purchases, 5)
+
+    def test_invalidated_by_invitation(self):
+        entitlements.get_entitlement(self.organisation.pk)
+        InvitationFactory.create(grantor=self.organisation, purchase=self.purchase)
+
+        entitlement = entitlements.get_entitlement(self.organisation.pk)
+        self.assertEqual(entitlement.remaining_invites, 2)
@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from .factories import OrderFactory
+from ..models import Order
+
+
+@patch('subscriptions.querysets.transaction.on_commit', lambda func: func())
+@patch('subscriptions.tasks.send_order_emails.delay')
+class TestUpdateOrders(TestCase):
+    def test_approve(self, delay):
+        orders = OrderFactory.create_batch(2)
+        other = OrderFactory.create()
+
+        call_command(
+            'update_orders',
+            Order.STATUS_APPROVED,
+            *[str(order.pk) for order in orders],
+            verbosity=0
+        )
+
+        self.assertEqual(
+            set(Order.objects.filter(status=Order.STATUS_APPROVED)),
+            set(orders),
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.status, Order.STATUS_NEW)
+        delay.assert_called_once()
+
+    def test_missing(self, delay):
+        order = OrderFactory.create()
+        with self.assertRaises(CommandError):
+            call_command(
+                'update_orders',
+                Order.STATUS_CANCELED,
+                str(order.pk),
+                str(order.pk + 1),
+                verbosity=0
+            )
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_NEW)
+        self.assertFalse(delay.called)
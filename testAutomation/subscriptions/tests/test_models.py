@@ -103,63 +103,69 @@ class TestOrder(TestCase):
         order = OrderFactory.build(status="new")
         self.assertFalse(order.get_is_approved())
 
-    @patch('subscriptions.models.Order.send_order_completion')
-    def test_send_order_completion_called(self, send_order_completion):
+    @patch('subscriptions.models.transaction.on_commit', lambda func: func())
+    @patch('subscriptions.tasks.send_order_email.delay')
+    def test_send_order_completion_called(self, delay):
         order = OrderFactory.create(
             organisation=self.organisation,
             status=Order.STATUS_NEW
         )
         order.status = Order.STATUS_APPROVED
         order.save()
-        send_order_completion.assert_called_with()
+        delay.assert_called_once_with(order.pk, 'completion')
 
-    @patch('subscriptions.models.Order.send_order_completion')
-    def test_send_order_completion_called_with_approved(self, send_order_completion):
+    @patch('subscriptions.models.transaction.on_commit', lambda func: func())
+    @patch('subscriptions.tasks.send_order_email.delay')
+    def test_send_order_completion_called_with_approved(self, delay):
         order = OrderFactory.build(
             organisation=self.organisation
         )
         order.status = Order.STATUS_APPROVED
         order.save()
-        send_order_completion.assert_called_with()
+        delay.assert_called_once_with(order.pk, 'completion')
 
-    @patch('subscriptions.models.Order.send_order_completion')
-    def test_send_order_completion_not_called_when_no_change(self, send_order_completion):
+    @patch('subscriptions.models.transaction.on_commit', lambda func: func())
+    @patch('subscriptions.tasks.send_order_email.delay')
+    def test_send_order_completion_not_called_when_no_change(self, delay):
         order = OrderFactory.build(
             organisation=self.organisation,
             status=Order.STATUS_APPROVED
         )
         order.status = Order.STATUS_APPROVED
         order.save()
-        self.assertFalse(send_order_completion.called)
+        self.assertFalse(delay.called)
 
-    @patch('subscriptions.models.Order.send_order_cancelation')
-    def test_send_order_cancelation_called(self, send_order_cancelation):
+    @patch('subscriptions.models.transaction.on_commit', lambda func: func())
+    @patch('subscriptions.tasks.send_order_email.delay')
+    def test_send_order_cancelation_called(self, delay):
         order = OrderFactory.create(
             organisation=self.organisation,
             status=Order.STATUS_NEW
         )
         order.status = Order.STATUS_CANCELED
         order.save()
-        send_order_cancelation.assert_called_with()
+        delay.assert_called_once_with(order.pk, 'cancelation')
 
-    @patch('subscriptions.models.Order.send_order_cancelation')
-    def test_send_order_cancelation_called_with_canceled(self, send_order_cancelation):
+    @patch('subscriptions.models.transaction.on_commit', lambda func: func())
+    @patch('subscriptions.tasks.send_order_email.delay')
+    def test_send_order_cancelation_called_with_canceled(self, delay):
         order = OrderFactory.build(
             organisation=self.organisation
         )
         order.status = Order.STATUS_CANCELED
         order.save()
-        send_order_cancelation.assert_called_with()
+        delay.assert_called_once_with(order.pk, 'cancelation')
 
-    @patch('subscriptions.models.Order.send_order_cancelation')
-    def test_send_order_cancelation_not_called_no_change(self, send_order_cancelation):
+    @patch('subscriptions.models.transaction.on_commit', lambda func: func())
+    @patch('subscriptions.tasks.send_order_email.delay')
+    def test_send_order_cancelation_not_called_no_change(self, delay):
         order = OrderFactory.build(
             organisation=self.organisation,
             status=Order.STATUS_CANCELED
         )
         order.status = Order.STATUS_CANCELED
         order.save()
-        self.assertFalse(send_order_cancelation.called)
+        self.assertFalse(delay.called)
 
 
 class TestSubscriptionTestCase(TestCase):
@@ -0,0 +1,70 @@
+from unittest.mock import call, patch
+
+from django.test import TestCase
+
+from .factories import OrderFactory, SubscriptionFactory
+from .. import entitlements
+from ..models import Order
+
+
+@patch('subscriptions.querysets.transaction.on_commit', lambda func: func())
+@patch('subscriptions.tasks.send_order_emails.delay')
+class TestOrderQueryset(TestCase):
+    def test_set_status_approved(self, delay):
+        order_1 = OrderFactory.create()
+        order_2 = OrderFactory.create(status=Order.STATUS_IN_PROGRESS)
+        approved = OrderFactory.create(status=Order.STATUS_APPROVED)
+
+        """
+        Approving takes four queries:
+            * savepoint
+            * select the orders for update
+            * update them
+            * release savepoint
+        """
+        with self.assertNumQueries(4):
+            count = Order.objects.all().set_status(Order.STATUS_APPROVED)
+
+        self.assertEqual(count, 2)
+        for order in (order_1, order_2):
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.STATUS_APPROVED)
+            self.assertIsNotNone(order.paid_date)
+        delay.assert_called_once()
+        order_ids, email = delay.call_args[0]
+        self.assertEqual(set(order_ids), {order_1.pk, order_2.pk})
+        self.assertEqual(email, 'completion')
+        self.assertNotIn(approved.pk, order_ids)
+
+    def test_set_status_canceled(self, delay):
+        order = OrderFactory.create()
+
+        Order.objects.filter(pk=order.pk).set_status(Order.STATUS_CANCELED)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_CANCELED)
+        self.assertIsNone(order.paid_date)
+        delay.assert_called_once_with([order.pk], 'cancelation')
+
+    @patch('subscriptions.querysets.ORDER_EMAIL_BATCH_SIZE', 2)
+    def test_set_status_batches(self, delay):
+        orders = OrderFactory.create_batch(3)
+        order_ids = sorted(order.pk for order in orders)
+
+        Order.objects.order_by('pk').set_status(Order.STATUS_APPROVED)
+
+        self.assertEqual(delay.call_args_list, [
+            call(order_ids[:2], 'completion'),
+            call(order_ids[2:], 'completion'),
+        ])
+
+    def test_set_status_entitlement(self, delay):
+        subscription = SubscriptionFactory.create()
+        organisation_id = subscription.order.organisation_id
+        entitlement = entitlements.get_entitlement(organisation_id)
+        self.assertIsNone(entitlement.active_subscription)
+
+        Order.objects.all().set_status(Order.STATUS_APPROVED)
+
+        entitlement = entitlements.get_entitlement(organisation_id)
+        self.assertEqual(entitlement.active_subscription, subscription)
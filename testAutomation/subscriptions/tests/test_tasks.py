@@ -1,6 +1,11 @@
 from datetime import date, timedelta
+from smtplib import SMTPException
 
+from unittest.mock import patch
+
+from celery.exceptions import Retry
 from django.conf import settings
+from django.contrib.sites.models import Site
 from django.core import mail
 from django.test import override_settings, TestCase
 
@@ -8,11 +13,19 @@ from rolepermissions.roles import assign_role
 
 from users.tests.factories import OrganisationFactory, UserFactory
 
-from .factories import OrderFactory, SubscriptionFactory
-from ..models import Order
-from ..tasks import check_subscription_expiry
+from .factories import AssessmentPurchaseFactory, OrderFactory, SubscriptionFactory
+from ..models import Order, SubscriptionNotification
+from ..tasks import (
+    check_subscription_expiry,
+    send_order_email,
+    send_subscription_expiry_notifications,
+)
 
 
+@patch(
+    'subscriptions.tasks.send_subscription_expiry_notifications.delay',
+    send_subscription_expiry_notifications,
+)
 class TestSubscriptionCeleryTasks(TestCase):
 
     def setUp(self):
@@ -115,3 +128,132 @@ class TestSubscriptionCeleryTasks(TestCase):
 
         check_subscription_expiry()
         self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_renewal_email_once(self):
+        """Running the check again doesn't send the same notice twice."""
+        subscription = SubscriptionFactory.create(
+            end_date=date.today() + timedelta(days=7),
+            order=self.order
+        )
+        check_subscription_expiry()
+        check_subscription_expiry()
+
+        self.assertEqual(len(mail.outbox), 1)
+        notification = SubscriptionNotification.objects.get()
+        self.assertEqual(notification.subscription, subscription)
+        self.assertEqual(notification.user, self.user)
+        self.assertEqual(notification.expiry_days, 7)
+
+    def test_send_renewal_email_admins_only(self):
+        manager = UserFactory.create(organisation=self.organisation)
+        assign_role(manager, 'manager')
+        other_admin = UserFactory.create(organisation=self.organisation)
+        assign_role(other_admin, 'admin')
+        SubscriptionFactory.create(end_date=date.today(), order=self.order)
+
+        check_subscription_expiry()
+
+        recipients = sorted(email for message in mail.outbox for email in message.to)
+        self.assertEqual(recipients, sorted([self.user.email, other_admin.email]))
+
+    def test_send_renewal_email_organisations(self):
+        """Every expiring subscription is found with a fixed number of queries."""
+        other_admin = UserFactory.create()
+        assign_role(other_admin, 'admin')
+        SubscriptionFactory.create(end_date=date.today(), order=self.order)
+        SubscriptionFactory.create(
+            end_date=date.today() + timedelta(days=30),
+            order=OrderFactory.create(
+                organisation=other_admin.organisation,
+                status=Order.STATUS_APPROVED,
+            ),
+        )
+        SubscriptionFactory.create(
+            end_date=date.today(),
+            order=OrderFactory.create(
+                organisation=other_admin.organisation,
+                status=Order.STATUS_CANCELED,
+            ),
+        )
+
+        with patch.object(send_subscription_expiry_notifications, 'delay') as delay:
+            with self.assertNumQueries(3):
+                check_subscription_expiry()
+
+        delay.assert_called_once()
+        notifications = delay.call_args[0][0]
+        self.assertEqual(
+            sorted((user_id, expiry_days) for _, user_id, expiry_days in notifications),
+            sorted([(self.user.pk, 0), (other_admin.pk, 30)]),
+        )
+
+    @patch('subscriptions.tasks.NOTIFICATION_BATCH_SIZE', 1)
+    def test_send_renewal_email_batches(self):
+        other_admin = UserFactory.create(organisation=self.organisation)
+        assign_role(other_admin, 'admin')
+        SubscriptionFactory.create(end_date=date.today(), order=self.order)
+
+        with patch.object(send_subscription_expiry_notifications, 'delay') as delay:
+            check_subscription_expiry()
+
+        self.assertEqual(delay.call_count, 2)
+
+    def test_send_renewal_email_failure(self):
+        """Notices sent before a failure stay logged and aren't sent again."""
+        other_admin = UserFactory.create(organisation=self.organisation)
+        assign_role(other_admin, 'admin')
+        subscription = SubscriptionFactory.create(
+            end_date=date.today(),
+            order=self.order,
+        )
+        notifications = [
+            (subscription.pk, self.user.pk, 0),
+            (subscription.pk, other_admin.pk, 0),
+        ]
+
+        send_messages = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with patch(send_messages, side_effect=[1, SMTPException('Down')]):
+            with self.assertRaises(SMTPException):
+                send_subscription_expiry_notifications(notifications)
+        self.assertEqual(SubscriptionNotification.objects.count(), 1)
+
+        self.assertEqual(send_subscription_expiry_notifications(notifications), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(SubscriptionNotification.objects.count(), 2)
+
+
+class TestSendOrderEmail(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        assign_role(self.user, 'admin')
+        self.order = OrderFactory.create(organisation=self.user.organisation)
+        SubscriptionFactory.create(order=self.order, price=100)
+        AssessmentPurchaseFactory.create(order=self.order, number_included=2, price=50)
+
+    def test_send(self):
+        """
+        Sending takes three queries:
+            * the order with its organisation, subscription and purchase
+            * the admins of the organisation
+            * the current site
+        """
+        Site.objects.clear_cache()
+        with self.assertNumQueries(3):
+            send_order_email(self.order.pk, 'confirmation')
+
+        self.assertEqual(len(mail.outbox), 1)
+        subject = 'GCC Order confirmation {:07d}'.format(self.order.pk)
+        self.assertEqual(mail.outbox[0].subject, subject)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertIn('150.00', mail.outbox[0].body)
+
+    def test_send_deleted(self):
+        send_order_email(0, 'completion')
+        self.assertEqual(len(mail.outbox), 0)
+
+    @patch('subscriptions.models.Order.send_order_cancelation', side_effect=OSError)
+    def test_retry(self, send_order_cancelation):
+        with patch.object(send_order_email, 'retry', side_effect=Retry) as retry:
+            with self.assertRaises(Retry):
+                send_order_email(self.order.pk, 'cancelation')
+        self.assertIsInstance(retry.call_args[1]['exc'], OSError)
@@ -1,5 +1,7 @@
 from datetime import date
 
+from unittest.mock import patch
+
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core import mail
@@ -13,6 +15,7 @@ from users.tests.factories import OrganisationFactory, UserFactory
 from .factories import AssessmentPackageFactory, OrderFactory, SubscriptionFactory
 from .. import views
 from ..models import AssessmentPurchase, Order
+from ..tasks import send_order_email
 
 
 class TestSubscriptionListView(AnonymouseTestMixin, RequestTestCase):
@@ -84,6 +87,8 @@ class TestSubscriptionListView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(subscription['price'], expected_price)
 
 
+@patch('subscriptions.models.transaction.on_commit', lambda func: func())
+@patch('subscriptions.tasks.send_order_email.delay', send_order_email)
 class TestOrderView(AnonymouseTestMixin, RequestTestCase):
     view = views.OrderView
 
@@ -7,12 +7,12 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.urlresolvers import reverse, reverse_lazy
 from django.http.response import HttpResponseRedirect
 from django.views.generic import DetailView, FormView, ListView, TemplateView
-from rolepermissions.checkers import has_role
 
 from core.mixins import AppMixin
+from users.roles import has_role
 
 from .forms import OrderForm
-from .models import AssessmentPackage, AssessmentPurchase, Order
+from .models import AssessmentPackage, Order
 
 
 class SubscriptionMixin(LoginRequiredMixin, AppMixin):
@@ -42,11 +42,8 @@ class SubscriptionListView(SubscriptionMixin, UserPassesTestMixin, TemplateView)
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         organisation = self.request.user.organisation
-        pending_assessment_purchase = AssessmentPurchase.objects.get_pending_approval(
-            organisation
-        )
         context.update(
-            pending_assessment_purchase=pending_assessment_purchase,
+            pending_assessment_purchase=organisation.pending_purchases,
             latest_subscription=organisation.latest_subscription,
             show_order_history=Order.objects.filter(organisation=organisation).exists()
         )
@@ -122,7 +119,7 @@ class OrderView(SubscriptionMixin, UserPassesTestMixin, FormView):
     def form_valid(self, form, **kwargs):
         response = super().form_valid(form)
         instance = form.save()
-        instance.send_order_confirmation()
+        instance.notify('confirmation')
         messages.success(
             self.request, 'You have successfully submitted the order',
             extra_tags='show-icon'
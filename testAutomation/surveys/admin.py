@@ -35,12 +35,7 @@ class SurveyAdmin(admin.ModelAdmin):
         super(SurveyAdmin, self).save_model(request, obj, form, change)
         if '_saveasnew' in request.POST:
             questions = SurveyQuestion.objects.filter(survey__pk=self.original_object_id)
-            to_add = []
-            for question in questions:
-                question.id = None
-                question.survey = obj
-                to_add.append(question)
-            SurveyQuestion.objects.bulk_create(to_add)
+            questions.copy_to(obj)
 
 
 class SurveyQuestionOptionInline(OrderableTabularInline):
@@ -0,0 +1,309 @@
+"""
+Row-by-row CSV and XLSX exports of surveys and survey responses.
+
+Rows come from generators reading the database with `iterator()` and are written out
+as they are produced, so memory use doesn't grow with the size of the export.
+"""
+import csv
+import io
+import re
+import tempfile
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.html import strip_tags
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
+
+from documents.models import Document
+from .models import (
+    get_level_name,
+    SurveyAnswer,
+    SurveyQuestion,
+    SurveyQuestionOption,
+)
+from .snapshots import is_current
+
+
+CSV_CONTENT_TYPE = 'text/csv'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+QUESTION_ORDERING = (
+    'section__area__number',
+    'section__number',
+    'level',
+    'question_number',
+)
+
+QUESTION_HEADER = (
+    'Code',
+    'Question',
+    'Upload Required',
+    'Notes',
+    'Answer (yes/no)',
+    'Explanation',
+    'Due Date',
+)
+
+INVITATION_HEADER = (
+    'Organisation',
+    'Email',
+    'Assessment',
+    'Tier',
+    'Status',
+    'Due Date',
+    'Created',
+    'Last Sent',
+)
+
+RESPONSE_HEADER = (
+    'Organisation',
+    'Assessment',
+    'Tier',
+    'Submitted',
+    'Code',
+    'Question',
+    'Answer',
+    'Options',
+    'Explanation',
+    'Due Date',
+    'Documents',
+)
+
+
+class ArraySubquery(models.Subquery):
+    """Collect every row of a single column subquery into a postgres array."""
+    template = 'ARRAY(%(subquery)s)'
+
+
+def survey_question_rows(survey):
+    """Yield a header and a row per question of the survey to complete offline."""
+    yield QUESTION_HEADER
+
+    questions = SurveyQuestion.objects.filter(
+        survey=survey,
+    ).select_related(
+        'section__area',
+    ).order_by(*QUESTION_ORDERING)
+
+    for question in questions.iterator():
+        yield (
+            question.get_code(),
+            strip_tags(question.name),
+            question.get_upload_type_display(),
+            strip_tags(question.notes or ''),
+            '',
+            '',
+            '',
+        )
+
+
+def get_answered_questions(response):
+    """
+    Return the questions of a response's tier annotated with the response's answer,
+    option names and attached document names.
+    """
+    answers = SurveyAnswer.objects.filter(
+        response=response,
+        question=models.OuterRef('pk'),
+    )
+    options = SurveyQuestionOption.objects.filter(
+        answers__response=response,
+        answers__question=models.OuterRef('pk'),
+    )
+    documents = Document.objects.filter(
+        questions__answer__response=response,
+        questions__answer__question=models.OuterRef('pk'),
+    ).order_by('name')
+
+    return SurveyQuestion.objects.filter(
+        survey_id=response.survey_id,
+        level__lte=response.level,
+    ).select_related(
+        'section__area',
+    ).annotate(
+        answer_value=models.Subquery(
+            answers.values('value')[:1],
+            output_field=models.CharField(),
+        ),
+        answer_explanation=models.Subquery(
+            answers.values('explanation')[:1],
+            output_field=models.TextField(),
+        ),
+        answer_due_date=models.Subquery(
+            answers.values('due_date')[:1],
+            output_field=models.DateField(),
+        ),
+        option_names=ArraySubquery(
+            options.values('name'),
+            output_field=ArrayField(models.CharField()),
+        ),
+        document_names=ArraySubquery(
+            documents.values('name'),
+            output_field=ArrayField(models.CharField()),
+        ),
+    ).order_by(*QUESTION_ORDERING)
+
+
+def _format_datetime(value):
+    if value is None:
+        return ''
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+
+
+def _answered_question_columns(response, answer_labels):
+    for question in get_answered_questions(response).iterator():
+        value = question.answer_value
+        yield (
+            question.get_code(),
+            strip_tags(question.name),
+            str(answer_labels[value]) if value else '',
+            ', '.join(question.option_names),
+            question.answer_explanation or '',
+            question.answer_due_date,
+            ', '.join(question.document_names),
+        )
+
+
+def _snapshot_question_columns(snapshot):
+    for step in snapshot['compliance']['sections']:
+        for question in step['questions']:
+            answer = question['answer'] or {}
+            due_date = answer.get('due_date')
+            yield (
+                question['code'],
+                strip_tags(question['name']),
+                answer.get('value_display', ''),
+                ', '.join(name for name, selected in question['options'] if selected),
+                answer.get('explanation') or '',
+                parse_date(due_date) if due_date else None,
+                ', '.join(document['name'] for document in answer.get('documents', [])),
+            )
+
+
+def survey_response_rows(responses, header=True):
+    """
+    Yield a header and a row per question and response with the answers given.
+
+    Needs one query for the responses and one more per response that has no snapshot
+    of its tier.
+    """
+    if header:
+        yield RESPONSE_HEADER
+
+    answer_labels = dict(SurveyAnswer.ANSWER_CHOICES)
+    responses = responses.select_related('organisation', 'survey').order_by('pk')
+    for response in responses.iterator():
+        response_columns = (
+            str(response.organisation),
+            response.survey.name,
+            get_level_name(response.level),
+            _format_datetime(response.submitted),
+        )
+
+        if is_current(response):
+            questions = _snapshot_question_columns(response.snapshot)
+        else:
+            questions = _answered_question_columns(response, answer_labels)
+        for question_columns in questions:
+            yield response_columns + question_columns
+
+
+def invitation_rows(invitations, header=True):
+    """Yield a header and a row per invitation."""
+    if header:
+        yield INVITATION_HEADER
+
+    invitations = invitations.select_related('grantee', 'survey').order_by('pk')
+    for invitation in invitations.iterator():
+        yield (
+            str(invitation.grantee or ''),
+            invitation.grantee_email or '',
+            invitation.survey.name,
+            get_level_name(invitation.level),
+            invitation.get_status_display(),
+            invitation.due_date,
+            _format_datetime(invitation.created),
+            _format_datetime(invitation.last_sent),
+        )
+
+
+class Echo:
+    """A file-like object that returns what is written, for `csv.writer`."""
+    def write(self, value):
+        return value
+
+
+def write_csv(rows, file):
+    writer = csv.writer(file)
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_xlsx(rows, file, title):
+    """Write the rows to a single sheet, the first row in bold as the header."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(re.sub(r'[\\*?:/\[\]]', '', title)[:31] or 'Export')
+
+    header_font = Font(bold=True)
+    wrap = Alignment(wrap_text=True, vertical='top')
+    for row_num, row in enumerate(rows):
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(sheet, value=value)
+            if row_num == 0:
+                cell.font = header_font
+            else:
+                cell.alignment = wrap
+            cells.append(cell)
+        sheet.append(cells)
+
+    workbook.save(file)
+
+
+def write_export(rows, file, export_format, title):
+    """Write the rows to a binary file as 'csv' or 'xlsx'."""
+    if export_format == 'csv':
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        write_csv(rows, text)
+        # Flush and hand the file back without closing it.
+        text.detach()
+    else:
+        write_xlsx(rows, file, title)
+
+
+def csv_response(rows, filename):
+    """Stream the rows as a CSV download."""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows),
+        content_type=CSV_CONTENT_TYPE,
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}.csv"'.format(filename)
+    return response
+
+
+def xlsx_response(rows, filename):
+    """
+    Stream the rows as an XLSX download.
+
+    A workbook is a zip archive that can only be finished once every row is known, so
+    it is written to a temporary file first and then streamed from there.
+    """
+    file = tempfile.TemporaryFile()
+    write_xlsx(rows, file, filename)
+    file.seek(0)
+
+    response = FileResponse(file, content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="{}.xlsx"'.format(filename)
+    return response
+
+
+EXPORT_RESPONSES = {
+    'csv': csv_response,
+    'xlsx': xlsx_response,
+}
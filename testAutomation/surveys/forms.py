@@ -1,24 +1,29 @@
 import json
 from datetime import date
+from functools import lru_cache
 
 from crispy_forms.bootstrap import FormActions, StrictButton
 from crispy_forms.helper import FormHelper
-from crispy_forms.layout import Button, Div, Field, HTML, Layout
+from crispy_forms.layout import Div, Field, HTML, Layout
 from django import forms
 from django.core.urlresolvers import reverse
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from documents.forms import DocumentLookupSelect
 from documents.models import Document
 from subscriptions.models import AssessmentPurchase, Order
 from users.models import Invitation, Organisation, User
+from users.roles import has_role
 from .models import (
+    ExportJob,
     LEVEL_CHOICES,
     Survey,
     SurveyAnswer,
     SurveyAnswerDocument,
     SurveyResponse,
 )
+from .snapshots import build_snapshot
 
 
 BOOL_CHOICES = ((True, 'Yes'), (False, 'No'))
@@ -48,9 +53,8 @@ class SurveyLevelForm(forms.ModelForm):
         self.fields['level'].choices = LEVEL_CHOICES
 
 
-class SurveyAnswerForm(forms.ModelForm):
-    operation = forms.CharField(required=False, widget=forms.HiddenInput())
-
+class SurveyAnswerRulesMixin:
+    """Validation shared by the answer forms."""
     # Make fields required based on SurveyAnswer.value
     required_if_value = {
         'explanation': [
@@ -60,6 +64,198 @@ class SurveyAnswerForm(forms.ModelForm):
         ],
         'due_date': [SurveyAnswer.ANSWER_PROGRESS],
     }
+    document_required_msg = _(
+        'You need to attach at least one document, '
+        'if you do not have a document available please select '
+        'in progress and come back to this question later'
+    )
+
+    def clean_due_date(self):
+        due_date = self.cleaned_data.get('due_date')
+        if due_date and due_date < date.today():
+            raise forms.ValidationError("This should be in the future.")
+        return due_date
+
+    def add_required_if_value_errors(self, cleaned_data):
+        required_msg = forms.Field.default_error_messages['required']
+        value = cleaned_data.get('value')
+        for field_name, values in self.required_if_value.items():
+            required = value in values
+            if required and not cleaned_data.get(field_name):
+                self.add_error(field_name, required_msg)
+
+
+# Shown once an answer is saved, `form` is the answer form being rendered.
+ANSWER_CLEAR_BUTTON = """
+    {% if form.instance.pk %}
+        {% url 'survey-answer-delete' pk=form.instance.pk as clear_url %}
+        <div>
+            <input type="button" name="clear" value="Clear" id="button-id-clear"
+                class="btn btn-fw white mb-3"
+                onclick="app.loadModal('{{ clear_url }}', 'Clear answer')" />
+        </div>
+    {% endif %}
+"""
+
+
+# The layouts of the answer forms are the same for every question, so each helper is
+# built once per process rather than for every form of a section.
+@lru_cache(maxsize=None)
+def get_answer_helper():
+    helper = FormHelper()
+    helper.form_tag = False
+    helper.layout = Layout(
+        Div(
+            Field('options'),
+            css_class='js-answer-options mb-4',
+        ),
+        Div(
+            Field(
+                'value',
+                template='surveys/crispy/survey_radioselect.html',
+                data_required_on_change=json.dumps(
+                    SurveyAnswerRulesMixin.required_if_value,
+                ),
+            ),
+            HTML(ANSWER_CLEAR_BUTTON),
+            css_class='js-answer-value d-flex flex-xs-sm-down-wrap',
+        ),
+        Div(
+            Div(
+                Field('explanation', placeholder=_('Recommended maximum 150 words')),
+                css_class="flex-sm p-1",
+            ),
+            Div(
+                Field(
+                    'due_date',
+                    data_plugin='datepicker',
+                    data_option=json.dumps({
+                        'autoclose': True,
+                        'format': 'dd/mm/yyyy',
+                        'startDate': '+1d',
+                    }),
+                    placeholder=_('Pick a date'),
+                ),
+                css_class="p-1 conditional"
+            ),
+            css_class="d-flex flex-column flex-sm-row"
+        ),
+        Field('operation', css_class='js-operation'),
+    )
+    return helper
+
+
+@lru_cache(maxsize=None)
+def get_attach_helper():
+    helper = FormHelper()
+    helper.form_tag = False
+    helper.disable_csrf = True
+    helper.layout = Layout(
+        Div(
+            Div(
+                Div(
+                    Field(
+                        'attach_document',
+                        data_plugin='select2',
+                        data_option=json.dumps({
+                            'ajax': {
+                                'url': reverse('document-lookup'),
+                                'dataType': 'json',
+                                'delay': 250,
+                            },
+                        }),
+                        data_placeholder='Choose...',
+                        style="width:100%",
+                    ),
+                    css_class='font-weight-normal js-attach-document-select'
+                ),
+                Div(
+                    Field(
+                        'attach_explanation',
+                        placeholder=_(
+                            'Document name, page number, and paragraph '
+                            'reference for the reviewer '
+                            '(Recommended maximum 150 words)'
+                        ),
+                    ),
+                    css_class="form-group",
+                ),
+                css_class='form-group width-100',
+            ),
+            Div(
+                StrictButton(
+                    'Attach',
+                    type='button',
+                    css_class='js-operation-button is-primary w-100 max-w-240',
+                    value='attach_document',
+                ),
+                css_class='text-right mt-4'
+            ),
+            css_class='align-items-start',
+        )
+    )
+    return helper
+
+
+@lru_cache(maxsize=None)
+def get_upload_helper():
+    helper = FormHelper()
+    helper.form_tag = False
+    helper.disable_csrf = True
+    helper.layout = Layout(
+        Div(
+            Div(
+                Field(
+                    'upload_name',
+                    placeholder='Type here...',
+                    css_class='mb-3 max-w-600',
+                ),
+                Field(
+                    'upload_expiry',
+                    css_class='max-w-240',
+                    placeholder='dd/mm/yyyy',
+                    data_plugin='datepicker',
+                    data_option=json.dumps({
+                        'autoclose': True,
+                        'startDate': '+1d',
+                        'format': 'dd/mm/yyyy',
+                    }),
+                ),
+                css_class='flex-sm mr-sm-3 w-sm-down-full'
+            ),
+            Div(
+                Field(
+                    'upload_file',
+                    template='select_file.html'
+                ),
+                css_class='w-sm-down-full'
+            ),
+            css_class='d-flex align-items-start flex-column flex-sm-row'
+        ),
+        Div(
+            Field(
+                'upload_explanation',
+                placeholder=_(
+                    'Document name, page number, and paragraph '
+                    'reference for the reviewer (Recommended maximum 150 words)'
+                ),
+            ),
+            Div(
+                StrictButton(
+                    'Upload & attach',
+                    type='button',
+                    css_class='js-operation-button is-primary w-100 max-w-240',
+                    value='upload_document',
+                ),
+                css_class='text-right mt-4'
+            ),
+        ),
+    )
+    return helper
+
+
+class SurveyAnswerForm(SurveyAnswerRulesMixin, forms.ModelForm):
+    operation = forms.CharField(required=False, widget=forms.HiddenInput())
 
     # Make fields required based on `operation`
     required_if_operation = {
@@ -92,64 +288,7 @@ class SurveyAnswerForm(forms.ModelForm):
 
         self.fields['due_date'].label = 'Completion date'
 
-        # Data for jQuery to make the fields required based on selection
-        data_required_on_change = {
-            '#div_id_%s' % self.add_prefix(field_name): values
-            for field_name, values in self.required_if_value.items()
-        }
-
-        value_field_div = Div(
-            Field(
-                'value',
-                template='surveys/crispy/survey_radioselect.html',
-                data_required_on_change=json.dumps(data_required_on_change),
-            ),
-            css_class='js-answer-value d-flex flex-xs-sm-down-wrap',
-        )
-
-        if self.instance.pk:
-            url = reverse('survey-answer-delete', kwargs={'pk': self.instance.pk})
-            value_field_div.append(
-                Div(
-                    Button(
-                        'clear',
-                        'Clear',
-                        css_class='btn btn-fw white mb-3',
-                        onclick="app.loadModal('{}', 'Clear answer')".format(url),
-                    ),
-                )
-            )
-
-        self.helper = FormHelper()
-        self.helper.form_tag = False
-        self.helper.layout = Layout(
-            Div(
-                Field('options'),
-                css_class='js-answer-options mb-4',
-            ),
-            value_field_div,
-            Div(
-                Div(
-                    Field('explanation', placeholder=_('Recommended maximum 150 words')),
-                    css_class="flex-sm p-1",
-                ),
-                Div(
-                    Field(
-                        'due_date',
-                        data_plugin='datepicker',
-                        data_option=json.dumps({
-                            'autoclose': True,
-                            'format': 'dd/mm/yyyy',
-                            'startDate': '+1d',
-                        }),
-                        placeholder=_('Pick a date'),
-                    ),
-                    css_class="p-1 conditional"
-                ),
-                css_class="d-flex flex-column flex-sm-row"
-            ),
-            Field('operation', css_class='js-operation'),
-        )
+        self.helper = get_answer_helper()
 
         if question.upload_type:
             get_question_document_field = SurveyAnswerDocument._meta.get_field
@@ -159,6 +298,7 @@ class SurveyAnswerForm(forms.ModelForm):
                 attach_document=get_question_document_field('document').formfield(
                     queryset=documents,
                     required=False,
+                    widget=DocumentLookupSelect,
                 ),
                 attach_explanation=get_question_document_field('explanation').formfield(
                     required=False,
@@ -173,114 +313,14 @@ class SurveyAnswerForm(forms.ModelForm):
                 ),
             )
 
-            self.attach_helper = FormHelper()
-            self.attach_helper.form_tag = False
-            self.attach_helper.disable_csrf = True
-            self.attach_helper.layout = Layout(
-                Div(
-                    Div(
-                        Div(
-                            Field(
-                                'attach_document',
-                                data_plugin='select2',
-                                data_option='{}',
-                                data_placeholder='Choose...',
-                                style="width:100%",
-                            ),
-                            css_class='font-weight-normal js-attach-document-select'
-                        ),
-                        Div(
-                            Field(
-                                'attach_explanation',
-                                placeholder=_(
-                                    'Document name, page number, and paragraph '
-                                    'reference for the reviewer '
-                                    '(Recommended maximum 150 words)'
-                                ),
-                            ),
-                            css_class="form-group",
-                        ),
-                        css_class='form-group width-100',
-                    ),
-                    Div(
-                        StrictButton(
-                            'Attach',
-                            type='button',
-                            css_class='js-operation-button is-primary w-100 max-w-240',
-                            value='attach_document',
-                        ),
-                        css_class='text-right mt-4'
-                    ),
-                    css_class='align-items-start',
-                )
-            )
-            self.upload_helper = FormHelper()
-            self.upload_helper.form_tag = False
-            self.upload_helper.disable_csrf = True
-            self.upload_helper.layout = Layout(
-                Div(
-                    Div(
-                        Field(
-                            'upload_name',
-                            placeholder='Type here...',
-                            css_class='mb-3 max-w-600',
-                        ),
-                        Field(
-                            'upload_expiry',
-                            css_class='max-w-240',
-                            placeholder='dd/mm/yyyy',
-                            data_plugin='datepicker',
-                            data_option=json.dumps({
-                                'autoclose': True,
-                                'startDate': '+1d',
-                                'format': 'dd/mm/yyyy',
-                            }),
-                        ),
-                        css_class='flex-sm mr-sm-3 w-sm-down-full'
-                    ),
-                    Div(
-                        Field(
-                            'upload_file',
-                            template='select_file.html'
-                        ),
-                        css_class='w-sm-down-full'
-                    ),
-                    css_class='d-flex align-items-start flex-column flex-sm-row'
-                ),
-                Div(
-                    Field(
-                        'upload_explanation',
-                        placeholder=_(
-                            'Document name, page number, and paragraph '
-                            'reference for the reviewer (Recommended maximum 150 words)'
-                        ),
-                    ),
-                    Div(
-                        StrictButton(
-                            'Upload & attach',
-                            type='button',
-                            css_class='js-operation-button is-primary w-100 max-w-240',
-                            value='upload_document',
-                        ),
-                        css_class='text-right mt-4'
-                    ),
-                ),
-            )
-
-    def clean_due_date(self):
-        due_date = self.cleaned_data.get('due_date')
-        if due_date and due_date < date.today():
-            raise forms.ValidationError("This should be in the future.")
-        return due_date
+            self.attach_helper = get_attach_helper()
+            self.upload_helper = get_upload_helper()
 
     def clean(self):
         required_msg = forms.Field.default_error_messages['required']
         cleaned_data = super().clean()
         value = cleaned_data.get('value')
-        for field_name, values in self.required_if_value.items():
-            required = value in values
-            if required and not cleaned_data.get(field_name):
-                self.add_error(field_name, required_msg)
+        self.add_required_if_value_errors(cleaned_data)
 
         operation = cleaned_data.get('operation')
         for field_name in self.required_if_operation.get(operation, ()):
@@ -294,14 +334,7 @@ class SurveyAnswerForm(forms.ModelForm):
             if not operation and len(self.instance.documents.all()) == 0:
                 # This is not and attach or upload operation and there are no
                 # existing attachments
-                self.add_error(
-                    'value',
-                    _(
-                        'You need to attach at least one document, '
-                        'if you do not have a document available please select '
-                        'in progress and come back to this question later'
-                    ),
-                )
+                self.add_error('value', self.document_required_msg)
 
         return cleaned_data
 
@@ -335,6 +368,50 @@ class SurveyAnswerForm(forms.ModelForm):
             )
 
 
+class SurveyAnswerBulkForm(SurveyAnswerRulesMixin, forms.Form):
+    """
+    Validate one answer of a bulk submission.
+
+    `question` is a `QuestionInfo` from the survey structure and `answer` the existing
+    `SurveyAnswer` (annotated with `documents_count`) if there is one, so no queries
+    are needed. Documents can't be attached here, use `SurveyAnswerForm` for that.
+    """
+    value = forms.ChoiceField(choices=SurveyAnswer.ANSWER_CHOICES)
+    options = forms.TypedMultipleChoiceField(coerce=int, required=False)
+    explanation = forms.CharField(required=False)
+    due_date = forms.DateField(required=False)
+
+    def __init__(self, question, answer=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.question = question
+        self.answer = answer
+        self.fields['options'].choices = question.options
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.add_required_if_value_errors(cleaned_data)
+
+        value = cleaned_data.get('value')
+        upload_type = self.question.upload_type
+        if not self.errors and upload_type and value == SurveyAnswer.ANSWER_YES:
+            if self.answer is None or self.answer.documents_count == 0:
+                self.add_error('value', self.document_required_msg)
+
+        return cleaned_data
+
+    def get_answer(self, response):
+        """Return the new or updated (unsaved) `SurveyAnswer`."""
+        answer = self.answer
+        if answer is None:
+            answer = SurveyAnswer(response=response, question_id=self.question.pk)
+        else:
+            answer.response = response
+        answer.value = self.cleaned_data['value']
+        answer.explanation = self.cleaned_data['explanation']
+        answer.due_date = self.cleaned_data['due_date']
+        return answer
+
+
 class SubmitForm(forms.ModelForm):
     class Meta:
         model = SurveyResponse
@@ -362,6 +439,7 @@ class SubmitForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
         instance.submitted = timezone.now()
+        instance.snapshot = build_snapshot(instance)
         if commit:
             instance.save()
         return instance
@@ -568,3 +646,25 @@ class InvitationForm(forms.ModelForm):
             css_class="mb-5"
         )
     )
+
+
+class ExportJobForm(forms.ModelForm):
+    class Meta:
+        model = ExportJob
+        fields = ('kind', 'survey', 'format')
+
+    def __init__(self, user, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instance.user = user
+        self.fields['survey'].queryset = Survey.objects.filter(is_active=True)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        kind = cleaned_data.get('kind')
+        if kind == ExportJob.KIND_RESPONSES and not cleaned_data.get('survey'):
+            self.add_error('survey', forms.Field.default_error_messages['required'])
+
+        is_manager = has_role(self.instance.user, ['admin', 'manager'])
+        if kind == ExportJob.KIND_INVITATIONS and not is_manager:
+            self.add_error('kind', _('Only admins and managers can export invitations.'))
+        return cleaned_data
@@ -0,0 +1,43 @@
+"""
+Copy a survey with all of its questions and their options, e.g. for a new year.
+
+Everything is copied with a fixed number of bulk queries in one transaction.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from surveys.models import Survey
+
+
+class Command(BaseCommand):
+    help = 'Copy a survey with its questions and their options.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey', help='The name of the survey to copy.')
+        parser.add_argument('name', help='The name of the new survey.')
+        parser.add_argument(
+            '--inactive',
+            action='store_true',
+            help='Make the new survey inactive.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            survey = Survey.objects.get(name=options['survey'])
+        except Survey.DoesNotExist:
+            raise CommandError('There is no survey called "{}".'.format(
+                options['survey'],
+            ))
+        if Survey.objects.filter(name=options['name']).exists():
+            raise CommandError('A survey called "{}" already exists.'.format(
+                options['name'],
+            ))
+
+        is_active = False if options['inactive'] else None
+        copy = survey.clone(options['name'], is_active=is_active)
+
+        if options['verbosity']:
+            self.stdout.write('Copied "{}" to "{}" with {} questions.'.format(
+                survey,
+                copy,
+                copy.questions.count(),
+            ))
@@ -0,0 +1,387 @@
+"""
+Import the questions of a survey from a CSV file.
+
+The CSV needs Name, Code, Upload and Reference columns and may have Notes and Options
+columns, with one option per line of the cell. A code like `4.3.2.1` is made of the
+area, section, tier and question numbers. Missing areas and sections are created.
+
+The file is read a row at a time and everything is written with a fixed number of
+bulk queries in one transaction. With `--overwrite` an existing survey is brought in
+line with the file: only changed questions are updated and questions that aren't in
+the file any more are deleted. Deleting a question deletes its answers, so questions
+that have been answered are only deleted with `--delete-answered`.
+"""
+import csv
+import re
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from surveys import structure
+from surveys.models import (
+    LEVEL_CHOICES,
+    Survey,
+    SurveyAnswer,
+    SurveyArea,
+    SurveyQuestion,
+    SurveyQuestionOption,
+    SurveyResponse,
+    SurveyResponseProgress,
+    SurveySection,
+)
+
+
+COLUMNS = ('Name', 'Code', 'Upload', 'Reference')
+CODE_PATTERN = re.compile(r'^(\d+)\.(\d+)\.(\d+)\.(\d+)$')
+UPLOAD_TYPES = {value for value, _label in SurveyQuestion.UPLOAD_TYPES}
+LEVELS = {level for level, _label in LEVEL_CHOICES}
+
+# Fields compared to decide if an existing question has changed.
+QUESTION_FIELDS = ('name', 'notes', 'upload_type', 'reference')
+
+
+def ensure_extension(filename, extension):
+    """Add the extension to the filename if it hasn't got it already."""
+    suffix = '.' + extension
+    if not filename.endswith(suffix):
+        filename += suffix
+    return filename
+
+
+def open_csv_file(filename):
+    return open(filename, newline='', encoding='utf-8-sig')
+
+
+def _get_column(row, column):
+    """Return a stripped optional column or None if the CSV doesn't have it."""
+    value = row.get(column)
+    return None if value is None else value.strip()
+
+
+def parse_rows(file):
+    """
+    Yield a dict of the question fields of each row of the CSV.
+
+    Raise a ValueError naming the line of the first invalid row.
+    """
+    reader = csv.DictReader(file)
+    if not set(COLUMNS).issubset(reader.fieldnames or ()):
+        raise ValueError('The CSV must have Name, Code, Upload and Reference columns.')
+
+    codes = set()
+    for row in reader:
+        line = reader.line_num
+        # DictReader fills the columns missing from a short row with None.
+        missing = [column for column in reader.fieldnames if row[column] is None]
+        if missing:
+            raise ValueError('The entry at line {} is missing columns: {}.'.format(
+                line,
+                ', '.join(missing),
+            ))
+
+        name = row['Name'].strip()
+        code = row['Code'].strip()
+        if not name or not code:
+            raise ValueError(
+                'The entry at line {} must have both Name and Code. ({})'.format(
+                    line,
+                    name or code,
+                ),
+            )
+
+        match = CODE_PATTERN.match(code)
+        if match is None:
+            raise ValueError(
+                'A code must consist of four digits (e.g. 4.3.2.1) '
+                '- the code at line {} is {}'.format(line, code),
+            )
+        if code in codes:
+            raise ValueError('The code {} at line {} is used more than once.'.format(
+                code,
+                line,
+            ))
+        codes.add(code)
+
+        area, section, level, question_number = (int(part) for part in match.groups())
+        if level not in LEVELS:
+            raise ValueError('The tier of the code {} at line {} must be 1 to {}.'.format(
+                code,
+                line,
+                len(LEVELS),
+            ))
+
+        upload_type = row['Upload'].strip().lower()
+        if upload_type and upload_type not in UPLOAD_TYPES:
+            raise ValueError(
+                'The entry at line {}, with code {}, must have Policy, Procedure, '
+                'Process or nothing in the Upload column.'.format(line, code),
+            )
+
+        options = _get_column(row, 'Options')
+        if options is not None:
+            options = list(OrderedDict.fromkeys(
+                option.strip() for option in options.splitlines() if option.strip()
+            ))
+
+        yield {
+            'area': area,
+            'section': section,
+            'level': level,
+            'question_number': question_number,
+            'name': name,
+            'notes': _get_column(row, 'Notes'),
+            'upload_type': upload_type,
+            'reference': row['Reference'].strip(),
+            'options': options,
+        }
+
+
+class Command(BaseCommand):
+    help = 'Import the questions of a survey from a CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey', help='The name of the survey.')
+        parser.add_argument('filename', help='The CSV file to import.')
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Update the questions of the survey if it already exists.',
+        )
+        parser.add_argument(
+            '--delete-answered',
+            action='store_true',
+            help=(
+                'Delete questions that are not in the file even if they have been '
+                'answered, with their answers.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        filename = ensure_extension(options['filename'], 'csv')
+        with open_csv_file(filename) as file:
+            rows = list(parse_rows(file))
+
+        with transaction.atomic():
+            survey, created = Survey.objects.get_or_create(name=options['survey'])
+            if not created and not options['overwrite']:
+                raise CommandError(
+                    'The survey "{}" already exists, use --overwrite to update '
+                    'it.'.format(survey),
+                )
+            counts = self.import_questions(
+                survey,
+                rows,
+                delete_answered=options['delete_answered'],
+                verbosity=options['verbosity'],
+            )
+
+            # Nothing above sends signals, so bring the cached structure and the
+            # progress of any existing responses up to date. The structure is dropped
+            # again once committed, so one cached from the old rows meanwhile isn't kept.
+            structure.invalidate(survey.pk)
+            transaction.on_commit(lambda: structure.invalidate(survey.pk))
+            responses = list(SurveyResponse.objects.filter(survey=survey))
+            if responses:
+                SurveyResponseProgress.objects.rebuild(responses)
+
+        if options['verbosity']:
+            self.stdout.write(
+                'Imported "{}": {} created, {} updated, {} deleted.'.format(
+                    survey,
+                    *counts
+                ),
+            )
+
+    def get_sections(self, rows):
+        """Return the sections of the rows by (area, section) number, creating any."""
+        area_numbers = {row['area'] for row in rows}
+        areas = {
+            area.number: area
+            for area in SurveyArea.objects.filter(number__in=area_numbers)
+        }
+        # Postgres returns the pks of bulk created rows.
+        areas.update(
+            (area.number, area)
+            for area in SurveyArea.objects.bulk_create(
+                SurveyArea(number=number, name='Area {}'.format(number))
+                for number in area_numbers - set(areas)
+            )
+        )
+
+        sections = SurveySection.objects.filter(
+            area__number__in=area_numbers,
+        ).select_related('area')
+        sections = {
+            (section.area.number, section.number): section
+            for section in sections
+        }
+        section_numbers = {(row['area'], row['section']) for row in rows}
+        sections.update(
+            ((section.area.number, section.number), section)
+            for section in SurveySection.objects.bulk_create(
+                SurveySection(
+                    area=areas[area],
+                    number=number,
+                    name='Section {}.{}'.format(area, number),
+                )
+                for area, number in section_numbers - set(sections)
+            )
+        )
+        return sections
+
+    def check_removed(self, questions, delete_answered, verbosity):
+        """
+        Refuse to delete questions that have been answered, listing them with the
+        number of answers that would be deleted, unless `delete_answered` is set.
+        """
+        answers = SurveyAnswer.objects.filter(
+            question__in=questions,
+        ).values('question').annotate(
+            count=models.Count('id'),
+            submitted=models.Sum(models.Case(
+                models.When(response__submitted__isnull=False, then=1),
+                output_field=models.IntegerField(),
+                default=0,
+            )),
+        ).order_by()
+        answers = {row['question']: row for row in answers}
+        if not answers:
+            return
+
+        lines = [
+            '  {}: {} answers, {} of submitted responses'.format(
+                question.get_code(),
+                answers[question.pk]['count'],
+                answers[question.pk]['submitted'],
+            )
+            for question in sorted(questions, key=lambda question: question.get_code())
+            if question.pk in answers
+        ]
+        if not delete_answered:
+            raise CommandError(
+                '{} questions not in the file have been answered. Use '
+                '--delete-answered to delete them with their answers:\n{}'.format(
+                    len(lines),
+                    '\n'.join(lines),
+                ),
+            )
+        if verbosity:
+            self.stdout.write(
+                'Deleting {} answered questions:\n{}'.format(
+                    len(lines),
+                    '\n'.join(lines),
+                ),
+            )
+
+    def import_questions(self, survey, rows, delete_answered=False, verbosity=1):
+        """
+        Create, update and delete the survey's questions to match the rows.
+
+        Return the number of questions created, updated and deleted.
+        """
+        sections = self.get_sections(rows)
+        existing = {
+            (question.section_id, question.level, question.question_number): question
+            for question in SurveyQuestion.objects.filter(
+                survey=survey,
+            ).select_related('section__area')
+        }
+        existing_options = {}
+        option_names = SurveyQuestionOption.objects.filter(
+            question__survey=survey,
+        ).order_by('sort_order').values_list('question_id', 'name')
+        for question_id, name in option_names:
+            existing_options.setdefault(question_id, []).append(name)
+
+        new_questions = []
+        changed_questions = []
+        # Pairs of a question and the option names that replace its options.
+        question_options = []
+        for row in rows:
+            section = sections[row['area'], row['section']]
+            key = (section.pk, row['level'], row['question_number'])
+            question = existing.pop(key, None)
+            if question is None:
+                question = SurveyQuestion(
+                    survey=survey,
+                    section=section,
+                    level=row['level'],
+                    question_number=row['question_number'],
+                )
+                new_questions.append(question)
+            elif any(
+                row[field] is not None and row[field] != getattr(question, field)
+                for field in QUESTION_FIELDS
+            ):
+                changed_questions.append(question)
+
+            for field in QUESTION_FIELDS:
+                if row[field] is not None:
+                    setattr(question, field, row[field])
+
+            options = row['options']
+            if options is not None and options != existing_options.get(question.pk, []):
+                question_options.append((question, options))
+
+        SurveyQuestion.objects.bulk_create(new_questions)
+        self.update_questions(changed_questions)
+        self.replace_options(question_options, existing_options)
+
+        removed = list(existing.values())
+        if removed:
+            self.check_removed(removed, delete_answered, verbosity)
+            SurveyQuestion.objects.filter(
+                pk__in=[question.pk for question in removed],
+            ).delete()
+
+        return len(new_questions), len(changed_questions), len(removed)
+
+    def update_questions(self, questions):
+        """Save the changed fields of many questions with a single query."""
+        if not questions:
+            return
+
+        # Django 1.11 has no bulk_update(), so set each field with one CASE.
+        question_pks = [question.pk for question in questions]
+        SurveyQuestion.objects.filter(pk__in=question_pks).update(**{
+            field: models.Case(
+                *[
+                    models.When(pk=question.pk, then=models.Value(
+                        getattr(question, field),
+                    ))
+                    for question in questions
+                ],
+                output_field=SurveyQuestion._meta.get_field(field)
+            )
+            for field in QUESTION_FIELDS
+        })
+
+    def replace_options(self, question_options, existing_options):
+        """Replace the options of the questions with new ones of the given names."""
+        if not question_options:
+            return
+
+        replaced = [
+            question.pk
+            for question, _names in question_options
+            if question.pk in existing_options
+        ]
+        if replaced:
+            SurveyQuestionOption.objects.filter(question__in=replaced).delete()
+
+        # Options are created without save(), so number them as Orderable would.
+        last = SurveyQuestionOption.objects.aggregate(
+            last=models.Max('sort_order'),
+        )['last'] or 0
+        SurveyQuestionOption.objects.bulk_create(
+            SurveyQuestionOption(question=question, name=name, sort_order=sort_order)
+            for sort_order, (question, name) in enumerate(
+                (
+                    (question, name)
+                    for question, names in question_options
+                    for name in names
+                ),
+                start=last + 1,
+            )
+        )
@@ -0,0 +1,27 @@
+"""
+Snapshot the submitted survey responses that have no snapshot of their tier, e.g.
+those submitted before snapshots were taken.
+"""
+from django.core.management.base import BaseCommand
+
+from surveys.models import SurveyResponse
+from surveys.snapshots import build_snapshot, is_current
+
+
+class Command(BaseCommand):
+    help = 'Snapshot submitted survey responses for their reports and exports.'
+
+    def handle(self, *args, **options):
+        responses = SurveyResponse.objects.filter(submitted__isnull=False).order_by('pk')
+        count = 0
+        for response in responses.iterator():
+            if is_current(response):
+                continue
+            # Update the row alone so the response isn't marked as modified.
+            SurveyResponse.objects.filter(pk=response.pk).update(
+                snapshot=build_snapshot(response),
+            )
+            count += 1
+
+        if options['verbosity']:
+            self.stdout.write('Snapshotted {} responses.'.format(count))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_response_progress(apps, schema_editor):
+    SurveyAnswer = apps.get_model('surveys', 'SurveyAnswer')
+    SurveyQuestion = apps.get_model('surveys', 'SurveyQuestion')
+    SurveyResponse = apps.get_model('surveys', 'SurveyResponse')
+    SurveyResponseProgress = apps.get_model('surveys', 'SurveyResponseProgress')
+
+    questions = SurveyQuestion.objects.values('survey', 'section', 'level').annotate(
+        count=models.Count('id'),
+    ).order_by()
+    questions_lookup = defaultdict(list)
+    for question in questions:
+        questions_lookup[question['survey']].append(question)
+
+    rows = {}
+    for response in SurveyResponse.objects.only('pk', 'survey'):
+        for question in questions_lookup[response.survey_id]:
+            key = (response.pk, question['section'], question['level'])
+            rows[key] = SurveyResponseProgress(
+                response_id=response.pk,
+                section_id=question['section'],
+                level=question['level'],
+                question_count=question['count'],
+            )
+
+    answers = SurveyAnswer.objects.values(
+        'response',
+        'question__section',
+        'question__level',
+    ).annotate(
+        count=models.Count('id'),
+        yes=models.Sum(models.Case(
+            models.When(value='yes', then=1),
+            output_field=models.IntegerField(),
+            default=0,
+        )),
+    ).order_by()
+    for answer in answers:
+        key = (answer['response'], answer['question__section'], answer['question__level'])
+        try:
+            row = rows[key]
+        except KeyError:
+            row = rows[key] = SurveyResponseProgress(
+                response_id=key[0],
+                section_id=key[1],
+                level=key[2],
+            )
+        row.answer_count = answer['count']
+        row.yes_count = answer['yes']
+
+    SurveyResponseProgress.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0045_separate_no_not_applicable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyResponseProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.IntegerField(choices=[(1, 'Bronze'), (2, 'Silver'), (3, 'Gold'), (4, 'Platinum')])),
+                ('question_count', models.IntegerField(default=0)),
+                ('answer_count', models.IntegerField(default=0)),
+                ('yes_count', models.IntegerField(default=0)),
+                ('response', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_counts', to='surveys.SurveyResponse')),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='surveys.SurveySection')),
+            ],
+            options={
+                'ordering': ('section__area__number', 'section__number', 'level'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='surveyresponseprogress',
+            unique_together=set([('response', 'section', 'level')]),
+        ),
+        migrations.RunPython(create_response_progress, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,8 @@
-from functools import partial
+from collections import Counter, defaultdict, OrderedDict
 
 from django.contrib.postgres.fields import JSONField
 from django.core.validators import MinValueValidator, ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
@@ -12,8 +12,10 @@ from surveys.querysets import (
     SurveyAnswerQueryset,
     SurveyQueryset,
     SurveyQuestionQueryset,
+    SurveyResponseProgressQueryset,
     SurveyResponseQueryset,
 )
+from surveys.structure import get_structure
 
 LEVEL_CHOICES = (
     (1, 'Bronze'),
@@ -37,14 +39,22 @@ class Survey(models.Model):
     def __str__(self):
         return self.name
 
+    def get_structure(self):
+        """Return the cached `SurveyStructure` snapshot of this survey."""
+        return get_structure(self.pk)
+
     def get_sections(self):
         """Return a list of sections available for this survey."""
-        sections = SurveySection.objects.filter(
-            surveyquestion__survey=self,
-        )
-        sections = sections.select_related('area')
-        sections = sections.distinct()
-        return sections
+        return list(self.get_structure().sections)
+
+    def clone(self, name, is_active=None):
+        """Return a new survey called `name` with copies of this survey's questions."""
+        if is_active is None:
+            is_active = self.is_active
+        with transaction.atomic():
+            survey = Survey.objects.create(name=name, is_active=is_active)
+            self.questions.all().copy_to(survey)
+        return survey
 
 
 class SurveyArea(models.Model):
@@ -97,6 +107,14 @@ class SurveyQuestion(models.Model):
     class Meta:
         ordering = ('section', 'level', 'question_number')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_placement = self.get_placement()
+
+    def get_placement(self):
+        """Return the (survey, section, level) this question is counted against."""
+        return (self.survey_id, self.section_id, self.level)
+
     def get_code(self):
         """Return the full 4-digit code."""
         return '{}.{}.{}'.format(
@@ -135,6 +153,9 @@ class SurveyResponse(models.Model):
     modified = models.DateTimeField(auto_now=True)
     submitted = models.DateTimeField(editable=False, null=True)
     answers_old = JSONField(default={})
+    # The frozen report and export data of the submitted response, see
+    # `surveys.snapshots`.
+    snapshot = JSONField(editable=False, null=True)
     level = models.IntegerField(
         verbose_name=_('target tier'),
         choices=LEVEL_CHOICES,
@@ -146,6 +167,10 @@ class SurveyResponse(models.Model):
     class Meta:
         ordering = ('created',)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_survey_id = self.survey_id
+
     def get_summary_url(self, is_complete=False):
         if is_complete:
             return reverse('survey-compliance', kwargs={'pk': self.pk})
@@ -181,13 +206,11 @@ class SurveyResponse(models.Model):
         }
 
     @classmethod
-    def _build_level_stats(cls, answered, questions, key_formater):
+    def _build_level_stats(cls, level_counts):
         levels = {}
         for level, label in LEVEL_CHOICES:
-            key = key_formater(level)
-            questions_count = questions[key] or 0
-            answered_count = answered[key] or 0
-            info = cls.get_progress_info(answered_count, questions_count)
+            counts = level_counts[level]
+            info = cls.get_progress_info(counts['yes'], counts['questions'])
             info.update({
                 'level': level,
                 'label': label,
@@ -196,32 +219,66 @@ class SurveyResponse(models.Model):
         return levels
 
     @classmethod
-    def _count_when(cls, then=1, **kwargs):
-        """Utility method to generate ORM/SQL to count rows based on filter conditions"""
-        return models.Sum(models.Case(
-            models.When(then=then, **kwargs),
-            output_field=models.IntegerField(),
-            default=0,
-        ))
-
-    def get_section_question_counts(self, sections):
+    def _accumulate_levels(cls, level_counts):
+        """Turn counts per level into cumulative counts at or below each level."""
+        cumulative = {}
+        running = Counter()
+        for level, _label in LEVEL_CHOICES:
+            running.update(level_counts[level])
+            cumulative[level] = Counter(running)
+        return cumulative
+
+    def get_count_matrix(self):
         """
-        Aggregate the count of questions per section in a single query by selecting
-        the sum of the questions for each section.
+        Fold the materialised progress counts into cumulative counts per section and
+        level with a single query.
+
+        Return a tuple of (`sections`, `section_levels`, `levels`) where `sections` are
+        the survey's sections in order, `section_levels` maps a section pk to a dict of
+        level to a Counter of the 'questions', 'answered' and 'yes' counts at or below
+        that level and `levels` holds the same cumulative counts for all sections.
         """
-        return self.survey.questions.filter(level__lte=self.level).aggregate(
-            total=models.Count('id'),
-            **{
-                str(section.pk): self._count_when(section=section)
-                for section in sections
+        sections = OrderedDict()
+        section_rows = defaultdict(lambda: defaultdict(Counter))
+        level_rows = defaultdict(Counter)
+        for row in self.progress_counts.select_related('section__area'):
+            if row.question_count:
+                sections.setdefault(row.section_id, row.section)
+            counts = {
+                'questions': row.question_count,
+                'answered': row.answer_count,
+                'yes': row.yes_count,
             }
-        )
+            section_rows[row.section_id][row.level].update(counts)
+            level_rows[row.level].update(counts)
+
+        section_levels = {
+            section_id: self._accumulate_levels(rows)
+            for section_id, rows in section_rows.items()
+        }
+        levels = self._accumulate_levels(level_rows)
+        return list(sections.values()), section_levels, levels
+
+    def get_section_counts(self):
+        """
+        Return the counts up to the response's level per section with a single query.
+
+        Return a tuple of (`sections`, `section_counts`, `totals`) where `sections` are
+        the survey's sections in order and `section_counts` maps a section pk to a
+        Counter of its 'questions', 'answered' and 'yes' counts, like `totals`.
+        """
+        sections, section_levels, levels = self.get_count_matrix()
+        section_counts = {
+            section_id: counts[self.level]
+            for section_id, counts in section_levels.items()
+        }
+        return sections, section_counts, levels[self.level]
 
     def get_progress(self):
         """
-        Return the overall progress and per section by aggregating questions and answers.
+        Return the overall progress and per section from the materialised counts.
 
-        Uses 3 queries and returns of the form:
+        Uses 1 query and returns of the form:
         {
             'sections': [
                 {
@@ -262,45 +319,28 @@ class SurveyResponse(models.Model):
         }
 
         """
-        sections = self.survey.get_sections()
-
-        questions = self.get_section_question_counts(sections)
-
-        # Aggregate the count of answers per section in a single query by selecting
-        # the sum of the answers for each section.
-        answered = self.answers.filter(question__level__lte=self.level).aggregate(
-            total=models.Count('id'),
-            compliance_total=self._count_when(value=SurveyAnswer.ANSWER_YES),
-            **{
-                str(section.pk): self._count_when(question__section=section)
-                for section in sections
-            }
-        )
+        sections, section_counts, totals = self.get_section_counts()
 
         steps = []
         for section in sections:
-            questions_count = questions[str(section.pk)] or 0
-            answered_count = answered[str(section.pk)] or 0
-            info = self.get_progress_info(answered_count, questions_count)
+            counts = section_counts[section.pk]
+            info = self.get_progress_info(counts['answered'], counts['questions'])
             info.update({'section': section})
             steps.append(info)
 
-        questions_count = questions['total'] or 0
-        answered_count = answered['total'] or 0
-        compliance_count = answered['compliance_total'] or 0
-        info = self.get_progress_info(answered_count, questions_count)
+        info = self.get_progress_info(totals['answered'], totals['questions'])
         info.update({
             'sections': steps,
-            'compliance': self.get_progress_info(compliance_count, questions_count),
+            'compliance': self.get_progress_info(totals['yes'], totals['questions']),
         })
         return info
 
     def get_compliance(self):
         """
-        Return the overall progress and per level and per section compliance by
-        aggregating questions and correct (yes) answers.
+        Return the overall progress and per level and per section compliance from the
+        materialised question and correct (yes) answer counts, accumulated per level.
 
-        Uses 3 queries and returns of the form:
+        Uses 1 query and returns of the form:
         {
             'progress': {
                 'total': 5,
@@ -477,60 +517,23 @@ class SurveyResponse(models.Model):
             }
         }
         """
-        sections = self.survey.get_sections()
-
-        # Build kwargs to aggregate questions and answers counts.
-        question_kwargs = {}
-        answer_kwargs = {}
-        for level, _label in LEVEL_CHOICES:
-            level_key = str(level)
-            question_kwargs[level_key] = self._count_when(level__lte=level)
-            answer_kwargs[level_key] = self._count_when(
-                question__level__lte=level,
-                value=SurveyAnswer.ANSWER_YES,
-            )
-            for section in sections:
-                key = '{}-{}'.format(level, section.pk)
-                question_kwargs[key] = self._count_when(section=section, level__lte=level)
-                answer_kwargs[key] = self._count_when(
-                    question__section=section,
-                    question__level__lte=level,
-                    value=SurveyAnswer.ANSWER_YES,
-                )
-
-        questions = self.survey.questions.aggregate(
-            total=self._count_when(level__lte=self.level),
-            **question_kwargs
-        )
-        answered = self.answers.aggregate(
-            total=self._count_when(question__level__lte=self.level),
-            **answer_kwargs
-        )
+        sections, section_levels, levels = self.get_count_matrix()
 
         steps = []
         for section in sections:
-            keyformater = partial('{}-{section}'.format, section=section.pk)
-            levels = list(self._build_level_stats(
-                answered,
-                questions,
-                keyformater,
-            ).values())
-
+            section_stats = self._build_level_stats(section_levels[section.pk])
             steps.append({
                 'section': section,
-                'levels': levels,
+                'levels': list(section_stats.values()),
             })
 
-        levels = self._build_level_stats(answered, questions, str)
-
-        questions_count = questions['total'] or 0
-        answered_count = answered['total'] or 0
-        progress = self.get_progress_info(answered_count, questions_count)
+        totals = levels[self.level]
+        progress = self.get_progress_info(totals['answered'], totals['questions'])
 
         return {
             'progress': progress,
             'compliance': {
-                'levels': levels,
+                'levels': self._build_level_stats(levels),
                 'sections': steps,
             },
         }
@@ -538,9 +541,9 @@ class SurveyResponse(models.Model):
     def get_level_compliance(self):
         """
         Return the overall progress and per section compliance for the current level
-        by aggregating questions and correct (yes) answers.
+        from the materialised question and correct (yes) answer counts.
 
-        Uses 3 queries and returns of the form:
+        Uses 1 query and returns of the form:
         {
             'compliance': {
                 'count': 1,
@@ -589,34 +592,18 @@ class SurveyResponse(models.Model):
             }
         }
         """
-        sections = self.survey.get_sections()
-        questions = self.get_section_question_counts(sections)
-        answered = self.answers.filter(question__level__lte=self.level).aggregate(
-            total=models.Count('id'),
-            compliance_total=self._count_when(value=SurveyAnswer.ANSWER_YES),
-            **{
-                str(section.pk): self._count_when(
-                    question__section=section,
-                    value=SurveyAnswer.ANSWER_YES,
-                )
-                for section in sections
-            }
-        )
+        sections, section_counts, totals = self.get_section_counts()
 
         steps = []
         for section in sections:
-            questions_count = questions[str(section.pk)] or 0
-            answered_count = answered[str(section.pk)] or 0
-            info = self.get_progress_info(answered_count, questions_count)
+            counts = section_counts[section.pk]
+            info = self.get_progress_info(counts['yes'], counts['questions'])
             info.update({'section': section})
             steps.append(info)
 
-        questions_count = questions['total'] or 0
-        answered_count = answered['total'] or 0
-        progress = self.get_progress_info(answered_count, questions_count)
+        progress = self.get_progress_info(totals['answered'], totals['questions'])
 
-        compliance_count = answered['compliance_total'] or 0
-        compliance = self.get_progress_info(compliance_count, questions_count)
+        compliance = self.get_progress_info(totals['yes'], totals['questions'])
         compliance['sections'] = steps
 
         return {
@@ -653,6 +640,10 @@ class SurveyAnswer(models.Model):
     class Meta:
         unique_together = (('response', 'question'),)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_value = self.value
+
     def __str__(self):
         return self.get_value_display()
 
@@ -687,3 +678,99 @@ class SurveyAnswerDocument(models.Model):
                     organisation=self.document.organisation._meta.verbose_name_plural,
                 )
             )
+
+
+class SurveyResponseProgress(models.Model):
+    """
+    Question, answer and correct (yes) answer counts of a response for one section and
+    level, kept up to date by `surveys.signals` so progress can be read without
+    aggregating every question and answer.
+    """
+    response = models.ForeignKey(
+        SurveyResponse,
+        on_delete=models.CASCADE,
+        related_name='progress_counts',
+    )
+    section = models.ForeignKey(
+        SurveySection,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    level = models.IntegerField(choices=LEVEL_CHOICES)
+    question_count = models.IntegerField(default=0)
+    answer_count = models.IntegerField(default=0)
+    yes_count = models.IntegerField(default=0)
+
+    objects = SurveyResponseProgressQueryset.as_manager()
+
+    class Meta:
+        ordering = ('section__area__number', 'section__number', 'level')
+        unique_together = (('response', 'section', 'level'),)
+
+    def __str__(self):
+        return '{} - {} - {}'.format(self.response_id, self.section_id, self.level)
+
+
+class ExportJob(models.Model):
+    """An export too large for a request, written to storage by `surveys.tasks`."""
+    KIND_RESPONSES = 'responses'
+    KIND_INVITATIONS = 'invitations'
+    KIND_CHOICES = (
+        (KIND_RESPONSES, _('Submitted responses')),
+        (KIND_INVITATIONS, _('Sent invitations')),
+    )
+
+    FORMAT_CSV = 'csv'
+    FORMAT_XLSX = 'xlsx'
+    FORMAT_CHOICES = (
+        (FORMAT_XLSX, _('Excel')),
+        (FORMAT_CSV, _('CSV')),
+    )
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, _('Queued')),
+        (STATUS_RUNNING, _('Running')),
+        (STATUS_DONE, _('Done')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    survey = models.ForeignKey(
+        Survey,
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        blank=True,
+    )
+    format = models.CharField(max_length=8, choices=FORMAT_CHOICES, default=FORMAT_XLSX)
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+    )
+    progress = models.PositiveSmallIntegerField(default=0)
+    file = models.FileField(upload_to='exports/%Y/%m/', max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+
+    def __str__(self):
+        return '{} - {} - {}'.format(self.get_kind_display(), self.user_id, self.created)
+
+    def get_status_url(self):
+        return reverse('export-job-status', kwargs={'pk': self.pk})
+
+    def get_filename(self):
+        if self.kind == self.KIND_RESPONSES:
+            name = self.survey.name
+        else:
+            name = 'Invitations'
+        return '{} {}'.format(name, timezone.localtime(self.created).strftime('%Y-%m-%d'))
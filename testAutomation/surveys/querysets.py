@@ -1,45 +1,43 @@
 from collections import defaultdict
 
-from django.db import models
+from django.db import models, transaction
 
 
 class SurveyQueryset(models.QuerySet):
     def available(self):
         return self.filter(is_active=True, questions__isnull=False).distinct()
 
-    def with_latest_response_progress(self, organisation, invitations=None):
+    def latest_response_progress(self, organisations):
         """
-        Survey objects annotated with the organization's latest response with progress.
-        If invitations are provided then they are annotated to the appropriate survey as
-        a list of `survey.invitations`.
+        Return the latest response of each organisation to these surveys with its
+        progress, keyed by `(organisation_id, survey_id)`.
 
-        Requires two additional queries to select response question and answer totals.
+        Older responses are never loaded, so this needs one query however many
+        organisations or resubmitted responses there are.
         """
-
         from .models import SurveyResponse
 
-        all_responses = SurveyResponse.objects.filter(
-            organisation=organisation,
+        responses = SurveyResponse.objects.filter(
+            organisation__in=organisations,
             survey__in=self,
-        ).order_by('modified')
-
-        # We need two queries to annotate the answers total and questions total as
-        # it is not possible to annotate them in the same query
-        # https://code.djangoproject.com/ticket/10060
-        with_questions = all_responses.with_questions_total()
-        with_answers = all_responses.with_answers_total()
-
-        # The responses are in ascending modified date order so if there are multiple
-        # responses per survey the last (latest) response will be used.
-        with_questions_lookup = {
-            response.survey_id: response
-            for response in with_questions
-        }
-        with_answers_lookup = {
-            response.survey_id: response
-            for response in with_answers
+        ).latest_per_survey()
+
+        return {
+            (response.organisation_id, response.survey_id): response
+            for response in responses.with_progress()
         }
 
+    def with_latest_response_progress(self, organisation, invitations=None):
+        """
+        Survey objects annotated with the organization's latest response with progress.
+        If invitations are provided then they are annotated to the appropriate survey as
+        a list of `survey.invitations`.
+
+        Requires one additional query to select the latest responses with their question
+        and answer totals.
+        """
+        responses_lookup = self.latest_response_progress([organisation])
+
         if invitations is None:
             invitations = []
         invite_lookup = defaultdict(list)
@@ -47,21 +45,7 @@ class SurveyQueryset(models.QuerySet):
             invite_lookup[invite.survey_id].append(invite)
 
         for survey in self:
-            try:
-                response = with_questions_lookup[survey.pk]
-            except KeyError:
-                survey.survey_response = None
-            else:
-                response.answers_total = with_answers_lookup[survey.pk].answers_total
-                response.progress = response.get_progress_info(
-                    response.answers_total,
-                    response.questions_total,
-                )
-                response.summary_url = response.get_summary_url(
-                    response.progress['is_complete'],
-                )
-                survey.survey_response = response
-
+            survey.survey_response = responses_lookup.get((organisation.pk, survey.pk))
             survey.invites = invite_lookup[survey.id]
 
             yield survey
@@ -78,37 +62,43 @@ class SurveyQuestionQueryset(models.QuerySet):
     def for_section(self, survey, section):
         return self.filter(survey=survey, section=section)
 
-    def next_section(self, survey, current_section=None):
+    def copy_to(self, survey):
         """
-        Return the section after this one, or the first section if current_section
-        isn't specified.
+        Copy these questions with their options to another survey.
+
+        Options keep their sort order. Uses five queries however many questions there
+        are, plus four to rebuild the progress counts if the survey has responses.
         """
-        qs = self.filter(survey=survey)
-        if current_section:
-            qs = qs.filter(
-                models.Q(
-                    section__area__number=current_section.area.number,
-                    section__number__gt=current_section.number,
-                ) | models.Q(
-                    section__area__number__gt=current_section.area.number,
+        from .models import SurveyQuestionOption, SurveyResponseProgress
+        from .structure import invalidate
+
+        with transaction.atomic():
+            questions = list(self.order_by('pk'))
+            original_pks = [question.pk for question in questions]
+            for question in questions:
+                question.pk = None
+                question.survey = survey
+            self.model.objects.bulk_create(questions)
+            # Postgres returns the pks of bulk created rows.
+            copy_pks = dict(zip(original_pks, (question.pk for question in questions)))
+
+            options = SurveyQuestionOption.objects.filter(
+                question_id__in=original_pks,
+            ).values_list('question_id', 'name', 'sort_order')
+            SurveyQuestionOption.objects.bulk_create(
+                SurveyQuestionOption(
+                    question_id=copy_pks[question_id],
+                    name=name,
+                    sort_order=sort_order,
                 )
+                for question_id, name, sort_order in options
             )
-        first = qs.order_by('section').first()
-        return first.section_id if first else None
 
-    def previous_section(self, survey, current_section):
-        """Return the section before this one"""
-        qs = self.filter(survey=survey)
-        qs = qs.filter(
-            models.Q(
-                section__area__number=current_section.area.number,
-                section__number__lt=current_section.number,
-            ) | models.Q(
-                section__area__number__lt=current_section.area.number,
-            )
-        )
-        first = qs.order_by('-section').first()
-        return first.section_id if first else None
+            responses = list(survey.responses.all())
+            if responses:
+                SurveyResponseProgress.objects.rebuild(responses)
+        invalidate(survey.pk)
+        return questions
 
 
 class SurveyResponseQueryset(models.QuerySet):
@@ -116,19 +106,75 @@ class SurveyResponseQueryset(models.QuerySet):
         queryset = self.filter(survey__questions__isnull=False).distinct()
         return queryset.filter(organisation__pk=user.organisation_id)
 
-    def with_answers_total(self):
-        return self.annotate(
-            answers_total=models.Sum(models.Case(
-                models.When(answers__question__level__lte=models.F('level'), then=1),
-                output_field=models.IntegerField(),
-                default=0,
-            )),
+    def viewable_by(self, user):
+        """
+        Return SurveyResponse objects available to grantee or grantor.
+
+        The grantee user's organisation must match organisation.
+        The  grantor user's organisation must be the grantor of an accepted invitation
+        the same survey that has the survey_responses organisation as the grantee.
+        """
+        from users.models import Invitation
+
+        queryset = self.filter(
+            survey__questions__isnull=False,
+        ).distinct()
+        invitations = Invitation.objects.filter(
+            survey=models.OuterRef('survey'),
+            grantee=models.OuterRef('organisation'),
+            accepted=True,
+            grantor_id=user.organisation_id
         )
+        queryset = queryset.annotate(
+            invitation_id=models.Subquery(invitations.values('pk')[:1]),
+        ).filter((
+            models.Q(organisation__pk=user.organisation_id) |
+            models.Q(
+                submitted__isnull=False,
+                invitation_id__isnull=False,
+            )
+        ))
+        return queryset
+
+    def latest_per_survey(self):
+        """Only the most recently modified response of each organisation per survey."""
+        latest = self.order_by(
+            'organisation_id',
+            'survey_id',
+            '-modified',
+            '-pk',
+        ).distinct('organisation_id', 'survey_id')
+        return self.filter(pk__in=latest.values('pk'))
 
-    def with_questions_total(self):
+    def with_progress(self):
+        """
+        Yield the responses with their `progress` and `summary_url` worked out from
+        `with_progress_totals`.
+        """
+        for response in self.with_progress_totals():
+            response.progress = response.get_progress_info(
+                response.answers_total,
+                response.questions_total,
+            )
+            response.summary_url = response.get_summary_url(
+                response.progress['is_complete'],
+            )
+            yield response
+
+    def with_progress_totals(self):
+        """
+        Annotate `questions_total` and `answers_total` up to each response's level
+        from the materialised `SurveyResponseProgress` counts.
+        """
+        at_level = models.Q(progress_counts__level__lte=models.F('level'))
         return self.annotate(
             questions_total=models.Sum(models.Case(
-                models.When(survey__questions__level__lte=models.F('level'), then=1),
+                models.When(at_level, then=models.F('progress_counts__question_count')),
+                output_field=models.IntegerField(),
+                default=0,
+            )),
+            answers_total=models.Sum(models.Case(
+                models.When(at_level, then=models.F('progress_counts__answer_count')),
                 output_field=models.IntegerField(),
                 default=0,
             )),
@@ -141,6 +187,72 @@ class SurveyAnswerQueryset(models.QuerySet):
 
         return {answer.question_id: answer for answer in self}
 
+    def bulk_save(self, answers, options):
+        """
+        Create or update many answers with a fixed number of queries.
+
+        `answers` are unsaved or modified `SurveyAnswer` objects and `options` maps each
+        answer's question_id to the option pks that replace its current options.
+        `post_save` isn't sent, so the progress counts of the answers' responses are
+        rebuilt and their cached reports dropped instead.
+        """
+        from .models import SurveyResponse, SurveyResponseProgress
+        from .reports import invalidate
+
+        answers = list(answers)
+        new_answers = [answer for answer in answers if answer.pk is None]
+        changed_answers = [answer for answer in answers if answer.pk is not None]
+
+        with transaction.atomic():
+            self.bulk_create(new_answers)
+
+            if changed_answers:
+                # Django 1.11 has no bulk_update(), so set each field with one CASE.
+                # Its ELSE is the column, so Postgres types it as the column even when
+                # every value is NULL.
+                self.filter(pk__in=[answer.pk for answer in changed_answers]).update(**{
+                    field: models.Case(
+                        *[
+                            models.When(pk=answer.pk, then=models.Value(
+                                getattr(answer, field),
+                            ))
+                            for answer in changed_answers
+                        ],
+                        default=models.F(field),
+                        output_field=self.model._meta.get_field(field)
+                    )
+                    for field in ('value', 'explanation', 'due_date')
+                })
+
+            options_field = self.model._meta.get_field('options')
+            through = options_field.remote_field.through
+            answer_field = options_field.m2m_field_name() + '_id'
+            option_field = options_field.m2m_reverse_field_name() + '_id'
+            through.objects.filter(**{
+                answer_field + '__in': [answer.pk for answer in changed_answers],
+            }).delete()
+            through.objects.bulk_create(
+                through(**{answer_field: answer.pk, option_field: option_id})
+                for answer in answers
+                for option_id in options.get(answer.question_id, ())
+            )
+
+            # Responses that aren't loaded yet are fetched together, not per answer.
+            responses = {
+                answer.response_id: answer.response
+                for answer in answers
+                if self.model.response.is_cached(answer)
+            }
+            missing = {answer.response_id for answer in answers} - set(responses)
+            if missing:
+                responses.update(SurveyResponse.objects.in_bulk(missing))
+            SurveyResponseProgress.objects.rebuild(responses.values())
+        invalidate(responses)
+
+        for answer in answers:
+            answer._init_value = answer.value
+        return answers
+
     def results(self):
         """
         Return the aggregated results.
@@ -165,3 +277,113 @@ class SurveyAnswerQueryset(models.QuerySet):
             total=models.Count('id'),
             **kwargs,
         )
+
+
+class SurveyResponseProgressQueryset(models.QuerySet):
+    def adjust(self, response_ids, section_id, level, **deltas):
+        """
+        Add `deltas` (e.g. `answer_count=1`) to the counts of the given responses for a
+        section and level.
+
+        Missing rows are only created when every delta is an increment, so decrements
+        triggered by cascading deletes never resurrect rows of a deleted response.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        response_ids = list(response_ids)
+        if not deltas or not response_ids:
+            return
+
+        rows = self.filter(
+            response_id__in=response_ids,
+            section_id=section_id,
+            level=level,
+        )
+        updated = rows.update(**{
+            field: models.F(field) + delta
+            for field, delta in deltas.items()
+        })
+
+        is_increment = all(delta > 0 for delta in deltas.values())
+        if updated == len(response_ids) or not is_increment:
+            return
+
+        existing = set(rows.values_list('response_id', flat=True))
+        self.bulk_create(
+            self.model(
+                response_id=response_id,
+                section_id=section_id,
+                level=level,
+                **deltas
+            )
+            for response_id in response_ids
+            if response_id not in existing
+        )
+
+    def adjust_questions(self, survey_id, section_id, level, delta):
+        """Add `delta` to the question count of every response to the survey."""
+        from .models import SurveyResponse
+
+        response_ids = SurveyResponse.objects.filter(
+            survey_id=survey_id,
+        ).values_list('pk', flat=True)
+        self.adjust(response_ids, section_id, level, question_count=delta)
+
+    def rebuild(self, responses):
+        """
+        Recalculate the counts of the given responses from their questions and answers.
+
+        Uses four queries regardless of the number of responses.
+        """
+        from .models import SurveyAnswer, SurveyQuestion
+
+        responses = list(responses)
+        self.filter(response__in=responses).delete()
+
+        questions = SurveyQuestion.objects.filter(
+            survey_id__in={response.survey_id for response in responses},
+        ).values('survey', 'section', 'level').annotate(
+            count=models.Count('id'),
+        ).order_by()
+        questions_lookup = defaultdict(list)
+        for question in questions:
+            questions_lookup[question['survey']].append(question)
+
+        rows = {}
+        for response in responses:
+            for question in questions_lookup[response.survey_id]:
+                key = (response.pk, question['section'], question['level'])
+                rows[key] = self.model(
+                    response_id=response.pk,
+                    section_id=question['section'],
+                    level=question['level'],
+                    question_count=question['count'],
+                )
+
+        answers = SurveyAnswer.objects.filter(
+            response__in=responses,
+        ).values('response', 'question__section', 'question__level').annotate(
+            count=models.Count('id'),
+            yes=models.Sum(models.Case(
+                models.When(value=SurveyAnswer.ANSWER_YES, then=1),
+                output_field=models.IntegerField(),
+                default=0,
+            )),
+        ).order_by()
+        for answer in answers:
+            key = (
+                answer['response'],
+                answer['question__section'],
+                answer['question__level'],
+            )
+            try:
+                row = rows[key]
+            except KeyError:
+                row = rows[key] = self.model(
+                    response_id=key[0],
+                    section_id=key[1],
+                    level=key[2],
+                )
+            row.answer_count = answer['count']
+            row.yes_count = answer['yes']
+
+        self.bulk_create(rows.values())
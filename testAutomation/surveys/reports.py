@@ -0,0 +1,74 @@
+"""
+The full report of a survey response: its compliance stats and the rendered table of
+every question with its answer.
+
+Reports are rendered from the snapshot of the response (see `surveys.snapshots`) on
+every view, so the links to documents are made fresh when the storage signs them.
+Submitted responses without a snapshot of their tier have one built and kept in the
+Django cache as JSON data, with the structure version of their survey it was built
+under. Changes to their answers or documents drop it (see `surveys.signals`).
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import snapshots
+from .structure import get_version
+
+
+REPORT_CACHE_KEY = 'surveys:report-snapshot:{response_id}'
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def get_cache_key(response_id):
+    return REPORT_CACHE_KEY.format(response_id=response_id)
+
+
+def get_report_snapshot(response):
+    """
+    Return the snapshot to report a response from: its own if it's current, else one
+    built for it, from the cache if the response is submitted.
+    """
+    if snapshots.is_current(response):
+        return response.snapshot
+    if response.submitted is None:
+        return snapshots.build_snapshot(response)
+
+    key = get_cache_key(response.pk)
+    structure_version = get_version(response.survey_id)
+    cached = cache.get(key)
+    if cached is not None and cached['structure_version'] == structure_version:
+        snapshot = cached['snapshot']
+        if (
+            snapshot['version'] == snapshots.SNAPSHOT_VERSION and
+            snapshot['level'] == response.level
+        ):
+            return snapshot
+
+    snapshot = snapshots.build_snapshot(response)
+    cache.set(
+        key,
+        {'structure_version': structure_version, 'snapshot': snapshot},
+        REPORT_CACHE_TIMEOUT,
+    )
+    return snapshot
+
+
+def get_full_report(response):
+    """
+    Return the level compliance of a response and the rendered table of its questions
+    and answers.
+    """
+    snapshot = snapshots.load_snapshot(get_report_snapshot(response))
+    stats = {
+        'progress': snapshot['progress'],
+        'compliance': snapshot['compliance'],
+    }
+    table = render_to_string('surveys/_full_report_table.html', {
+        'compliance': snapshot['compliance'],
+        'object': response,
+    })
+    return {'stats': stats, 'table': table}
+
+
+def invalidate(response_ids):
+    cache.delete_many([get_cache_key(response_id) for response_id in set(response_ids)])
@@ -0,0 +1,163 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from documents.models import Document
+from . import reports, structure
+from .models import (
+    Survey,
+    SurveyAnswer,
+    SurveyAnswerDocument,
+    SurveyArea,
+    SurveyQuestion,
+    SurveyQuestionOption,
+    SurveyResponse,
+    SurveyResponseProgress,
+    SurveySection,
+)
+
+
+def _invalidate_structure(*survey_ids):
+    """
+    Drop the cached structures of these surveys, or of every survey if none are given,
+    now and again once the change is committed, so a snapshot rebuilt from the old rows
+    in the meantime isn't kept.
+    """
+    def invalidate():
+        if survey_ids:
+            for survey_id in survey_ids:
+                structure.invalidate(survey_id)
+        else:
+            structure.invalidate()
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def _adjust_answer_counts(answer, answer_delta, yes_delta):
+    question = answer.question
+    SurveyResponseProgress.objects.adjust(
+        [answer.response_id],
+        question.section_id,
+        question.level,
+        answer_count=answer_delta,
+        yes_count=yes_delta,
+    )
+
+
+@receiver(post_save, sender=SurveyResponse)
+def create_response_progress(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance._init_survey_id != instance.survey_id:
+        SurveyResponseProgress.objects.rebuild([instance])
+    instance._init_survey_id = instance.survey_id
+
+
+# Before `update_question_progress`, which replaces the question's initial placement.
+@receiver([post_save, post_delete], sender=SurveyQuestion)
+def invalidate_question_structure(sender, instance, **kwargs):
+    # Both surveys if the question was moved from one to another.
+    survey_ids = {instance._init_placement[0], instance.survey_id} - {None}
+    _invalidate_structure(*survey_ids)
+
+
+@receiver(post_save, sender=SurveyQuestion)
+def update_question_progress(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    progress = SurveyResponseProgress.objects
+    placement = instance.get_placement()
+    if not created:
+        if placement == instance._init_placement:
+            return
+        progress.adjust_questions(*instance._init_placement, delta=-1)
+    progress.adjust_questions(*placement, delta=1)
+    instance._init_placement = placement
+
+
+@receiver(post_delete, sender=SurveyQuestion)
+def delete_question_progress(sender, instance, **kwargs):
+    SurveyResponseProgress.objects.adjust_questions(*instance._init_placement, delta=-1)
+
+
+@receiver(post_save, sender=SurveyAnswer)
+def update_answer_progress(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    is_yes = instance.value == SurveyAnswer.ANSWER_YES
+    if created:
+        _adjust_answer_counts(instance, 1, int(is_yes))
+    else:
+        was_yes = instance._init_value == SurveyAnswer.ANSWER_YES
+        _adjust_answer_counts(instance, 0, int(is_yes) - int(was_yes))
+    instance._init_value = instance.value
+
+
+@receiver(post_delete, sender=SurveyAnswer)
+def delete_answer_progress(sender, instance, **kwargs):
+    was_yes = instance._init_value == SurveyAnswer.ANSWER_YES
+    _adjust_answer_counts(instance, -1, -int(was_yes))
+
+
+@receiver([post_save, post_delete], sender=SurveyArea)
+@receiver([post_save, post_delete], sender=SurveySection)
+def invalidate_shared_structure(sender, **kwargs):
+    """Areas and sections are shared by every survey."""
+    _invalidate_structure()
+
+
+@receiver([post_save, post_delete], sender=Survey)
+def invalidate_survey_structure(sender, instance, **kwargs):
+    _invalidate_structure(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=SurveyQuestionOption)
+def invalidate_option_structure(sender, instance, **kwargs):
+    survey_id = SurveyQuestion.objects.filter(
+        pk=instance.question_id,
+    ).values_list('survey_id', flat=True).first()
+    # A question that is already gone has invalidated its survey itself.
+    if survey_id is not None:
+        _invalidate_structure(survey_id)
+
+
+def _invalidate_reports(response_ids):
+    """Drop the cached full reports of these responses, now and after the commit."""
+    response_ids = list(response_ids)
+    reports.invalidate(response_ids)
+    transaction.on_commit(lambda: reports.invalidate(response_ids))
+
+
+@receiver(post_save, sender=SurveyResponse)
+def invalidate_response_report(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_reports([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=SurveyAnswer)
+def invalidate_answer_report(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_reports([instance.response_id])
+
+
+@receiver(m2m_changed, sender=SurveyAnswer.options.through)
+def invalidate_answer_options_report(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        _invalidate_reports([instance.response_id])
+
+
+@receiver([post_save, post_delete], sender=SurveyAnswerDocument)
+def invalidate_answer_document_report(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_reports(SurveyAnswer.objects.filter(
+            pk=instance.answer_id,
+        ).values_list('response_id', flat=True))
+
+
+@receiver(post_save, sender=Document)
+def invalidate_document_report(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_reports(SurveyAnswerDocument.objects.filter(
+            document=instance,
+        ).values_list('answer__response_id', flat=True))
@@ -0,0 +1,224 @@
+"""
+Frozen copies of submitted survey responses.
+
+When a response is submitted its compliance, questions, answers, selected options and
+documents are serialised into `SurveyResponse.snapshot`. Reports and exports of the
+response read the snapshot, so they fetch a single row and don't change when the
+survey or the documents are edited afterwards.
+
+Responses in progress, or whose tier changed since they were submitted, are
+snapshotted on the fly so every reader handles the one format.
+"""
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date
+
+
+SNAPSHOT_VERSION = 1
+
+
+def _serialise_progress(info):
+    """Return a copy of the progress info with its lazy label as text."""
+    info = dict(info)
+    info['label'] = str(info['label'])
+    return info
+
+
+def _serialise_answer(answer):
+    if answer is None:
+        return None
+    return {
+        'value': answer.value,
+        'value_display': str(answer.get_value_display()),
+        'explanation': answer.explanation,
+        'due_date': answer.due_date.isoformat() if answer.due_date else None,
+        'documents': [
+            {
+                'name': answer_document.document.name,
+                'file': answer_document.document.file.name or '',
+                'explanation': answer_document.explanation,
+                'expiry': (
+                    answer_document.document.expiry.isoformat()
+                    if answer_document.document.expiry else None
+                ),
+            }
+            for answer_document in answer.documents.all()
+        ],
+    }
+
+
+def build_snapshot(response):
+    """
+    Return the level compliance of a response with every question up to its tier and
+    the answer given, as plain JSON data.
+
+    Uses 6 queries and returns of the form:
+    {
+        'version': 1,
+        'level': 1,
+        'progress': {'count': 1, 'total': 1, 'percentage': 100, ...},
+        'compliance': {
+            'count': 1,
+            'total': 1,
+            'percentage': 100,
+            ...
+            'sections': [
+                {
+                    'count': 1,
+                    'total': 1,
+                    'percentage': 100,
+                    ...
+                    'section': {
+                        'code': '1.1',
+                        'name': 'Section',
+                        'area': {'number': 1, 'name': 'Area'},
+                    },
+                    'questions': [
+                        {
+                            'code': '1.1.1.1',
+                            'name': 'Question?',
+                            'options': [['Option', True], ['Other option', False]],
+                            'answer': {
+                                'value': 'yes',
+                                'value_display': 'Yes',
+                                'explanation': '',
+                                'due_date': None,
+                                'documents': [
+                                    {
+                                        'name': 'Policy',
+                                        'file': 'policy.pdf',
+                                        'explanation': '',
+                                        'expiry': '2018-01-31',
+                                    },
+                                ],
+                            },
+                        },
+                    ],
+                },
+            ],
+        },
+    }
+    """
+    from .models import SurveyAnswer, SurveyAnswerDocument, SurveyQuestion
+
+    stats = response.get_level_compliance()
+
+    steps = {}
+    sections = []
+    for step in stats['compliance']['sections']:
+        section = step['section']
+        info = _serialise_progress(step)
+        info.update({
+            'section': {
+                'code': section.get_code(),
+                'name': section.name,
+                'area': {
+                    'number': section.area.number,
+                    'name': section.area.name,
+                },
+            },
+            'questions': [],
+        })
+        steps[section.pk] = info
+        sections.append(info)
+
+    questions = SurveyQuestion.objects.filter(
+        survey=response.survey_id,
+        level__lte=response.level,
+    ).select_related(
+        'section__area',
+    ).prefetch_related(
+        'options',
+    )
+
+    documents = SurveyAnswerDocument.objects.select_related(
+        'document',
+    ).order_by('document__name')
+    answers = SurveyAnswer.objects.filter(
+        response=response,
+        question__level__lte=response.level,
+    ).prefetch_related(
+        'options',
+        Prefetch('documents', queryset=documents),
+    )
+    answers_lookup = answers.by_question()
+    for question in questions:
+        answer = answers_lookup.get(question.pk)
+        selected = set()
+        if answer is not None:
+            selected = {option.pk for option in answer.options.all()}
+        steps[question.section_id]['questions'].append({
+            'code': question.get_code(),
+            'name': question.name,
+            'options': [
+                [option.name, option.pk in selected]
+                for option in question.options.all()
+            ],
+            'answer': _serialise_answer(answer),
+        })
+
+    compliance = _serialise_progress(stats['compliance'])
+    compliance['sections'] = sections
+    return {
+        'version': SNAPSHOT_VERSION,
+        'level': response.level,
+        'progress': _serialise_progress(stats['progress']),
+        'compliance': compliance,
+    }
+
+
+def is_current(response):
+    """Return if the response has a snapshot of its current tier."""
+    snapshot = response.snapshot
+    return bool(snapshot) and (
+        snapshot['version'] == SNAPSHOT_VERSION and
+        snapshot['level'] == response.level
+    )
+
+
+def _parse_date(value):
+    return parse_date(value) if value else None
+
+
+def _load_answer(answer):
+    if answer is None:
+        return None
+    return dict(
+        answer,
+        due_date=_parse_date(answer['due_date']),
+        documents=[
+            dict(
+                document,
+                expiry=_parse_date(document['expiry']),
+                url=default_storage.url(document['file']) if document['file'] else '',
+            )
+            for document in answer['documents']
+        ],
+    )
+
+
+def load_snapshot(snapshot):
+    """
+    Return a copy of a snapshot with its dates parsed and the links to its documents.
+
+    Links are made each time, as the storage may sign them for a limited time.
+    """
+    compliance = dict(snapshot['compliance'])
+    compliance['sections'] = [
+        dict(step, questions=[
+            dict(question, answer=_load_answer(question['answer']))
+            for question in step['questions']
+        ])
+        for step in compliance['sections']
+    ]
+    return dict(snapshot, compliance=compliance)
+
+
+def get_snapshot(response):
+    """
+    Return the loaded snapshot of a response, building it if it has none of its tier.
+
+    The stored snapshot is left as it is.
+    """
+    snapshot = response.snapshot if is_current(response) else build_snapshot(response)
+    return load_snapshot(snapshot)
@@ -0,0 +1,236 @@
+"""
+Read-only snapshots of a survey's areas, sections and questions.
+
+A snapshot is built with three queries and kept both in the Django cache and in
+process, keyed by the survey's structure version. A change to a survey's questions or
+options replaces that survey's version, and a change to the areas and sections every
+survey shares replaces the version common to all of them (see `surveys.signals`), so
+stale snapshots are never read.
+"""
+from collections import namedtuple, OrderedDict
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+VERSION_CACHE_KEY = 'surveys:structure:version'
+SURVEY_VERSION_CACHE_KEY = 'surveys:structure:version:{survey_id}'
+# Bump the prefix when `SurveyStructure` changes shape, so older pickles aren't read.
+STRUCTURE_CACHE_KEY = 'surveys:structure:2:{version}:{survey_id}'
+STRUCTURE_CACHE_TIMEOUT = 60 * 60 * 24
+
+SectionInfo = namedtuple('SectionInfo', (
+    'pk',
+    'code',
+    'levels',
+    'previous_pk',
+    'next_pk',
+))
+QuestionInfo = namedtuple('QuestionInfo', (
+    'pk',
+    'section_pk',
+    'level',
+    'question_number',
+    'code',
+    'upload_type',
+    'options',
+))
+OptionInfo = namedtuple('OptionInfo', ('pk', 'name'))
+
+# Snapshots already loaded by this process, keyed by survey pk.
+_snapshots = {}
+
+
+def get_version(survey_id):
+    """
+    Return the structure version of a survey, made of the version shared by every
+    survey and its own, creating either if there is none.
+    """
+    keys = (VERSION_CACHE_KEY, SURVEY_VERSION_CACHE_KEY.format(survey_id=survey_id))
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return '{}:{}'.format(*[versions[key] for key in keys])
+
+
+def invalidate(survey_id=None):
+    """
+    Replace the structure version of a survey so its snapshot is rebuilt, or the
+    version shared by every survey if none is given.
+    """
+    if survey_id is None:
+        cache.set(VERSION_CACHE_KEY, uuid4().hex, None)
+        _snapshots.clear()
+    else:
+        key = SURVEY_VERSION_CACHE_KEY.format(survey_id=survey_id)
+        cache.set(key, uuid4().hex, None)
+        _snapshots.pop(survey_id, None)
+
+
+def get_structure(survey_id):
+    """Return the `SurveyStructure` of a survey, building it if required."""
+    version = get_version(survey_id)
+    structure = _snapshots.get(survey_id)
+    if structure is not None and structure.version == version:
+        return structure
+
+    key = STRUCTURE_CACHE_KEY.format(version=version, survey_id=survey_id)
+    structure = cache.get(key)
+    if structure is None:
+        structure = SurveyStructure.build(survey_id, version)
+        cache.set(key, structure, STRUCTURE_CACHE_TIMEOUT)
+    _snapshots[survey_id] = structure
+    return structure
+
+
+class SurveyStructure:
+    """
+    The areas, sections and questions of a survey in presentation order.
+
+    `sections` are `SurveySection` objects with their area loaded. Everything else is
+    kept as named tuples with precomputed codes, so nothing here needs the database.
+    """
+    def __init__(self, survey_id, version, sections, questions):
+        self.survey_id = survey_id
+        self.version = version
+        self.sections = tuple(sections)
+        self.questions = tuple(questions)
+
+        self._sections = {section.pk: section for section in self.sections}
+        self._questions = {question.pk: question for question in self.questions}
+
+        levels = {section.pk: set() for section in self.sections}
+        for question in self.questions:
+            levels[question.section_pk].add(question.level)
+
+        pks = [section.pk for section in self.sections]
+        # The sections to step through at each level, keyed from 1 up to the highest.
+        self._level_neighbours = {}
+        max_level = max((question.level for question in self.questions), default=0)
+        for level in range(1, max_level + 1):
+            included = {pk for pk in pks if min(levels[pk]) <= level}
+            self._level_neighbours[level] = self._get_neighbours(pks, included)
+
+        previous_pks = [None] + pks[:-1]
+        next_pks = pks[1:] + [None]
+        self._section_info = OrderedDict(
+            (section.pk, SectionInfo(
+                pk=section.pk,
+                code=section.get_code(),
+                levels=frozenset(levels[section.pk]),
+                previous_pk=previous_pk,
+                next_pk=next_pk,
+            ))
+            for section, previous_pk, next_pk in zip(
+                self.sections,
+                previous_pks,
+                next_pks,
+            )
+        )
+
+    @staticmethod
+    def _get_neighbours(pks, included):
+        """
+        Map each pk to the closest included pks before and after it. None maps to the
+        first included pk as the one after it.
+        """
+        neighbours = {}
+        previous_pk = None
+        for pk in pks:
+            neighbours[pk] = [previous_pk, None]
+            if pk in included:
+                previous_pk = pk
+        next_pk = None
+        for pk in reversed(pks):
+            neighbours[pk][1] = next_pk
+            if pk in included:
+                next_pk = pk
+        neighbours[None] = [None, next_pk]
+        return {pk: tuple(pair) for pk, pair in neighbours.items()}
+
+    @classmethod
+    def build(cls, survey_id, version):
+        from .models import SurveyQuestion, SurveyQuestionOption, SurveySection
+
+        sections = SurveySection.objects.filter(
+            surveyquestion__survey_id=survey_id,
+        ).select_related('area').distinct()
+        sections = list(sections)
+        section_codes = {section.pk: section.get_code() for section in sections}
+
+        options = SurveyQuestionOption.objects.filter(
+            question__survey_id=survey_id,
+        ).values_list('question_id', 'pk', 'name')
+        options_lookup = {}
+        for question_id, pk, name in options:
+            options_lookup.setdefault(question_id, []).append(OptionInfo(pk, name))
+
+        questions = SurveyQuestion.objects.filter(
+            survey_id=survey_id,
+        ).order_by(
+            'section__area__number',
+            'section__number',
+            'level',
+            'question_number',
+        ).values_list('pk', 'section_id', 'level', 'question_number', 'upload_type')
+        questions = (
+            QuestionInfo(
+                pk=pk,
+                section_pk=section_pk,
+                level=level,
+                question_number=question_number,
+                code='{}.{}.{}'.format(section_codes[section_pk], level, question_number),
+                upload_type=upload_type,
+                options=tuple(options_lookup.get(pk, ())),
+            )
+            for pk, section_pk, level, question_number, upload_type in questions
+        )
+
+        return cls(survey_id, version, sections, questions)
+
+    def get_section(self, pk):
+        """Return the `SurveySection` with this pk or None if it isn't in the survey."""
+        return self._sections.get(pk)
+
+    def get_section_info(self, pk):
+        return self._section_info.get(pk)
+
+    def get_question(self, pk):
+        return self._questions.get(pk)
+
+    def get_question_code(self, pk):
+        return self._questions[pk].code
+
+    def _get_level_neighbours(self, level):
+        # Every section has questions at or below the highest level.
+        return self._level_neighbours[min(level, len(self._level_neighbours))]
+
+    def first_section(self, level=None):
+        """
+        Return the pk of the first section or None if the survey has no questions.
+
+        With a level, return the first section with questions at or below it.
+        """
+        if level is not None and self.sections:
+            return self._get_level_neighbours(level)[None][1]
+        return self.sections[0].pk if self.sections else None
+
+    def next_section(self, pk, level=None):
+        """
+        Return the pk of the section after this one or None, skipping sections without
+        questions at or below the level if there is one.
+        """
+        if level is not None:
+            return self._get_level_neighbours(level)[pk][1]
+        return self._section_info[pk].next_pk
+
+    def previous_section(self, pk, level=None):
+        """
+        Return the pk of the section before this one or None, skipping sections
+        without questions at or below the level if there is one.
+        """
+        if level is not None:
+            return self._get_level_neighbours(level)[pk][0]
+        return self._section_info[pk].previous_pk
@@ -0,0 +1,84 @@
+from __future__ import absolute_import, unicode_literals
+
+import tempfile
+
+from celery import shared_task
+
+from django.core.files import File
+from django.utils import timezone
+
+from users.models import Invitation
+from .exports import (
+    INVITATION_HEADER,
+    invitation_rows,
+    RESPONSE_HEADER,
+    survey_response_rows,
+    write_export,
+)
+from .models import ExportJob, SurveyResponse
+
+EXPORT_CHUNK_SIZE = 100
+
+
+def _get_export_source(job):
+    """Return the queryset a job exports, the function making its rows and a header."""
+    if job.kind == ExportJob.KIND_RESPONSES:
+        responses = SurveyResponse.objects.viewable_by(job.user).filter(
+            survey_id=job.survey_id,
+            submitted__isnull=False,
+        )
+        queryset = SurveyResponse.objects.filter(pk__in=responses.values('pk'))
+        return queryset, survey_response_rows, RESPONSE_HEADER
+
+    queryset = Invitation.objects.filter(grantor_id=job.user.organisation_id)
+    return queryset, invitation_rows, INVITATION_HEADER
+
+
+def _export_job_rows(job):
+    """Yield the rows of a job a chunk of objects at a time, recording its progress."""
+    queryset, rows, header = _get_export_source(job)
+    yield header
+
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), EXPORT_CHUNK_SIZE):
+        chunk = pks[start:start + EXPORT_CHUNK_SIZE]
+        yield from rows(queryset.model.objects.filter(pk__in=chunk), header=False)
+
+        progress = 100 * (start + len(chunk)) // len(pks)
+        ExportJob.objects.filter(pk=job.pk).update(progress=progress)
+
+
+@shared_task
+def run_export_job(job_id):
+    # Claim the job with a single UPDATE, so two workers can't both run it.
+    jobs = ExportJob.objects.filter(pk=job_id)
+    claimed = jobs.filter(status=ExportJob.STATUS_QUEUED).update(
+        status=ExportJob.STATUS_RUNNING,
+    )
+    if not claimed:
+        # Already picked up by another worker.
+        return
+
+    job = ExportJob.objects.select_related('user', 'survey').get(pk=job_id)
+
+    filename = job.get_filename()
+    try:
+        with tempfile.TemporaryFile() as file:
+            write_export(_export_job_rows(job), file, job.format, filename)
+            file.seek(0)
+            name = '{}.{}'.format(filename, job.format)
+            job.file.save(name, File(file, name=name), save=False)
+    except Exception as e:
+        jobs.update(
+            status=ExportJob.STATUS_FAILED,
+            error=str(e),
+            finished=timezone.now(),
+        )
+        raise
+
+    jobs.update(
+        status=ExportJob.STATUS_DONE,
+        progress=100,
+        file=job.file.name,
+        finished=timezone.now(),
+    )
@@ -1,9 +1,9 @@
 import re
 
 from django import template
-from rolepermissions.roles import get_user_roles
 
 from users.forms import AddUserForm
+from users.roles import get_role
 
 register = template.Library()
 
@@ -16,13 +16,6 @@ def format_email(string):
 @register.filter
 def get_permission(user):
     try:
-        role_name = get_user_roles(user)[0].get_name()
-    except IndexError:
-        pass
-    else:
-        try:
-            return dict(AddUserForm.USER_TYPE_CHOICES)[role_name]
-        except KeyError:
-            pass
-
-    return AddUserForm.USER_TYPE_CHOICES[-1][1]
+        return dict(AddUserForm.USER_TYPE_CHOICES)[get_role(user)]
+    except KeyError:
+        return AddUserForm.USER_TYPE_CHOICES[-1][1]
@@ -2,7 +2,11 @@ from unittest.mock import MagicMock, patch
 
 from core.tests.utils import RequestTestCase
 
-from .factories import SurveyAnswerFactory, SurveyQuestionFactory
+from .factories import (
+    SurveyAnswerFactory,
+    SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
+)
 
 from ..admin import (
     SurveyAdmin,
@@ -23,6 +27,7 @@ class TestSurveyAdmin(RequestTestCase):
 
     def test_save_model(self):
         question = SurveyQuestionFactory.create()
+        option = SurveyQuestionOptionFactory.create(question=question)
         survey = question.survey
         original_id = survey.pk
 
@@ -55,6 +60,10 @@ class TestSurveyAdmin(RequestTestCase):
         self.assertEqual(copy_question.question_number, original_question.question_number)
         self.assertEqual(copy_question.upload_type, original_question.upload_type)
         self.assertEqual(copy_question.reference, original_question.reference)
+        copy_option = copy_question.options.get()
+        self.assertNotEqual(copy_option, option)
+        self.assertEqual(copy_option.name, option.name)
+        self.assertEqual(copy_option.sort_order, option.sort_order)
 
 
 class TestSurveyQuestionAdmin(RequestTestCase):
@@ -0,0 +1,142 @@
+import csv
+import io
+from datetime import date
+
+from django.test import TestCase
+from openpyxl import load_workbook
+
+from documents.tests.factories import DocumentFactory
+from .factories import (
+    SurveyAnswerDocumentFactory,
+    SurveyAnswerFactory,
+    SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
+    SurveyResponseFactory,
+)
+from .. import exports
+from ..models import SurveyAnswer, SurveyResponse
+from ..snapshots import build_snapshot
+
+
+class TestExports(TestCase):
+    def setUp(self):
+        self.question_1 = SurveyQuestionFactory.create(
+            name='<p>First?</p>',
+            level=1,
+            section__area__number=31,
+            section__number=1,
+            upload_type='policy',
+        )
+        self.survey = self.question_1.survey
+        self.question_2 = SurveyQuestionFactory.create(
+            survey=self.survey,
+            name='Second?',
+            level=2,
+            section=self.question_1.section,
+        )
+        self.option_1, self.option_2 = SurveyQuestionOptionFactory.create_batch(
+            2,
+            question=self.question_1,
+        )
+        self.response = SurveyResponseFactory.create(survey=self.survey, level=2)
+
+        answer = SurveyAnswerFactory.create(
+            response=self.response,
+            question=self.question_1,
+            value=SurveyAnswer.ANSWER_PROGRESS,
+            explanation='Soon',
+            due_date=date(2030, 1, 31),
+        )
+        answer.options.add(self.option_1, self.option_2)
+        SurveyAnswerDocumentFactory.create(
+            answer=answer,
+            document=DocumentFactory.create(
+                name='Policy',
+                organisation=self.response.organisation,
+            ),
+        )
+
+    def test_survey_question_rows(self):
+        with self.assertNumQueries(1):
+            rows = list(exports.survey_question_rows(self.survey))
+
+        self.assertEqual(rows, [
+            exports.QUESTION_HEADER,
+            ('31.1.1.1', 'First?', 'Policy', '', '', '', ''),
+            ('31.1.2.1', 'Second?', '', '', '', '', ''),
+        ])
+
+    def test_survey_response_rows(self):
+        other_response = SurveyResponseFactory.create(survey=self.survey, level=1)
+        responses = SurveyResponse.objects.filter(
+            pk__in=[self.response.pk, other_response.pk],
+        )
+
+        with self.assertNumQueries(3):
+            rows = list(exports.survey_response_rows(responses))
+
+        response_columns = (
+            str(self.response.organisation),
+            self.survey.name,
+            'Silver',
+            '',
+        )
+        other_columns = (
+            str(other_response.organisation),
+            self.survey.name,
+            'Bronze',
+            '',
+        )
+        self.assertEqual(rows, [
+            exports.RESPONSE_HEADER,
+            response_columns + (
+                '31.1.1.1',
+                'First?',
+                'In progress',
+                '{}, {}'.format(self.option_1.name, self.option_2.name),
+                'Soon',
+                date(2030, 1, 31),
+                'Policy',
+            ),
+            response_columns + ('31.1.2.1', 'Second?', '', '', '', None, ''),
+            other_columns + ('31.1.1.1', 'First?', '', '', '', None, ''),
+        ])
+
+    def test_survey_response_rows_snapshotted(self):
+        responses = SurveyResponse.objects.filter(pk=self.response.pk)
+        expected = list(exports.survey_response_rows(responses))
+
+        self.response.snapshot = build_snapshot(self.response)
+        self.response.save()
+        self.question_1.name = 'Updated?'
+        self.question_1.save()
+
+        with self.assertNumQueries(1):
+            rows = list(exports.survey_response_rows(responses))
+        self.assertEqual(rows, expected)
+
+    def test_csv_response(self):
+        response = exports.csv_response(iter([('a', 'b'), (1, None)]), 'Export')
+
+        self.assertEqual(response['Content-Type'], exports.CSV_CONTENT_TYPE)
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="Export.csv"',
+        )
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(content))), [['a', 'b'], ['1', '']])
+
+    def test_xlsx_response(self):
+        response = exports.xlsx_response(iter([('a', 'b'), (1, None)]), 'Export')
+
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="Export.xlsx"',
+        )
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = workbook['Export']
+        self.assertEqual(
+            [[cell.value for cell in row] for row in sheet.iter_rows()],
+            [['a', 'b'], [1, None]],
+        )
@@ -127,6 +127,17 @@ class TestSurveyAnswerFormAtachDocument(TestCase):
         self.assertTrue(hasattr(form, 'attach_helper'))
         self.assertTrue(hasattr(form, 'upload_helper'))
 
+    def test_helper_reused(self):
+        form = SurveyAnswerForm(self.question, self.survey_response)
+        other = SurveyAnswerForm(
+            SurveyQuestionFactory.create(upload_type='policy'),
+            self.survey_response,
+        )
+
+        self.assertIs(form.helper, other.helper)
+        self.assertIs(form.attach_helper, other.attach_helper)
+        self.assertIs(form.upload_helper, other.upload_helper)
+
     def test_clean_attach_document(self):
         data = {
             'operation': 'attach_document',
@@ -1,77 +1,252 @@
-'''
+import io
 from unittest.mock import mock_open, patch
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+from django.utils import timezone
 
-from .factories import SurveyFactory, SurveyQuestionFactory
-from ..management.commands import import_survey
-from ..models import Survey, SurveyQuestion
+from .factories import (
+    SurveyAnswerFactory,
+    SurveyFactory,
+    SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
+    SurveyResponseFactory,
+    SurveySectionFactory,
+)
+from .. import structure
+from ..management.commands import import_survey, snapshot_responses
+from ..models import (
+    Survey,
+    SurveyAnswer,
+    SurveyArea,
+    SurveyQuestion,
+    SurveyResponseProgress,
+    SurveySection,
+)
+from ..snapshots import build_snapshot, is_current
+from ..structure import get_structure
 
 
-class TestExportUsers(TestCase):
+class TestImportSurvey(TestCase):
     def csv_ise(self, *args):
         """Turn a list of strings into a line from a CSV."""
         return ','.join(args) + '\r\n'
 
-    def run_command(self, data):
+    def run_command(self, data, *args):
         method_to_patch = 'surveys.management.commands.import_survey.open_csv_file'
         with patch(method_to_patch) as open_csv_file:
-            open_csv_file.return_value = bytearray(data, encoding='utf-8')
-            call_command('import_survey', 'survey', 'questions.csv', verbosity=0)
+            open_csv_file.return_value = io.StringIO(data)
+            call_command('import_survey', 'survey', 'questions', *args, verbosity=0)
+        open_csv_file.assert_called_once_with('questions.csv')
 
     def test_open_csv_file(self):
         expected = 'the file content'
-        filemname = 'questions.csv'
+        filename = 'questions.csv'
         mocked = mock_open(read_data=expected)
         with patch('builtins.open', mocked, create=True):
-            contents = import_survey.open_csv_file(filemname)
+            with import_survey.open_csv_file(filename) as file:
+                contents = file.read()
 
-        mocked.assert_called_once_with(filemname, 'rb')
+        mocked.assert_called_once_with(filename, newline='', encoding='utf-8-sig')
         self.assertEqual(contents, expected)
 
     def test_extension(self):
-        filename = import_survey.ensure_extension('questions', 'csv')
-        self.assertEqual(filename, 'questions.csv')
+        self.assertEqual(
+            import_survey.ensure_extension('questions', 'csv'),
+            'questions.csv',
+        )
+        self.assertEqual(
+            import_survey.ensure_extension('questions.csv', 'csv'),
+            'questions.csv',
+        )
 
     def test_from_scratch(self):
-        """Import a new survey and create its questions."""
-        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
-        csv += self.csv_ise('What is your name?', '4.3.2.1', 'Policy', 'www.example.com')
+        """Import a new survey and create its questions, sections and areas."""
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference', 'Options')
+        csv += self.csv_ise(
+            'What is your name?',
+            '4.3.2.1',
+            'Policy',
+            'http://www.example.com',
+            '"First\nSecond"',
+        )
+        csv += self.csv_ise('And your quest?', '4.3.2.2', '', '', '')
 
         self.run_command(data=csv)
-        survey = Survey.objects.get()
-        question = SurveyQuestion.objects.get()
 
+        survey = Survey.objects.get()
+        question = SurveyQuestion.objects.get(question_number=1)
         self.assertEqual(survey.name, 'survey')
         self.assertEqual(question.name, 'What is your name?')
-        self.assertEqual(question.section_code, '4.3')
-        self.assertEqual(question.section, 1)  # since it was the first section found
+        self.assertEqual(question.section.get_code(), '4.3')
         self.assertEqual(question.level, 2)
-        self.assertEqual(question.question_number, 1)
         self.assertEqual(question.upload_type, 'policy')
-        self.assertEqual(question.reference, 'www.example.com')
+        self.assertEqual(question.reference, 'http://www.example.com')
+        self.assertSequenceEqual(
+            [option.name for option in question.options.all()],
+            ['First', 'Second'],
+        )
+        # The data migrations seed areas 5 to 8 and their sections.
+        self.assertTrue(SurveyArea.objects.filter(number=4).exists())
+        self.assertEqual(SurveySection.objects.get(area__number=4).number, 3)
+        self.assertEqual(len(get_structure(survey.pk).questions), 2)
 
-    def test_overwrite(self):
-        """Import over the top of an existing survey."""
-        old_survey = SurveyFactory.create(name='survey')
-        SurveyQuestionFactory.create(survey=old_survey, name='Old question?')
+    def test_structure_invalidated_on_commit(self):
+        """The import sends no signals, so drops the survey's structure itself."""
+        survey = SurveyFactory.create(name='survey')
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
+        csv += self.csv_ise('What is your name?', '4.3.2.1', '', '')
+
+        on_commit = 'surveys.management.commands.import_survey.transaction.on_commit'
+        with patch(on_commit) as mock_on_commit:
+            self.run_command(csv, '--overwrite')
 
+        with patch.object(structure, 'invalidate') as invalidate:
+            for args, kwargs in mock_on_commit.call_args_list:
+                args[0]()
+        invalidate.assert_called_once_with(survey.pk)
+
+    def test_existing_section(self):
+        section = SurveySectionFactory.create(area__number=4, number=3)
         csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
-        csv += self.csv_ise('What is your name?', '4.3.2.1', 'Policy', 'www.example.com')
+        csv += self.csv_ise('What is your name?', '4.3.2.1', '', '')
 
         self.run_command(data=csv)
 
-        Survey.objects.get()  # Will explode if a new survey has been created
-        question = SurveyQuestion.objects.get()
-        self.assertEqual(question.name, 'What is your name?')
+        self.assertEqual(SurveyQuestion.objects.get().section, section)
+        self.assertEqual(SurveySection.objects.filter(area__number=4).count(), 1)
+
+    def test_exists(self):
+        """An existing survey is only changed with --overwrite."""
+        SurveyFactory.create(name='survey')
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
+        csv += self.csv_ise('What is your name?', '4.3.2.1', '', '')
+
+        with self.assertRaises(CommandError):
+            self.run_command(data=csv)
+        self.assertFalse(SurveyQuestion.objects.exists())
+
+    def test_overwrite(self):
+        """Bring an existing survey in line with the CSV."""
+        survey = SurveyFactory.create(name='survey')
+        section = SurveySectionFactory.create(area__number=4, number=3)
+        unchanged = SurveyQuestionFactory.create(
+            survey=survey,
+            section=section,
+            level=1,
+            question_number=1,
+            name='Unchanged?',
+        )
+        option = SurveyQuestionOptionFactory.create(question=unchanged, name='Kept')
+        changed = SurveyQuestionFactory.create(
+            survey=survey,
+            section=section,
+            level=2,
+            question_number=1,
+            name='Old question?',
+            notes='Kept notes',
+        )
+        removed = SurveyQuestionFactory.create(
+            survey=survey,
+            section=section,
+            level=2,
+            question_number=2,
+        )
+        survey_response = SurveyResponseFactory.create(survey=survey, level=2)
+        SurveyAnswerFactory.create(response=survey_response, question=changed)
+
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference', 'Options')
+        csv += self.csv_ise('Unchanged?', '4.3.1.1', '', '', 'Kept')
+        csv += self.csv_ise('What is your name?', '4.3.2.1', 'Procedure', '', '')
+        csv += self.csv_ise('New question?', '4.3.2.3', '', '', '')
+
+        self.run_command(csv, '--overwrite')
+
+        self.assertEqual(Survey.objects.get(), survey)
+        self.assertSequenceEqual(
+            SurveyQuestion.objects.order_by('level', 'question_number').values_list(
+                'pk',
+                'name',
+            ),
+            [
+                (unchanged.pk, 'Unchanged?'),
+                (changed.pk, 'What is your name?'),
+                (SurveyQuestion.objects.get(name='New question?').pk, 'New question?'),
+            ],
+        )
+        changed.refresh_from_db()
+        self.assertEqual(changed.upload_type, 'procedure')
+        self.assertEqual(changed.notes, 'Kept notes')
+        self.assertSequenceEqual(unchanged.options.all(), [option])
+        self.assertFalse(SurveyQuestion.objects.filter(pk=removed.pk).exists())
+
+        progress = SurveyResponseProgress.objects.get(response=survey_response, level=2)
+        self.assertEqual(progress.question_count, 2)
+        self.assertEqual(progress.answer_count, 1)
+
+    def test_overwrite_answered(self):
+        """Answered questions missing from the CSV aren't deleted by default."""
+        survey = SurveyFactory.create(name='survey')
+        section = SurveySectionFactory.create(area__number=4, number=3)
+        kept = SurveyQuestionFactory.create(
+            survey=survey,
+            section=section,
+            level=1,
+            question_number=1,
+        )
+        answered = SurveyQuestionFactory.create(
+            survey=survey,
+            section=section,
+            level=1,
+            question_number=2,
+        )
+        SurveyAnswerFactory.create(question=answered, response__survey=survey)
+        SurveyAnswerFactory.create(
+            question=answered,
+            response__survey=survey,
+            response__submitted=timezone.now(),
+        )
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
+        csv += self.csv_ise('Renamed?', '4.3.1.1', '', '')
+
+        message = (
+            r'^1 questions not in the file have been answered\. Use --delete-answered '
+            r'to delete them with their answers:\n  4\.3\.1\.2: 2 answers, 1 of '
+            r'submitted responses$'
+        )
+        with self.assertRaisesRegex(CommandError, message):
+            self.run_command(csv, '--overwrite')
+
+        self.assertTrue(SurveyQuestion.objects.filter(pk=answered.pk).exists())
+        self.assertEqual(SurveyAnswer.objects.count(), 2)
+        kept.refresh_from_db()
+        self.assertNotEqual(kept.name, 'Renamed?')
+
+    def test_overwrite_delete_answered(self):
+        survey = SurveyFactory.create(name='survey')
+        answered = SurveyQuestionFactory.create(
+            survey=survey,
+            section__area__number=4,
+            section__number=3,
+            level=1,
+            question_number=2,
+        )
+        SurveyAnswerFactory.create(question=answered, response__survey=survey)
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
+        csv += self.csv_ise('New question?', '4.3.1.1', '', '')
+
+        self.run_command(csv, '--overwrite', '--delete-answered')
+
+        self.assertFalse(SurveyQuestion.objects.filter(pk=answered.pk).exists())
+        self.assertFalse(SurveyAnswer.objects.exists())
 
     def test_broken_columns(self):
         """Throw a nice error message when the CSV has the wrong columns."""
         csv = self.csv_ise('Name', 'Code', 'Unrelated')
 
-        message = '^The CSV must have Name, Code, Upload and Reference columns\.$'
-        with self.assertRaisesRegexp(ValueError, message):
+        message = r'^The CSV must have Name, Code, Upload and Reference columns\.$'
+        with self.assertRaisesRegex(ValueError, message):
             self.run_command(data=csv)
 
     def test_required_name(self):
@@ -79,8 +254,8 @@ class TestExportUsers(TestCase):
         csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
         csv += self.csv_ise('Question?', '', '', '')
 
-        message = '^The entry at line 2 must have both Name and Code\. \(Question\?\)$'
-        with self.assertRaisesRegexp(ValueError, message):
+        message = r'^The entry at line 2 must have both Name and Code\. \(Question\?\)$'
+        with self.assertRaisesRegex(ValueError, message):
             self.run_command(data=csv)
 
     def test_required_code(self):
@@ -88,8 +263,8 @@ class TestExportUsers(TestCase):
         csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
         csv += self.csv_ise('', '4.3.2.1', '', '')
 
-        message = '^The entry at line 2 must have both Name and Code\. \(4\.3\.2\.1\)$'
-        with self.assertRaisesRegexp(ValueError, message):
+        message = r'^The entry at line 2 must have both Name and Code\. \(4\.3\.2\.1\)$'
+        with self.assertRaisesRegex(ValueError, message):
             self.run_command(data=csv)
 
     def test_required_code_and_name_missing(self):
@@ -97,8 +272,17 @@ class TestExportUsers(TestCase):
         csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
         csv += self.csv_ise('', '', '', '')
 
-        message = '^The entry at line 2 must have both Name and Code\. \(\)$'
-        with self.assertRaisesRegexp(ValueError, message):
+        message = r'^The entry at line 2 must have both Name and Code\. \(\)$'
+        with self.assertRaisesRegex(ValueError, message):
+            self.run_command(data=csv)
+
+    def test_short_row(self):
+        """Throw a nice error message when an entry has too few columns."""
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
+        csv += self.csv_ise('Question?', '4.3.2.1', '')
+
+        message = r'^The entry at line 2 is missing columns: Reference\.$'
+        with self.assertRaisesRegex(ValueError, message):
             self.run_command(data=csv)
 
     def test_broken_code(self):
@@ -107,11 +291,21 @@ class TestExportUsers(TestCase):
         csv += self.csv_ise('Question?', '3.2.1', '', '')
 
         message = (
-            '^A code must consist of four digits \(e\.g\. 4\.3\.2\.1\) '
-            '- the code at line 2 is 3\.2\.1$'
+            r'^A code must consist of four digits \(e\.g\. 4\.3\.2\.1\) '
+            r'- the code at line 2 is 3\.2\.1$'
         )
-        with self.assertRaisesRegexp(ValueError, message):
+        with self.assertRaisesRegex(ValueError, message):
+            self.run_command(data=csv)
+
+    def test_duplicate_code(self):
+        csv = self.csv_ise('Name', 'Code', 'Upload', 'Reference')
+        csv += self.csv_ise('Question?', '4.3.2.1', '', '')
+        csv += self.csv_ise('Again?', '4.3.2.1', '', '')
+
+        message = r'^The code 4\.3\.2\.1 at line 3 is used more than once\.$'
+        with self.assertRaisesRegex(ValueError, message):
             self.run_command(data=csv)
+        self.assertFalse(Survey.objects.exists())
 
     def test_broken_upload(self):
         """Throw a nice error message when the upload type has an invalid value."""
@@ -119,9 +313,58 @@ class TestExportUsers(TestCase):
         csv += self.csv_ise('Question?', '4.3.2.1', 'Nonsense', '')
 
         message = (
-            '^The entry at line 2, with code 4\.3\.2\.1, must have Policy, '
-            'Procedure, or nothing in the Upload column\.$'
+            r'^The entry at line 2, with code 4\.3\.2\.1, must have Policy, '
+            r'Procedure, Process or nothing in the Upload column\.$'
         )
-        with self.assertRaisesRegexp(ValueError, message):
+        with self.assertRaisesRegex(ValueError, message):
             self.run_command(data=csv)
-'''
+
+
+class TestCloneSurvey(TestCase):
+    def test_clone(self):
+        question = SurveyQuestionFactory.create(survey__name='2018')
+        SurveyQuestionOptionFactory.create(question=question)
+
+        call_command('clone_survey', '2018', '2019', '--inactive', verbosity=0)
+
+        copy = Survey.objects.get(name='2019')
+        self.assertFalse(copy.is_active)
+        self.assertEqual(copy.questions.get().options.count(), 1)
+        self.assertEqual(question.survey.questions.count(), 1)
+
+    def test_missing(self):
+        with self.assertRaises(CommandError):
+            call_command('clone_survey', '2018', '2019', verbosity=0)
+
+    def test_exists(self):
+        SurveyFactory.create(name='2018')
+        SurveyFactory.create(name='2019')
+        with self.assertRaises(CommandError):
+            call_command('clone_survey', '2018', '2019', verbosity=0)
+
+
+class TestSnapshotResponses(TestCase):
+    def test_snapshot(self):
+        question = SurveyQuestionFactory.create(level=1)
+        submitted = SurveyResponseFactory.create(
+            survey=question.survey,
+            level=1,
+            submitted=timezone.now(),
+        )
+        in_progress = SurveyResponseFactory.create(survey=question.survey, level=1)
+
+        call_command('snapshot_responses', verbosity=0)
+
+        submitted.refresh_from_db()
+        in_progress.refresh_from_db()
+        self.assertTrue(is_current(submitted))
+        self.assertIsNone(in_progress.snapshot)
+
+    def test_current(self):
+        response = SurveyResponseFactory.create(submitted=timezone.now())
+        response.snapshot = build_snapshot(response)
+        response.save()
+
+        with patch.object(snapshot_responses, 'build_snapshot') as build:
+            call_command('snapshot_responses', verbosity=0)
+        build.assert_not_called()
@@ -16,7 +16,7 @@ from .factories import (
     SurveyResponseFactory,
     SurveySectionFactory,
 )
-from ..models import Survey, SurveyAnswer, SurveyResponse
+from ..models import Survey, SurveyAnswer, SurveyResponse, SurveyResponseProgress
 
 
 class TestSurvey(TestCase):
@@ -24,6 +24,20 @@ class TestSurvey(TestCase):
         survey = SurveyFactory.build()
         self.assertEqual(str(survey), survey.name)
 
+    def test_clone(self):
+        question = SurveyQuestionFactory.create(survey__is_active=False)
+        option = SurveyQuestionOptionFactory.create(question=question)
+
+        copy = question.survey.clone('Copy')
+
+        self.assertEqual(copy.name, 'Copy')
+        self.assertFalse(copy.is_active)
+        copy_question = copy.questions.get()
+        self.assertNotEqual(copy_question, question)
+        self.assertEqual(copy_question.get_code(), question.get_code())
+        self.assertEqual(copy_question.options.get().name, option.name)
+        self.assertEqual(copy.get_structure().questions[0].pk, copy_question.pk)
+
 
 class TestSurveySections(TestCase):
     def setUp(self):
@@ -342,53 +356,24 @@ class TestSurveyResponseProgress(TestCase):
         }
 
         """
-        SELECT DISTINCT
-          FROM "surveys_surveysection"
+        SELECT
+          FROM "surveys_surveyresponseprogress"
          INNER
-          JOIN "surveys_surveyquestion"
-            ON ("surveys_surveysection"."id" =  "surveys_surveyquestion"."section_id")
+          JOIN "surveys_surveysection"
+            ON ("surveys_surveyresponseprogress"."section_id" =
+                "surveys_surveysection"."id")
          INNER
           JOIN "surveys_surveyarea"
             ON ("surveys_surveysection"."area_id" =  "surveys_surveyarea"."id")
-         WHERE (
-                   "surveys_surveyquestion"."level" <= 4
-           AND "surveys_surveyquestion"."survey_id" =  4582
-               )
-         ORDER BY "surveys_surveyarea"."number" ASC, "surveys_surveysection"."number" ASC
-        SELECT
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" = 7001 THEN 1 ELSE 0 END
-            ) AS "7001",
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" = 7000 THEN 1 ELSE 0 END
-            ) AS "7000",
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" = 7002 THEN 1 ELSE 0 END
-            ) AS "7002"
-          FROM "surveys_surveyquestion"
-         WHERE "surveys_surveyquestion"."survey_id" =  4582
-        SELECT
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" = 7001 THEN 1 ELSE 0 END
-            ) AS "7001",
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" = 7000 THEN 1 ELSE 0 END
-            ) AS "7000",
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" = 7002 THEN 1 ELSE 0 END
-            ) AS "7002"
-          FROM "surveys_surveyanswer"
-         INNER
-          JOIN "surveys_surveyquestion"
-            ON ("surveys_surveyanswer"."question_id" =  "surveys_surveyquestion"."id")
-         WHERE "surveys_surveyanswer"."response_id" =  8071
-
+         WHERE "surveys_surveyresponseprogress"."response_id" =  8071
+         ORDER BY "surveys_surveyarea"."number" ASC, "surveys_surveysection"."number" ASC,
+               "surveys_surveyresponseprogress"."level" ASC
         """
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(1):
             self.assertEqual(self.survey_response.get_progress(), expected)
 
     def test_get_total_progress(self):
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(2):
             survey_response = list(Survey.objects.with_latest_response_progress(
                 self.survey_response.organisation,
                 []  # empty list of sent Invitations
@@ -398,7 +383,7 @@ class TestSurveyResponseProgress(TestCase):
         self.assertEqual(progress, self.expected_progress_total)
 
     def test_survey_response_invites(self):
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(3):
             invitations = InvitationModel.objects.filter(
                 grantee=self.survey_response.organisation,
                 accepted=True
@@ -594,10 +579,22 @@ class TestSurveyResponseProgress(TestCase):
                 ],
             }
         }
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(1):
             compliance = self.survey_response.get_compliance()
         self.assertEqual(compliance, expected)
 
+    def test_get_compliance_more_sections(self):
+        """The number of queries doesn't grow with the number of sections."""
+        for number in range(4, 10):
+            SurveyQuestionFactory.create(
+                survey=self.survey,
+                section=SurveySectionFactory.create(number=number, area=self.area),
+            )
+
+        with self.assertNumQueries(1):
+            compliance = self.survey_response.get_compliance()
+        self.assertEqual(len(compliance['compliance']['sections']), 9)
+
     def test_get_level_compliance(self):
         expected = {
             'compliance': {
@@ -651,11 +648,88 @@ class TestSurveyResponseProgress(TestCase):
                 'total': 5,
             }
         }
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(1):
             stats = self.survey_response.get_level_compliance()
         self.assertEqual(stats, expected)
 
 
+class TestSurveyResponseProgressCounts(TestCase):
+    def setUp(self):
+        self.section = SurveySectionFactory.create()
+        self.question = SurveyQuestionFactory.create(section=self.section, level=2)
+        self.survey_response = SurveyResponseFactory.create(
+            survey=self.question.survey,
+            level=2,
+        )
+
+    def get_counts(self, section=None, level=2):
+        progress = SurveyResponseProgress.objects.get(
+            response=self.survey_response,
+            section=section or self.section,
+            level=level,
+        )
+        return progress.question_count, progress.answer_count, progress.yes_count
+
+    def test_create_response(self):
+        self.assertEqual(self.get_counts(), (1, 0, 0))
+
+    def test_create_question(self):
+        section = SurveySectionFactory.create()
+        SurveyQuestionFactory.create(
+            survey=self.question.survey,
+            section=section,
+            level=1,
+        )
+        self.assertEqual(self.get_counts(section=section, level=1), (1, 0, 0))
+
+    def test_move_question(self):
+        self.question.level = 3
+        self.question.save()
+        self.assertEqual(self.get_counts(), (0, 0, 0))
+        self.assertEqual(self.get_counts(level=3), (1, 0, 0))
+
+    def test_delete_question(self):
+        SurveyAnswerFactory.create(response=self.survey_response, question=self.question)
+        self.question.delete()
+        self.assertEqual(self.get_counts(), (0, 0, 0))
+
+    def test_create_answer(self):
+        SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=self.question,
+            value=SurveyAnswer.ANSWER_YES,
+        )
+        self.assertEqual(self.get_counts(), (1, 1, 1))
+
+    def test_update_answer(self):
+        answer = SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=self.question,
+            value=SurveyAnswer.ANSWER_YES,
+        )
+        answer.value = SurveyAnswer.ANSWER_NO
+        answer.save()
+        self.assertEqual(self.get_counts(), (1, 1, 0))
+
+        answer.value = SurveyAnswer.ANSWER_YES
+        answer.save()
+        self.assertEqual(self.get_counts(), (1, 1, 1))
+
+    def test_delete_answer(self):
+        answer = SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=self.question,
+            value=SurveyAnswer.ANSWER_YES,
+        )
+        answer.delete()
+        self.assertEqual(self.get_counts(), (1, 0, 0))
+
+    def test_delete_response(self):
+        SurveyAnswerFactory.create(response=self.survey_response, question=self.question)
+        self.survey_response.delete()
+        self.assertFalse(SurveyResponseProgress.objects.exists())
+
+
 class TestSurveyAnswer(TestCase):
     def test_str(self):
         answer = SurveyAnswerFactory.build()
@@ -1,12 +1,16 @@
+from datetime import date, timedelta
+
 from django.test import TestCase
+from django.utils import timezone
 
-from users.tests.factories import UserFactory
+from users.tests.factories import OrganisationFactory, UserFactory
 
 from .factories import (
     SurveyAnswerFactory,
     SurveyAreaFactory,
     SurveyFactory,
     SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
     SurveyResponseFactory,
     SurveySectionFactory,
 )
@@ -14,7 +18,9 @@ from ..models import (
     Survey,
     SurveyAnswer,
     SurveyQuestion,
+    SurveyQuestionOption,
     SurveyResponse,
+    SurveyResponseProgress,
 )
 
 
@@ -30,6 +36,53 @@ class TestSurveyQueryset(TestCase):
         expected = {survey}
         self.assertSequenceEqual(set(self.manager.available()), expected)
 
+    def test_latest_response_progress(self):
+        survey = SurveyFactory.create()
+        question = SurveyQuestionFactory.create(survey=survey, level=1)
+        SurveyQuestionFactory.create(survey=survey, level=1)
+        organisation_1, organisation_2 = OrganisationFactory.create_batch(2)
+
+        old = SurveyResponseFactory.create(
+            survey=survey,
+            organisation=organisation_1,
+            level=1,
+        )
+        latest_1 = SurveyResponseFactory.create(
+            survey=survey,
+            organisation=organisation_1,
+            level=1,
+        )
+        SurveyAnswerFactory.create(response=latest_1, question=question)
+        SurveyResponse.objects.filter(pk=old.pk).update(
+            modified=timezone.now() - timedelta(days=1),
+        )
+        latest_2 = SurveyResponseFactory.create(
+            survey=survey,
+            organisation=organisation_2,
+            level=1,
+        )
+        # Another organisation's response isn't requested.
+        SurveyResponseFactory.create(survey=survey, level=1)
+
+        with self.assertNumQueries(1):
+            lookup = self.manager.filter(pk=survey.pk).latest_response_progress(
+                [organisation_1, organisation_2],
+            )
+
+        self.assertEqual(
+            lookup,
+            {
+                (organisation_1.pk, survey.pk): latest_1,
+                (organisation_2.pk, survey.pk): latest_2,
+            },
+        )
+        response_1 = lookup[organisation_1.pk, survey.pk]
+        self.assertEqual(response_1.progress['count'], 1)
+        self.assertEqual(response_1.progress['total'], 2)
+        self.assertEqual(response_1.progress['slug'], 'in-progress')
+        response_2 = lookup[organisation_2.pk, survey.pk]
+        self.assertEqual(response_2.progress['slug'], 'not-started')
+
 
 class TestSurveyQuestionQueryset(TestCase):
     manager = SurveyQuestion.objects
@@ -107,61 +160,32 @@ class TestSurveyQuestionQueryset(TestCase):
             expected
         )
 
-    def test_next_section_first(self):
-        self.assertEqual(
-            self.manager.next_section(self.survey, current_section=None),
-            self.section_1.pk
-        )
-
-    def test_next_section(self):
-        self.assertEqual(
-            self.manager.next_section(
-                self.survey,
-                current_section=self.section_1
-            ),
-            self.section_2.pk
+    def test_copy_to(self):
+        option_1 = SurveyQuestionOptionFactory.create(question=self.q1, name='First')
+        option_2 = SurveyQuestionOptionFactory.create(question=self.q1, name='Second')
+        SurveyQuestionOption.objects.filter(pk=option_1.pk).update(
+            sort_order=option_2.sort_order + 1,
         )
-
-    def test_next_section_by_area(self):
-        self.assertEqual(
-            self.manager.next_section(
-                self.survey,
-                current_section=self.section_2
-            ),
-            self.section_3.pk
-        )
-
-    def test_next_section_last(self):
-        self.assertEqual(
-            self.manager.next_section(
-                self.survey,
-                current_section=self.section_3
-            ),
-            None
-        )
-
-    def test_previous_section_first(self):
-        self.assertEqual(
-            self.manager.previous_section(self.survey, current_section=self.section_1),
-            None
-        )
-
-    def test_previous_section(self):
-        self.assertEqual(
-            self.manager.previous_section(
-                self.survey,
-                current_section=self.section_2
-            ),
-            self.section_1.pk
+        SurveyQuestionOptionFactory.create(question=self.q5)
+        copy = SurveyFactory.create()
+
+        """
+        Inside a savepoint select and create the questions, select and create the
+        options, then select the responses of the copy.
+        """
+        with self.assertNumQueries(7):
+            self.manager.filter(survey=self.survey).copy_to(copy)
+
+        self.assertEqual(copy.questions.count(), 6)
+        self.assertEqual(self.survey.questions.count(), 6)
+        q1_copy = copy.questions.get(section=self.section_1, level=1)
+        self.assertSequenceEqual(
+            [option.name for option in q1_copy.options.all()],
+            ['Second', 'First'],
         )
-
-    def test_previous_section_by_area(self):
         self.assertEqual(
-            self.manager.previous_section(
-                self.survey,
-                current_section=self.section_3
-            ),
-            self.section_2.pk
+            SurveyQuestionOption.objects.filter(question__survey=copy).count(),
+            3,
         )
 
 
@@ -187,6 +211,26 @@ class TestSurveyResponseQueryset(TestCase):
 
         self.assertSequenceEqual(self.manager.for_user(user), [sr1])
 
+    def test_latest_per_survey(self):
+        organisation = OrganisationFactory.create()
+        other_survey = SurveyFactory.create()
+        old = SurveyResponseFactory.create(survey=self.survey, organisation=organisation)
+        latest = SurveyResponseFactory.create(
+            survey=self.survey,
+            organisation=organisation,
+        )
+        other = SurveyResponseFactory.create(
+            survey=other_survey,
+            organisation=organisation,
+        )
+        SurveyResponse.objects.filter(pk=latest.pk).update(
+            modified=timezone.now() + timedelta(days=1),
+        )
+
+        responses = self.manager.filter(organisation=organisation).latest_per_survey()
+        self.assertSequenceEqual(set(responses), {latest, other})
+        self.assertNotIn(old, responses)
+
 
 class TestSurveyAnswerQueryset(TestCase):
     manager = SurveyAnswer.objects
@@ -225,3 +269,102 @@ class TestSurveyAnswerQueryset(TestCase):
             self.answer3.question_id: self.answer3,
         }
         self.assertEqual(by_question, expected)
+
+    def test_bulk_save(self):
+        response = self.answer1.response
+        question = SurveyQuestionFactory.create(survey=response.survey)
+        option_1, option_2 = SurveyQuestionOptionFactory.create_batch(
+            2,
+            question=question,
+        )
+        due_date = date(2030, 1, 1)
+
+        self.answer1.value = SurveyAnswer.ANSWER_NO
+        self.answer3.value = SurveyAnswer.ANSWER_PROGRESS
+        self.answer3.due_date = due_date
+        new_answer = SurveyAnswer(
+            response=response,
+            question=question,
+            value=SurveyAnswer.ANSWER_YES,
+        )
+
+        self.manager.bulk_save(
+            [self.answer1, self.answer3, new_answer],
+            {question.pk: [option_2.pk]},
+        )
+
+        answers = self.manager.filter(response=response).by_question()
+        self.assertEqual(answers[self.answer1.question_id].value, SurveyAnswer.ANSWER_NO)
+        self.assertEqual(answers[self.answer2.question_id].value, SurveyAnswer.ANSWER_YES)
+        self.assertEqual(answers[self.answer3.question_id].due_date, due_date)
+        self.assertEqual(answers[question.pk].value, SurveyAnswer.ANSWER_YES)
+        self.assertSequenceEqual(answers[question.pk].options.all(), [option_2])
+
+        progress = SurveyResponseProgress.objects.get(
+            response=response,
+            section=question.section,
+        )
+        self.assertEqual(progress.answer_count, 1)
+        self.assertEqual(progress.yes_count, 1)
+
+
+class TestSurveyResponseProgressQueryset(TestCase):
+    manager = SurveyResponseProgress.objects
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.question = SurveyQuestionFactory.create(level=1)
+        cls.section = cls.question.section
+        cls.survey_response = SurveyResponseFactory.create(survey=cls.question.survey)
+        cls.answer = SurveyAnswerFactory.create(
+            response=cls.survey_response,
+            question=cls.question,
+            value=SurveyAnswer.ANSWER_YES,
+        )
+
+    def get_counts(self, level=1):
+        return self.manager.filter(
+            response=self.survey_response,
+            section=self.section,
+            level=level,
+        ).values_list('question_count', 'answer_count', 'yes_count').get()
+
+    def test_adjust(self):
+        self.manager.adjust(
+            [self.survey_response.pk],
+            self.section.pk,
+            1,
+            answer_count=-1,
+            yes_count=-1,
+        )
+        self.assertEqual(self.get_counts(), (1, 0, 0))
+
+    def test_adjust_create(self):
+        self.manager.adjust(
+            [self.survey_response.pk],
+            self.section.pk,
+            2,
+            question_count=1,
+        )
+        self.assertEqual(self.get_counts(level=2), (1, 0, 0))
+
+    def test_adjust_decrement_missing(self):
+        """Decrements never create rows."""
+        response_ids = [self.survey_response.pk]
+        self.manager.adjust(response_ids, self.section.pk, 2, answer_count=-1)
+        self.assertFalse(self.manager.filter(level=2).exists())
+
+    def test_adjust_questions(self):
+        other = SurveyResponseFactory.create(survey=self.question.survey)
+        self.manager.adjust_questions(self.question.survey_id, self.section.pk, 1, 1)
+        self.assertEqual(self.get_counts(), (2, 1, 1))
+        self.assertEqual(
+            self.manager.get(response=other, section=self.section).question_count,
+            2,
+        )
+
+    def test_rebuild(self):
+        self.manager.all().update(question_count=0, answer_count=0, yes_count=0)
+        with self.assertNumQueries(4):
+            self.manager.rebuild([self.survey_response])
+        self.assertEqual(self.get_counts(), (1, 1, 1))
@@ -0,0 +1,135 @@
+import json
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from .factories import (
+    SurveyAnswerDocumentFactory,
+    SurveyAnswerFactory,
+    SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
+    SurveyResponseFactory,
+)
+from .. import reports, snapshots
+
+
+@patch('surveys.signals.transaction.on_commit', lambda func: func())
+class TestFullReport(TestCase):
+    def setUp(self):
+        self.question = SurveyQuestionFactory.create()
+        self.options = SurveyQuestionOptionFactory.create_batch(
+            3,
+            question=self.question,
+        )
+        self.response = SurveyResponseFactory.create(
+            survey=self.question.survey,
+            submitted=timezone.now(),
+        )
+        self.answer = SurveyAnswerFactory.create(
+            response=self.response,
+            question=self.question,
+        )
+        self.answer.options.add(self.options[1])
+        self.document = SurveyAnswerDocumentFactory.create(answer=self.answer).document
+
+    def test_get_full_report(self):
+        report = reports.get_full_report(self.response)
+
+        step = report['stats']['compliance']['sections'][0]
+        question = step['questions'][0]
+        self.assertEqual(question['answer']['value'], self.answer.value)
+        self.assertEqual(question['options'], [
+            [self.options[0].name, False],
+            [self.options[1].name, True],
+            [self.options[2].name, False],
+        ])
+        self.assertEqual(report['table'].count('fa-check'), 1)
+        self.assertIn(self.document.name, report['table'])
+        self.assertIn(self.document.file.url, report['table'])
+
+    def test_snapshotted(self):
+        self.response.snapshot = snapshots.build_snapshot(self.response)
+        with self.assertNumQueries(0):
+            report = reports.get_full_report(self.response)
+        self.assertEqual(report['table'].count('fa-check'), 1)
+        self.assertIsNone(cache.get(reports.get_cache_key(self.response.pk)))
+
+    def test_submitted_cached(self):
+        reports.get_full_report(self.response)
+        with self.assertNumQueries(0):
+            report = reports.get_full_report(self.response)
+        self.assertIn(self.document.name, report['table'])
+
+    def test_cached_data(self):
+        """Only JSON data is cached, without the links to the documents."""
+        reports.get_full_report(self.response)
+        cached = cache.get(reports.get_cache_key(self.response.pk))
+        json.dumps(cached)
+        question = cached['snapshot']['compliance']['sections'][0]['questions'][0]
+        document, = question['answer']['documents']
+        self.assertNotIn('url', document)
+
+    def test_links_per_request(self):
+        reports.get_full_report(self.response)
+        signed_url = 'https://storage.example.com/policy.pdf?signature=2'
+        with patch('surveys.snapshots.default_storage.url', return_value=signed_url):
+            report = reports.get_full_report(self.response)
+        self.assertIn(signed_url, report['table'])
+
+    def test_not_submitted(self):
+        self.response.submitted = None
+        reports.get_full_report(self.response)
+        snapshot = snapshots.build_snapshot(self.response)
+        with patch('surveys.reports.snapshots.build_snapshot') as build_snapshot:
+            build_snapshot.return_value = snapshot
+            reports.get_full_report(self.response)
+        build_snapshot.assert_called_once_with(self.response)
+
+    def test_level_changed(self):
+        reports.get_full_report(self.response)
+        self.response.level = 2
+        snapshot = snapshots.build_snapshot(self.response)
+        with patch('surveys.reports.snapshots.build_snapshot') as build_snapshot:
+            build_snapshot.return_value = snapshot
+            reports.get_full_report(self.response)
+        build_snapshot.assert_called_once_with(self.response)
+
+    def test_invalidated_by_answer_options(self):
+        reports.get_full_report(self.response)
+        self.answer.options.add(self.options[2])
+        report = reports.get_full_report(self.response)
+        self.assertEqual(report['table'].count('fa-check'), 2)
+
+    def test_invalidated_by_answer(self):
+        reports.get_full_report(self.response)
+        self.answer.explanation = 'Updated explanation'
+        self.answer.save()
+        report = reports.get_full_report(self.response)
+        self.assertIn('Updated explanation', report['table'])
+
+    def test_invalidated_by_document(self):
+        reports.get_full_report(self.response)
+        self.document.name = 'Updated policy'
+        self.document.save()
+        report = reports.get_full_report(self.response)
+        self.assertIn('Updated policy', report['table'])
+
+    def test_invalidated_by_question(self):
+        reports.get_full_report(self.response)
+        self.question.name = 'Updated question?'
+        self.question.save()
+        report = reports.get_full_report(self.response)
+        self.assertIn('Updated question?', report['table'])
+
+    def test_snapshot_frozen(self):
+        self.response.snapshot = snapshots.build_snapshot(self.response)
+        self.response.save()
+        reports.get_full_report(self.response)
+        name = self.document.name
+        self.document.name = 'Updated policy'
+        self.document.save()
+        report = reports.get_full_report(self.response)
+        self.assertIn(name, report['table'])
+        self.assertNotIn('Updated policy', report['table'])
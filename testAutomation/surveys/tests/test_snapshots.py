@@ -0,0 +1,150 @@
+from datetime import date
+
+from django.test import TestCase
+
+from documents.tests.factories import DocumentFactory
+from .factories import (
+    SurveyAnswerDocumentFactory,
+    SurveyAnswerFactory,
+    SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
+    SurveyResponseFactory,
+)
+from .. import snapshots
+from ..models import SurveyAnswer
+
+
+class TestSnapshots(TestCase):
+    def setUp(self):
+        self.question = SurveyQuestionFactory.create(
+            name='First?',
+            level=1,
+            section__name='Section',
+            section__number=2,
+            section__area__name='Area',
+            section__area__number=1,
+        )
+        self.options = SurveyQuestionOptionFactory.create_batch(
+            2,
+            question=self.question,
+        )
+        # Above the tier of the response.
+        SurveyQuestionFactory.create(
+            survey=self.question.survey,
+            level=2,
+            section=self.question.section,
+        )
+        self.response = SurveyResponseFactory.create(
+            survey=self.question.survey,
+            level=1,
+        )
+        self.answer = SurveyAnswerFactory.create(
+            response=self.response,
+            question=self.question,
+            value=SurveyAnswer.ANSWER_PROGRESS,
+            explanation='Soon',
+            due_date=date(2030, 1, 31),
+        )
+        self.answer.options.add(self.options[1])
+        self.document = DocumentFactory.create(
+            name='Policy',
+            organisation=self.response.organisation,
+            expiry=date(2030, 6, 30),
+        )
+        SurveyAnswerDocumentFactory.create(
+            answer=self.answer,
+            document=self.document,
+            explanation='Page 2',
+        )
+
+    def snapshot_response(self):
+        self.response.snapshot = snapshots.build_snapshot(self.response)
+        self.response.save()
+
+    def test_build(self):
+        with self.assertNumQueries(6):
+            snapshot = snapshots.build_snapshot(self.response)
+
+        self.assertEqual(snapshot['version'], snapshots.SNAPSHOT_VERSION)
+        self.assertEqual(snapshot['level'], 1)
+        self.assertEqual(snapshot['progress']['count'], 1)
+        self.assertEqual(snapshot['compliance']['count'], 0)
+        self.assertEqual(snapshot['compliance']['total'], 1)
+
+        step, = snapshot['compliance']['sections']
+        self.assertEqual(step['section'], {
+            'code': '1.2',
+            'name': 'Section',
+            'area': {'number': 1, 'name': 'Area'},
+        })
+        self.assertEqual(step['questions'], [{
+            'code': '1.2.1.1',
+            'name': 'First?',
+            'options': [
+                [self.options[0].name, False],
+                [self.options[1].name, True],
+            ],
+            'answer': {
+                'value': SurveyAnswer.ANSWER_PROGRESS,
+                'value_display': 'In progress',
+                'explanation': 'Soon',
+                'due_date': '2030-01-31',
+                'documents': [{
+                    'name': 'Policy',
+                    'file': self.document.file.name,
+                    'explanation': 'Page 2',
+                    'expiry': '2030-06-30',
+                }],
+            },
+        }])
+
+    def test_build_unanswered(self):
+        self.answer.delete()
+        snapshot = snapshots.build_snapshot(self.response)
+        question, = snapshot['compliance']['sections'][0]['questions']
+        self.assertIsNone(question['answer'])
+
+    def test_is_current(self):
+        self.assertFalse(snapshots.is_current(self.response))
+        self.snapshot_response()
+        self.assertTrue(snapshots.is_current(self.response))
+
+        self.response.level = 2
+        self.assertFalse(snapshots.is_current(self.response))
+
+    def test_get_snapshot(self):
+        self.snapshot_response()
+
+        with self.assertNumQueries(0):
+            snapshot = snapshots.get_snapshot(self.response)
+
+        answer = snapshot['compliance']['sections'][0]['questions'][0]['answer']
+        self.assertEqual(answer['due_date'], date(2030, 1, 31))
+        document, = answer['documents']
+        self.assertEqual(document['expiry'], date(2030, 6, 30))
+        self.assertEqual(document['url'], self.document.file.url)
+        # The stored snapshot stays as JSON.
+        self.assertEqual(
+            self.response.snapshot['compliance']['sections'][0]['questions'][0]
+            ['answer']['due_date'],
+            '2030-01-31',
+        )
+
+    def test_get_snapshot_not_snapshotted(self):
+        with self.assertNumQueries(6):
+            snapshot = snapshots.get_snapshot(self.response)
+        question = snapshot['compliance']['sections'][0]['questions'][0]
+        self.assertEqual(question['answer']['due_date'], date(2030, 1, 31))
+
+    def test_get_snapshot_frozen(self):
+        self.snapshot_response()
+        self.question.name = 'Updated question?'
+        self.question.save()
+        self.document.name = 'Updated policy'
+        self.document.save()
+
+        self.response.refresh_from_db()
+        snapshot = snapshots.get_snapshot(self.response)
+        question = snapshot['compliance']['sections'][0]['questions'][0]
+        self.assertEqual(question['name'], 'First?')
+        self.assertEqual(question['answer']['documents'][0]['name'], 'Policy')
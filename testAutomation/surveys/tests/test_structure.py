@@ -0,0 +1,174 @@
+from django.test import TestCase
+
+from .factories import (
+    SurveyAreaFactory,
+    SurveyFactory,
+    SurveyQuestionFactory,
+    SurveyQuestionOptionFactory,
+    SurveySectionFactory,
+)
+from ..structure import get_structure, invalidate
+
+
+class TestSurveyStructure(TestCase):
+    def setUp(self):
+        invalidate()
+        self.survey = SurveyFactory.create()
+        area_1 = SurveyAreaFactory.create(number=1)
+        area_2 = SurveyAreaFactory.create(number=2)
+        self.section_1 = SurveySectionFactory.create(area=area_1, number=1)
+        self.section_2 = SurveySectionFactory.create(area=area_1, number=2)
+        self.section_3 = SurveySectionFactory.create(area=area_2, number=1)
+
+        self.q1 = SurveyQuestionFactory.create(
+            survey=self.survey,
+            section=self.section_3,
+            level=1,
+        )
+        self.q2 = SurveyQuestionFactory.create(
+            survey=self.survey,
+            section=self.section_1,
+            level=2,
+            question_number=3,
+        )
+        self.q3 = SurveyQuestionFactory.create(
+            survey=self.survey,
+            section=self.section_1,
+            level=1,
+        )
+        self.option = SurveyQuestionOptionFactory.create(question=self.q3)
+
+        # Not part of the survey.
+        SurveyQuestionFactory.create(section=self.section_2)
+
+    def test_build(self):
+        """Building a snapshot takes three queries."""
+        with self.assertNumQueries(3):
+            structure = get_structure(self.survey.pk)
+
+        self.assertSequenceEqual(structure.sections, [self.section_1, self.section_3])
+        self.assertSequenceEqual(
+            [question.pk for question in structure.questions],
+            [self.q3.pk, self.q2.pk, self.q1.pk],
+        )
+
+    def test_cached(self):
+        get_structure(self.survey.pk)
+        with self.assertNumQueries(0):
+            structure = get_structure(self.survey.pk)
+            self.assertEqual(structure.get_section(self.section_3.pk).get_code(), '2.1')
+
+    def test_codes(self):
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.get_question_code(self.q1.pk), '2.1.1.1')
+        self.assertEqual(structure.get_question_code(self.q2.pk), '1.1.2.3')
+        self.assertEqual(structure.get_section_info(self.section_1.pk).code, '1.1')
+
+    def test_levels(self):
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.get_section_info(self.section_1.pk).levels, {1, 2})
+        self.assertEqual(structure.get_section_info(self.section_3.pk).levels, {1})
+
+    def test_options(self):
+        structure = get_structure(self.survey.pk)
+        question = structure.get_question(self.q3.pk)
+        self.assertEqual(question.options, ((self.option.pk, self.option.name),))
+
+    def test_navigation(self):
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.first_section(), self.section_1.pk)
+        self.assertEqual(structure.next_section(self.section_1.pk), self.section_3.pk)
+        self.assertIsNone(structure.next_section(self.section_3.pk))
+        self.assertEqual(structure.previous_section(self.section_3.pk), self.section_1.pk)
+        self.assertIsNone(structure.previous_section(self.section_1.pk))
+        self.assertIsNone(structure.get_section(self.section_2.pk))
+
+    def test_navigation_within_area(self):
+        SurveyQuestionFactory.create(survey=self.survey, section=self.section_2)
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.next_section(self.section_1.pk), self.section_2.pk)
+        self.assertEqual(structure.next_section(self.section_2.pk), self.section_3.pk)
+        self.assertEqual(structure.previous_section(self.section_3.pk), self.section_2.pk)
+        self.assertEqual(structure.previous_section(self.section_2.pk), self.section_1.pk)
+
+    def test_level_navigation(self):
+        # Between sections 1 and 3, with questions for silver and above alone.
+        section = SurveySectionFactory.create(area=self.section_1.area, number=3)
+        SurveyQuestionFactory.create(survey=self.survey, section=section, level=2)
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.next_section(self.section_1.pk), section.pk)
+        self.assertEqual(structure.next_section(self.section_1.pk, 1), self.section_3.pk)
+        self.assertEqual(structure.next_section(self.section_1.pk, 2), section.pk)
+        self.assertEqual(structure.next_section(section.pk, 1), self.section_3.pk)
+        self.assertEqual(
+            structure.previous_section(self.section_3.pk, 1),
+            self.section_1.pk,
+        )
+        self.assertEqual(structure.previous_section(self.section_3.pk, 4), section.pk)
+        self.assertIsNone(structure.previous_section(self.section_1.pk, 1))
+
+    def test_level_first_section(self):
+        self.q3.level = 2
+        self.q3.save()
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.first_section(), self.section_1.pk)
+        self.assertEqual(structure.first_section(1), self.section_3.pk)
+        self.assertEqual(structure.first_section(2), self.section_1.pk)
+
+    def test_empty(self):
+        structure = get_structure(SurveyFactory.create().pk)
+        self.assertIsNone(structure.first_section())
+        self.assertIsNone(structure.first_section(1))
+        self.assertSequenceEqual(structure.sections, [])
+
+    def test_invalidated_by_question(self):
+        get_structure(self.survey.pk)
+        question = SurveyQuestionFactory.create(
+            survey=self.survey,
+            section=self.section_2,
+        )
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.next_section(self.section_1.pk), self.section_2.pk)
+        self.assertEqual(structure.get_question_code(question.pk), '1.2.1.1')
+
+        question.delete()
+        structure = get_structure(self.survey.pk)
+        self.assertIsNone(structure.get_section(self.section_2.pk))
+
+    def test_other_survey_kept(self):
+        """Changing another survey's questions keeps this survey's snapshot."""
+        get_structure(self.survey.pk)
+        question = SurveyQuestionFactory.create(section=self.section_1)
+        SurveyQuestionOptionFactory.create(question=question)
+
+        with self.assertNumQueries(0):
+            get_structure(self.survey.pk)
+
+    def test_invalidated_by_section(self):
+        get_structure(self.survey.pk)
+        self.section_1.number = 5
+        self.section_1.save()
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.get_question_code(self.q3.pk), '1.5.1.1')
+
+    def test_invalidated_by_area(self):
+        get_structure(self.survey.pk)
+        area = self.section_3.area
+        # The data migrations seed areas 5 to 8.
+        area.number = 12
+        area.save()
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.get_section_info(self.section_3.pk).code, '12.1')
+
+    def test_invalidated_by_option(self):
+        get_structure(self.survey.pk)
+        self.option.delete()
+
+        structure = get_structure(self.survey.pk)
+        self.assertEqual(structure.get_question(self.q3.pk).options, ())
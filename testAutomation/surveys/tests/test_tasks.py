@@ -0,0 +1,144 @@
+import csv
+import io
+from unittest.mock import patch
+
+from django.test import TestCase
+from openpyxl import load_workbook
+from rolepermissions.roles import assign_role
+
+from users.tests.factories import InvitationFactory, UserFactory
+from .factories import SurveyAnswerFactory, SurveyQuestionFactory, SurveyResponseFactory
+from .. import tasks
+from ..models import ExportJob, SurveyAnswer
+
+
+class TestRunExportJob(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        question = SurveyQuestionFactory.create(level=1)
+        self.survey = question.survey
+        self.survey_response = SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=self.survey,
+            submitted='2030-01-01T00:00Z',
+        )
+        SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=question,
+            value=SurveyAnswer.ANSWER_NO,
+            explanation='Not yet',
+        )
+        # Not submitted.
+        SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=self.survey,
+        )
+
+    def run_job(self, **kwargs):
+        job = ExportJob.objects.create(user=self.user, **kwargs)
+        tasks.run_export_job(job.pk)
+        job.refresh_from_db()
+        self.addCleanup(job.file.delete, save=False)
+        return job
+
+    def read(self, job):
+        # FieldFile.open() returns None on Django 1.11, so it can't be used with `with`.
+        job.file.open('rb')
+        self.addCleanup(job.file.close)
+        return job.file.read()
+
+    def read_csv(self, job):
+        content = self.read(job).decode('utf-8')
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_responses_csv(self):
+        job = self.run_job(
+            kind=ExportJob.KIND_RESPONSES,
+            survey=self.survey,
+            format=ExportJob.FORMAT_CSV,
+        )
+
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertIsNotNone(job.finished)
+        self.assertTrue(job.file.name.endswith('.csv'))
+
+        rows = self.read_csv(job)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][8], 'Not yet')
+
+    def test_responses_xlsx(self):
+        job = self.run_job(kind=ExportJob.KIND_RESPONSES, survey=self.survey)
+
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        sheet = load_workbook(io.BytesIO(self.read(job))).active
+        self.assertEqual(sheet.max_row, 2)
+
+    @patch.object(tasks, 'EXPORT_CHUNK_SIZE', 1)
+    def test_responses_chunked(self):
+        SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=self.survey,
+            submitted='2030-01-02T00:00Z',
+        )
+
+        job = self.run_job(
+            kind=ExportJob.KIND_RESPONSES,
+            survey=self.survey,
+            format=ExportJob.FORMAT_CSV,
+        )
+
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(len(self.read_csv(job)), 3)
+
+    def test_invitations(self):
+        assign_role(self.user, 'manager')
+        InvitationFactory.create(grantor=self.user.organisation, grantee_email='a@b.com')
+        InvitationFactory.create()
+
+        job = self.run_job(kind=ExportJob.KIND_INVITATIONS, format=ExportJob.FORMAT_CSV)
+
+        rows = self.read_csv(job)
+        self.assertEqual(len(rows), 2)
+        self.assertIn('a@b.com', rows[1])
+
+    def test_not_queued(self):
+        job = ExportJob.objects.create(
+            user=self.user,
+            kind=ExportJob.KIND_RESPONSES,
+            survey=self.survey,
+            status=ExportJob.STATUS_DONE,
+        )
+        tasks.run_export_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertFalse(job.file)
+
+    @patch.object(tasks, 'write_export')
+    def test_already_running(self, write_export):
+        """A job claimed by another worker isn't run again."""
+        job = ExportJob.objects.create(
+            user=self.user,
+            kind=ExportJob.KIND_RESPONSES,
+            survey=self.survey,
+            status=ExportJob.STATUS_RUNNING,
+        )
+        tasks.run_export_job(job.pk)
+
+        write_export.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_RUNNING)
+
+    @patch.object(tasks, 'write_export', side_effect=ValueError('Broken'))
+    def test_failed(self, write_export):
+        job = ExportJob.objects.create(
+            user=self.user,
+            kind=ExportJob.KIND_RESPONSES,
+            survey=self.survey,
+        )
+        with self.assertRaises(ValueError):
+            tasks.run_export_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+        self.assertEqual(job.error, 'Broken')
@@ -20,6 +20,14 @@ class TestSurveyURLs(URLTestCase):
             url_kwargs={'pk': 1, 'section': 2},
         )
 
+    def test_survey_section_level(self):
+        self.assert_url_matches_view(
+            view=views.SurveySectionLevelView,
+            expected_url='/survey/1/2/level/3',
+            url_name='survey-section-level',
+            url_kwargs={'pk': 1, 'section': 2, 'level': 3},
+        )
+
     def test_survey_section_start(self):
         self.assert_url_matches_view(
             view=views.SurveySectionView,
@@ -52,6 +60,37 @@ class TestSurveyURLs(URLTestCase):
             url_kwargs={'pk': 1},
         )
 
+    def test_survey_response_export(self):
+        self.assert_url_matches_view(
+            view=views.ExportSurveyResponseView,
+            expected_url='/survey/1/export',
+            url_name='survey-response-export',
+            url_kwargs={'pk': 1},
+        )
+
+    def test_survey_responses_export(self):
+        self.assert_url_matches_view(
+            view=views.ExportSurveyResponsesView,
+            expected_url='/survey/export/1/responses',
+            url_name='survey-responses-export',
+            url_kwargs={'pk': 1},
+        )
+
+    def test_export_job_create(self):
+        self.assert_url_matches_view(
+            view=views.ExportJobCreateView,
+            expected_url='/survey/exports',
+            url_name='export-job-create',
+        )
+
+    def test_export_job_status(self):
+        self.assert_url_matches_view(
+            view=views.ExportJobStatusView,
+            expected_url='/survey/exports/1',
+            url_name='export-job-status',
+            url_kwargs={'pk': 1},
+        )
+
     def test_survey_invite(self):
         self.assert_url_matches_view(
             view=views.InviteListView,
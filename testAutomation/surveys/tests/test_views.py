@@ -1,8 +1,8 @@
+import json
 from datetime import date
 
 from unittest.mock import patch
 
-from django.core import mail
 from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.utils import timezone
@@ -11,6 +11,7 @@ from rolepermissions.roles import assign_role
 
 from core.tests.utils import AnonymouseTestMixin, RequestTestCase
 from documents.models import Document
+from subscriptions.entitlements import get_entitlement
 from subscriptions.models import Order
 from subscriptions.tests.factories import (
     AssessmentPurchaseFactory,
@@ -28,8 +29,14 @@ from .factories import (
     SurveyResponseFactory,
     SurveySectionFactory,
 )
-from .. import views
-from ..models import SurveyAnswer, SurveyAnswerDocument, SurveyResponse
+from .. import snapshots, views
+from ..models import (
+    ExportJob,
+    SurveyAnswer,
+    SurveyAnswerDocument,
+    SurveyResponse,
+    SurveyResponseProgress,
+)
 
 
 class BlankView(views.SurveyViewMixin, View):
@@ -108,6 +115,33 @@ class TestSurveyStartView(AnonymouseTestMixin, RequestTestCase):
         )
         self.assertEqual(response.url, expected_url)
 
+    def test_get_level(self):
+        """The first section with questions for the tier is started with."""
+        SurveyQuestionFactory.create(
+            survey=self.survey,
+            level=2,
+            section__area__number=1,
+        )
+        question = SurveyQuestionFactory.create(
+            survey=self.survey,
+            level=1,
+            section__area__number=2,
+        )
+        view = self.view.as_view()
+
+        request = self.create_request()
+        response = view(request, pk=self.survey.pk)
+
+        survey_response = SurveyResponse.objects.get(
+            organisation=request.user.organisation,
+            survey=self.survey,
+        )
+        expected_url = reverse(
+            'survey-section',
+            kwargs={'pk': survey_response.pk, 'section': question.section.pk},
+        )
+        self.assertEqual(response.url, expected_url)
+
     def test_get_anonymous(self):
         view = self.view.as_view()
         request = self.create_request(auth=False)
@@ -166,6 +200,25 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context_data['section'], self.section)
 
+    def test_query_budget(self):
+        answer = SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=self.question,
+        )
+        SurveyAnswerDocumentFactory.create_batch(2, answer=answer)
+        request = self.create_request(user=self.user)
+        # The structure of the survey and the entitlement are cached between requests.
+        self.survey.get_structure()
+        get_entitlement(self.user.organisation_id)
+
+        response = self.assertWithinQueryBudget(
+            self.view.as_view(),
+            request,
+            pk=self.survey_response.pk,
+            section=self.section.pk,
+        )
+        self.assertEqual(response.status_code, 200)
+
     def test_get_anonymous(self):
         view = self.view.as_view()
         request = self.create_request(auth=False)
@@ -234,12 +287,35 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(context['summary_url'], summary_url)
         self.assertEqual(context['next_url'], next_url)
 
+    def test_get_context_data_level(self):
+        """Next and previous skip sections with no questions for the tier."""
+        section_2 = SurveySectionFactory.create(number=2, area=self.area)
+        SurveyQuestionFactory.create(survey=self.survey, level=2, section=section_2)
+        section_3 = SurveySectionFactory.create(number=3, area=self.area)
+        SurveyQuestionFactory.create(survey=self.survey, level=1, section=section_3)
+
+        view = self.view()
+        view.survey = self.survey
+        view.level = 1
+        view.section = self.section
+        view.object = self.survey_response
+        view.questions = self.survey.questions.all()
+        view.request = self.create_request()
+        context = view.get_context_data()
+
+        next_url = reverse('survey-section', kwargs={
+            'pk': self.survey_response.pk,
+            'section': section_3.pk,
+        })
+        self.assertIsNone(context['previous_url'])
+        self.assertEqual(context['next_url'], next_url)
+
     def test_progress_cached(self):
         view = self.view()
         view.object = self.survey_response
         expected = self.survey_response.get_progress()
 
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(1):
             self.assertEqual(view.progress, expected)
         with self.assertNumQueries(0):
             self.assertEqual(view.progress, expected)
@@ -310,41 +386,53 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(view.get_summary_url(), expected)
 
     def test_get_levels(self):
+        SurveyQuestionFactory.create(survey=self.survey, level=2, section=self.section)
         view = self.view()
+        view.survey = self.survey
+        view.section = self.section
         view.object = view.survey_response = self.survey_response
         view.questions = [self.question]
         view.answers_lookup = {}
 
-        levels = list(view.get_levels())
+        levels = view.get_levels()
 
         self.assertEqual(len(levels), 4)
 
         for level in levels:
-            level['forms'] = list(level.pop('forms'))
+            if level['forms'] is not None:
+                level['forms'] = list(level.pop('forms'))
 
         expected = [
             {
                 'hide': False,
                 'level': 1,
                 'label': 'Bronze',
+                'url': None,
                 'forms': [levels[0]['forms'][0]],
             },
             {
                 'hide': True,
                 'level': 2,
                 'label': 'Silver',
-                'forms': [],
+                'url': reverse('survey-section-level', kwargs={
+                    'pk': self.survey_response.pk,
+                    'section': self.section.pk,
+                    'level': 2,
+                }),
+                'forms': None,
             },
             {
                 'hide': True,
                 'level': 3,
                 'label': 'Gold',
+                'url': None,
                 'forms': [],
             },
             {
                 'hide': True,
                 'level': 4,
                 'label': 'Platinum',
+                'url': None,
                 'forms': [],
             },
         ]
@@ -375,6 +463,7 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
     def test_get_section(self):
         view = self.view()
         view.survey = self.survey
+        view.level = 1
         view.object = self.survey_response
         view.request = self.create_request(user=self.user)
         view.kwargs = {'section': self.section.pk}
@@ -393,6 +482,7 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
     def test_get_section_first(self):
         view = self.view()
         view.survey = self.survey
+        view.level = 1
         view.object = self.survey_response
         view.request = self.create_request(user=self.user)
         view.kwargs = {}
@@ -415,6 +505,7 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
         )
         view.object = response
         view.survey = response.survey
+        view.level = response.level
         view.request = self.create_request(user=self.user)
         view.kwargs = {}
 
@@ -422,6 +513,89 @@ class TestSurveySectionView(AnonymouseTestMixin, RequestTestCase):
             view.get_section()
 
 
+class TestSurveySectionLevelView(AnonymouseTestMixin, RequestTestCase):
+    view = views.SurveySectionLevelView
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        self.question = SurveyQuestionFactory.create(level=2)
+        self.survey_response = SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=self.question.survey,
+            level=1,
+        )
+        self.answer = SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=self.question,
+        )
+
+    def get_response(self, section, level, user=None):
+        view = self.view.as_view()
+        request = self.create_request_ajax(user=user or self.user)
+        return view(
+            request,
+            pk=self.survey_response.pk,
+            section=section,
+            level=level,
+        )
+
+    def test_get(self):
+        # At another level of the section.
+        SurveyQuestionFactory.create(
+            survey=self.question.survey,
+            level=1,
+            section=self.question.section,
+        )
+
+        response = self.get_response(self.question.section_id, 2)
+
+        self.assertEqual(response.status_code, 200)
+        formset = response.context_data['formset']
+        self.assertEqual(formset['level'], 2)
+        self.assertEqual(formset['label'], 'Silver')
+        form, = formset['forms']
+        self.assertEqual(form.instance, self.answer)
+
+    def test_get_empty(self):
+        response = self.get_response(self.question.section_id, 3)
+        self.assertEqual(response.context_data['formset']['forms'], [])
+
+    def test_get_unknown_level(self):
+        with self.assertRaises(Http404):
+            self.get_response(self.question.section_id, 5)
+
+    def test_get_other_section(self):
+        with self.assertRaises(Http404):
+            self.get_response(SurveySectionFactory.create().pk, 2)
+
+    def test_get_other(self):
+        with self.assertRaises(Http404):
+            self.get_response(self.question.section_id, 2, user=UserFactory.create())
+
+    def test_get_not_ajax(self):
+        view = self.view.as_view()
+        request = self.create_request(user=self.user)
+        with self.assertRaises(Http404):
+            view(
+                request,
+                pk=self.survey_response.pk,
+                section=self.question.section_id,
+                level=2,
+            )
+
+    def test_get_anonymous(self):
+        view = self.view.as_view()
+        request = self.create_request(auth=False)
+        response = view(
+            request,
+            pk=self.survey_response.pk,
+            section=self.question.section_id,
+            level=2,
+        )
+        self.assertRedirectToLogin(response)
+
+
 class TestSurveyAnswerView(AnonymouseTestMixin, RequestTestCase):
     view = views.SurveyAnswerView
 
@@ -562,6 +736,204 @@ class TestSurveyAnswerView(AnonymouseTestMixin, RequestTestCase):
         )
 
 
+class TestSurveyAnswerBulkView(RequestTestCase):
+    view = views.SurveyAnswerBulkView
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = SurveyFactory.create()
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        self.survey_response = SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=self.survey,
+            level=1,
+        )
+        # In one section, so the response has a single progress row.
+        self.question_1, self.question_2 = SurveyQuestionFactory.create_batch(
+            2,
+            survey=self.survey,
+            section=SurveySectionFactory.create(),
+            level=1,
+        )
+        self.options = SurveyQuestionOptionFactory.create_batch(
+            3,
+            question=self.question_1,
+        )
+
+    def post(self, answers):
+        view = self.view.as_view()
+        request = self.create_request(
+            'post',
+            user=self.user,
+            data=json.dumps({'answers': answers}),
+            content_type='application/json',
+        )
+        response = view(request, pk=self.survey_response.pk)
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def test_post_anonymous(self):
+        view = self.view.as_view()
+        request = self.create_request('post', auth=False)
+        response = view(request, pk=self.survey_response.pk)
+        self.assertEqual(response.status_code, 302)
+
+    def test_post_create(self):
+        response, content = self.post([
+            {
+                'question': self.question_1.pk,
+                'value': SurveyAnswer.ANSWER_YES,
+                'options': [option.pk for option in self.options[:2]],
+            },
+            {
+                'question': self.question_2.pk,
+                'value': SurveyAnswer.ANSWER_NO,
+                'explanation': 'Any',
+            },
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content['answers'], {
+            str(self.question_1.pk): {'status': 'created'},
+            str(self.question_2.pk): {'status': 'created'},
+        })
+        self.assertEqual(content['progress']['count'], 2)
+        self.assertEqual(content['progress']['total'], 2)
+
+        answers = self.survey_response.answers.by_question()
+        self.assertEqual(answers[self.question_1.pk].value, SurveyAnswer.ANSWER_YES)
+        self.assertSequenceEqual(
+            answers[self.question_1.pk].options.all(),
+            self.options[:2],
+        )
+        self.assertEqual(answers[self.question_2.pk].explanation, 'Any')
+
+        progress = SurveyResponseProgress.objects.get(response=self.survey_response)
+        self.assertEqual(progress.answer_count, 2)
+        self.assertEqual(progress.yes_count, 1)
+
+    def test_post_update(self):
+        answer = SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=self.question_1,
+            value=SurveyAnswer.ANSWER_YES,
+        )
+        answer.options.add(self.options[0])
+
+        response, content = self.post([{
+            'question': self.question_1.pk,
+            'value': SurveyAnswer.ANSWER_NA,
+            'explanation': 'Any',
+            'options': [self.options[2].pk],
+        }])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content['answers'], {
+            str(self.question_1.pk): {'status': 'updated'},
+        })
+
+        answer.refresh_from_db()
+        self.assertEqual(answer.value, SurveyAnswer.ANSWER_NA)
+        self.assertEqual(answer.explanation, 'Any')
+        self.assertSequenceEqual(answer.options.all(), [self.options[2]])
+
+        progress = SurveyResponseProgress.objects.get(response=self.survey_response)
+        self.assertEqual(progress.answer_count, 1)
+        self.assertEqual(progress.yes_count, 0)
+
+    def test_post_invalid(self):
+        """Nothing is saved if any answer is invalid."""
+        other_question = SurveyQuestionFactory.create()
+        response, content = self.post([
+            {
+                'question': self.question_1.pk,
+                'value': SurveyAnswer.ANSWER_YES,
+            },
+            {
+                'question': self.question_2.pk,
+                'value': SurveyAnswer.ANSWER_PROGRESS,
+            },
+            {
+                'question': other_question.pk,
+                'value': SurveyAnswer.ANSWER_YES,
+            },
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(content['answers']),
+            {str(self.question_2.pk), str(other_question.pk)},
+        )
+        errors = content['answers'][str(self.question_2.pk)]['errors']
+        self.assertIn('explanation', errors)
+        self.assertIn('due_date', errors)
+        self.assertIn('question', content['answers'][str(other_question.pk)]['errors'])
+        self.assertFalse(self.survey_response.answers.exists())
+
+    def test_post_document_required(self):
+        self.question_1.upload_type = 'policy'
+        self.question_1.save()
+
+        response, content = self.post([{
+            'question': self.question_1.pk,
+            'value': SurveyAnswer.ANSWER_YES,
+        }])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('value', content['answers'][str(self.question_1.pk)]['errors'])
+
+    def test_post_bad_json(self):
+        view = self.view.as_view()
+        request = self.create_request(
+            'post',
+            user=self.user,
+            data='answers',
+            content_type='application/json',
+        )
+        response = view(request, pk=self.survey_response.pk)
+        self.assertEqual(response.status_code, 400)
+
+    def test_num_queries(self):
+        answers = [
+            {'question': question.pk, 'value': SurveyAnswer.ANSWER_NA, 'explanation': 'x'}
+            for question in SurveyQuestionFactory.create_batch(10, survey=self.survey)
+        ]
+        self.survey.get_structure()
+
+        # Select the response and the existing answers, then inside a savepoint
+        # create the answers and rebuild the progress counts (4 queries), then select
+        # the progress totals.
+        with self.assertNumQueries(10):
+            response, content = self.post(answers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_num_queries_update(self):
+        questions = SurveyQuestionFactory.create_batch(10, survey=self.survey)
+        for question in questions:
+            SurveyAnswerFactory.create(
+                response=self.survey_response,
+                question=question,
+                value=SurveyAnswer.ANSWER_YES,
+            )
+        answers = [
+            {'question': question.pk, 'value': SurveyAnswer.ANSWER_NA, 'explanation': 'x'}
+            for question in questions
+        ]
+        self.survey.get_structure()
+
+        # As above, but the answers are updated with one query and their options
+        # cleared with another. Their response isn't loaded again.
+        with self.assertNumQueries(11):
+            response, content = self.post(answers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(result['status'] for result in content['answers'].values()),
+            {'updated'},
+        )
+
+
 class TestSurveyAnswerDocumentDelete(AnonymouseTestMixin, RequestTestCase):
     view = views.SurveyAnswerDocumentDelete
 
@@ -1177,16 +1549,21 @@ class TestSurveyFullReport(AnonymouseTestMixin, RequestTestCase):
         context = view.get_context_data()
 
         expected = self.survey_response.get_level_compliance()
-        compliance = expected['compliance']
-        compliance['sections'][0]['questions'] = [self.question]
-
-        self.assertEqual(context['progress'], expected['progress'])
-        self.assertEqual(context['compliance'], compliance)
+        self.assertEqual(
+            context['progress']['percentage'],
+            expected['progress']['percentage'],
+        )
+        self.assertEqual(
+            context['compliance']['percentage'],
+            expected['compliance']['percentage'],
+        )
         self.assertEqual(len(context['compliance']['sections']), 1)
         step = context['compliance']['sections'][0]
-        self.assertSequenceEqual(step['questions'], [self.question])
-        question = step['questions'][0]
-        self.assertEqual(question.answer, self.answer)
+        self.assertEqual(step['section']['code'], self.section.get_code())
+        question, = step['questions']
+        self.assertEqual(question['code'], self.question.get_code())
+        self.assertEqual(question['answer']['value'], self.answer.value)
+        self.assertEqual(len(question['answer']['documents']), 3)
 
     def test_get_num_queries(self):
         other = SurveyAnswerFactory.create(
@@ -1205,6 +1582,8 @@ class TestSurveyFullReport(AnonymouseTestMixin, RequestTestCase):
         view = self.view.as_view()
         request = self.create_request(user=self.user)
 
+        # The entitlement of the organisation is cached between requests.
+        get_entitlement(self.user.organisation_id)
         """
         SELECT DISTINCT
           FROM "surveys_surveyresponse"
@@ -1230,43 +1609,18 @@ class TestSurveyFullReport(AnonymouseTestMixin, RequestTestCase):
                 )
           ORDER BY "auth_group"."name" ASC
 
-        SELECT DISTINCT
-          FROM "surveys_surveysection"
+        SELECT
+          FROM "surveys_surveyresponseprogress"
          INNER
-          JOIN "surveys_surveyquestion"
-            ON ("surveys_surveysection"."id" =  "surveys_surveyquestion"."section_id")
+          JOIN "surveys_surveysection"
+            ON ("surveys_surveyresponseprogress"."section_id" =
+                "surveys_surveysection"."id")
          INNER
           JOIN "surveys_surveyarea"
             ON ("surveys_surveysection"."area_id" =  "surveys_surveyarea"."id")
-         WHERE "surveys_surveyquestion"."survey_id" =  388
-         ORDER BY "surveys_surveyarea"."number" ASC, "surveys_surveysection"."number" ASC
-        SELECT COUNT("surveys_surveyquestion"."id") AS "total",
-            SUM(
-                CASE WHEN "surveys_surveyquestion"."section_id" =  622 THEN 1 ELSE 0 END
-            ) AS "622"
-          FROM "surveys_surveyquestion"
-         WHERE (
-                   "surveys_surveyquestion"."survey_id" =  388
-           AND "surveys_surveyquestion"."level" <=  1
-               )
-        SELECT COUNT("surveys_surveyanswer"."id") AS "total",
-            SUM(
-                   CASE WHEN (
-                       "surveys_surveyanswer"."value" =  'yes'
-               AND "surveys_surveyquestion"."section_id" =  622
-               ) THEN 1 ELSE 0 END
-            ) AS "622",
-            SUM(
-                CASE WHEN "surveys_surveyanswer"."value" =  'yes' THEN 1 ELSE 0 END
-            ) AS "compliance_total"
-          FROM "surveys_surveyanswer"
-         INNER
-          JOIN "surveys_surveyquestion"
-            ON ("surveys_surveyanswer"."question_id" =  "surveys_surveyquestion"."id")
-         WHERE (
-                   "surveys_surveyanswer"."response_id" =  438
-           AND "surveys_surveyquestion"."level" <=  1
-               )
+         WHERE "surveys_surveyresponseprogress"."response_id" =  438
+         ORDER BY "surveys_surveyarea"."number" ASC, "surveys_surveysection"."number" ASC,
+               "surveys_surveyresponseprogress"."level" ASC
         SELECT
           FROM "surveys_surveyanswer"
          INNER
@@ -1313,19 +1667,40 @@ class TestSurveyFullReport(AnonymouseTestMixin, RequestTestCase):
            AND "page_page"."_cached_url" IN ('/')
                )
          ORDER BY "_url_length" DESC LIMIT 1
-        SELECT
-            FROM "subscriptions_subscription"
-        INNER JOIN "subscriptions_order"
-        ON ("subscriptions_subscription"."order_id" = "subscriptions_order"."id")
-        WHERE ("subscriptions_order"."organisation_id" = 167911
-        AND NOT ("subscriptions_order"."status" = 'canceled'))
-        ORDER BY "subscriptions_subscription"."start_date" DESC LIMIT 1
         """
-        with self.assertNumQueries(12):
+        with self.assertNumQueries(9):
             response = view(request, pk=self.survey_response.pk)
             response.render()
         self.assertEqual(response.status_code, 200)
 
+    def test_get_num_queries_snapshotted(self):
+        self.survey_response.submitted = timezone.now()
+        self.survey_response.snapshot = snapshots.build_snapshot(self.survey_response)
+        self.survey_response.save()
+
+        view = self.view.as_view()
+        request = self.create_request(user=self.user)
+
+        get_entitlement(self.user.organisation_id)
+        """
+        The response, the roles of the user and the page as above. The report is read
+        from the snapshot of the response.
+        """
+        with self.assertNumQueries(3):
+            response = view(request, pk=self.survey_response.pk)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_budget(self):
+        request = self.create_request(user=self.user)
+        get_entitlement(self.user.organisation_id)
+        response = self.assertWithinQueryBudget(
+            self.view.as_view(),
+            request,
+            pk=self.survey_response.pk,
+        )
+        self.assertEqual(response.status_code, 200)
+
     def test_post(self):
         survey_response = self.survey_response
         view = self.view.as_view()
@@ -1476,6 +1851,7 @@ class TestSubmitSurveyResponse(AnonymouseTestMixin, RequestTestCase):
 
         self.survey_response.refresh_from_db()
         self.assertEqual(self.survey_response.submitted, now)
+        self.assertTrue(snapshots.is_current(self.survey_response))
 
     def test_post_with_invitation(self):
         invitation = InvitationFactory.create(
@@ -1926,7 +2302,9 @@ class TestCreateInviteView(AnonymouseTestMixin, RequestTestCase):
             'Invitation failed, please correct the form',
         )
 
-    def test_post_with_email_with_active_subscription_with_invites(self):
+    @patch('surveys.views.transaction.on_commit', lambda func: func())
+    @patch('surveys.views.send_invitation_emails.delay')
+    def test_post_with_email_with_active_subscription_with_invites(self, delay):
         """User can only create invites with active subscription and with purchase"""
         user = UserFactory.create()
         assign_role(user, 'admin')
@@ -1965,6 +2343,7 @@ class TestCreateInviteView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(invitation.grantor, grantor)
         self.assertEqual(invitation.survey, self.survey)
         self.assertEqual(invitation.level, 1)
+        delay.assert_called_once_with(invitation.pk, False)
 
     def test_post_with_organisation_without_active_subscription(self):
         user = UserFactory.create()
@@ -2034,7 +2413,9 @@ class TestCreateInviteView(AnonymouseTestMixin, RequestTestCase):
             'Invitation failed, please correct the form',
         )
 
-    def test_post_with_organisation_with_active_subscription_with_invites(self):
+    @patch('surveys.views.transaction.on_commit', lambda func: func())
+    @patch('surveys.views.send_invitation_emails.delay')
+    def test_post_with_organisation_with_active_subscription_with_invites(self, delay):
         """User can only create invites with active subscription and with purchase"""
         user = UserFactory.create()
         assign_role(user, 'admin')
@@ -2074,12 +2455,11 @@ class TestCreateInviteView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(invitation.survey, self.survey)
         self.assertEqual(invitation.level, 1)
 
-        self.assertEqual(len(mail.outbox), 1)
-        subject = 'Invitation to submit assessment'
-        self.assertEqual(mail.outbox[0].subject, subject)
-        self.assertIn(grantee_admin.email, mail.outbox[0].to)
+        delay.assert_called_once_with(invitation.pk, True)
 
-    def test_post_with_organisation_due_date(self):
+    @patch('surveys.views.transaction.on_commit', lambda func: func())
+    @patch('surveys.views.send_invitation_emails.delay')
+    def test_post_with_organisation_due_date(self, delay):
         user = UserFactory.create()
         assign_role(user, 'admin')
 
@@ -2121,10 +2501,7 @@ class TestCreateInviteView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(invitation.level, 1)
         self.assertEqual(invitation.due_date,  date(2020, 1, 14))
 
-        self.assertEqual(len(mail.outbox), 1)
-        subject = 'Invitation to submit assessment'
-        self.assertEqual(mail.outbox[0].subject, subject)
-        self.assertIn(grantee_admin.email, mail.outbox[0].to)
+        delay.assert_called_once_with(invitation.pk, True)
 
     def test_post_error(self):
         user = UserFactory.create()
@@ -2216,7 +2593,9 @@ class TestInviteAcceptView(AnonymouseTestMixin, RequestTestCase):
         self.invite.refresh_from_db()
         self.assertFalse(self.invite.accepted)
 
-    def test_post_admin(self):
+    @patch('surveys.views.transaction.on_commit', lambda func: func())
+    @patch('surveys.views.send_invitation_emails.delay')
+    def test_post_admin(self, delay):
         view = self.view.as_view()
         user = UserFactory.create(organisation=self.invite.grantee)
         assign_role(user, 'admin')
@@ -2343,7 +2722,9 @@ class TestResendInviteView(AnonymouseTestMixin, RequestTestCase):
         response = view(request, pk=self.invite.pk)
         self.assertEqual(response.status_code, 405)
 
-    def test_post_admin(self):
+    @patch('surveys.views.transaction.on_commit', lambda func: func())
+    @patch('surveys.views.send_invitation_emails.delay')
+    def test_post_admin(self, delay):
         view = self.view.as_view()
         user = UserFactory.create(organisation=self.invite.grantee)
         assign_role(user, 'admin')
@@ -2355,7 +2736,7 @@ class TestResendInviteView(AnonymouseTestMixin, RequestTestCase):
         self.assertEqual(response.url, expected_url)
         last_sent = self.invite.last_sent
 
-        self.assertEqual(len(mail.outbox), 1)
+        delay.assert_called_once_with(self.invite.pk)
         self.invite.refresh_from_db()
         self.assertTrue(self.invite.last_sent > last_sent)
 
@@ -2764,3 +3145,255 @@ class TestViewAssessmentList(AnonymouseTestMixin, RequestTestCase):
         context = view.get_context_data()
         is_paginated = context['is_paginated']
         self.assertEqual(is_paginated, True)
+
+
+class TestExportSurveyResponseView(AnonymouseTestMixin, RequestTestCase):
+    view = views.ExportSurveyResponseView
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        assign_role(self.user, 'user')
+        question = SurveyQuestionFactory.create(level=1)
+        self.survey_response = SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=question.survey,
+            level=1,
+        )
+        SurveyAnswerFactory.create(
+            response=self.survey_response,
+            question=question,
+            value=SurveyAnswer.ANSWER_NO,
+            explanation='Not yet',
+        )
+
+    def create_grantor(self, accepted=True):
+        grantor_user = UserFactory.create()
+        assign_role(grantor_user, 'manager')
+        InvitationFactory.create(
+            survey=self.survey_response.survey,
+            grantee=self.survey_response.organisation,
+            accepted=accepted,
+            grantor=grantor_user.organisation,
+        )
+        self.survey_response.submitted = timezone.now()
+        self.survey_response.save()
+        return grantor_user
+
+    def test_get_csv(self):
+        view = self.view.as_view()
+        request = self.create_request(user=self.user, data={'format': 'csv'})
+        response = view(request, pk=self.survey_response.pk)
+
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('Not yet', content)
+
+    def test_get_unknown_format(self):
+        view = self.view.as_view()
+        request = self.create_request(user=self.user, data={'format': 'pdf'})
+        with self.assertRaises(Http404):
+            view(request, pk=self.survey_response.pk)
+
+    def test_get_other(self):
+        other_user = UserFactory.create()
+        assign_role(other_user, 'admin')
+        view = self.view.as_view()
+        request = self.create_request(user=other_user)
+        with self.assertRaises(Http404):
+            view(request, pk=self.survey_response.pk)
+
+    def test_get_grantor(self):
+        grantor_user = self.create_grantor()
+        view = self.view.as_view()
+        request = self.create_request(user=grantor_user, data={'format': 'csv'})
+        response = view(request, pk=self.survey_response.pk)
+
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('Not yet', content)
+
+    def test_get_grantor_not_accepted(self):
+        grantor_user = self.create_grantor(accepted=False)
+        view = self.view.as_view()
+        request = self.create_request(user=grantor_user)
+        with self.assertRaises(Http404):
+            view(request, pk=self.survey_response.pk)
+
+    def test_get_without_role(self):
+        user = UserFactory.create(organisation=self.user.organisation)
+        view = self.view.as_view()
+        request = self.create_request(user=user)
+        response = view(request, pk=self.survey_response.pk)
+        self.assertRedirectToLogin(response)
+
+    def test_get_anonymous(self):
+        view = self.view.as_view()
+        request = self.create_request(auth=False)
+        response = view(request, pk=self.survey_response.pk)
+        self.assertRedirectToLogin(response)
+
+
+class TestExportSurveyResponsesView(AnonymouseTestMixin, RequestTestCase):
+    view = views.ExportSurveyResponsesView
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        assign_role(self.user, 'manager')
+        question = SurveyQuestionFactory.create(level=1)
+        self.survey = question.survey
+        self.own_response = SurveyResponseFactory.create(
+            organisation=self.user.organisation,
+            survey=self.survey,
+            level=1,
+        )
+        SurveyAnswerFactory.create(
+            response=self.own_response,
+            question=question,
+            value=SurveyAnswer.ANSWER_NO,
+            explanation='Own answer',
+        )
+        self.other_response = SurveyResponseFactory.create(
+            survey=self.survey,
+            level=1,
+            submitted=timezone.now(),
+        )
+        SurveyAnswerFactory.create(
+            response=self.other_response,
+            question=question,
+            value=SurveyAnswer.ANSWER_YES,
+            explanation='Other answer',
+        )
+
+    def get_content(self, user):
+        view = self.view.as_view()
+        request = self.create_request(user=user, data={'format': 'csv'})
+        response = view(request, pk=self.survey.pk)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_get_own_only(self):
+        content = self.get_content(self.user)
+        self.assertIn('Own answer', content)
+        self.assertNotIn('Other answer', content)
+
+    def test_get_grantor(self):
+        InvitationFactory.create(
+            survey=self.survey,
+            grantee=self.other_response.organisation,
+            accepted=True,
+            grantor=self.user.organisation,
+        )
+        content = self.get_content(self.user)
+        self.assertIn('Own answer', content)
+        self.assertIn('Other answer', content)
+
+    def test_get_grantor_not_accepted(self):
+        InvitationFactory.create(
+            survey=self.survey,
+            grantee=self.other_response.organisation,
+            accepted=False,
+            grantor=self.user.organisation,
+        )
+        content = self.get_content(self.user)
+        self.assertNotIn('Other answer', content)
+
+    def test_get_without_role(self):
+        user = UserFactory.create(organisation=self.user.organisation)
+        view = self.view.as_view()
+        request = self.create_request(user=user)
+        response = view(request, pk=self.survey.pk)
+        self.assertRedirectToLogin(response)
+
+    def test_get_anonymous(self):
+        view = self.view.as_view()
+        request = self.create_request(auth=False)
+        response = view(request, pk=self.survey.pk)
+        self.assertRedirectToLogin(response)
+
+
+class TestExportJobCreateView(RequestTestCase):
+    view = views.ExportJobCreateView
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        self.survey = SurveyFactory.create()
+
+    @patch('surveys.views.transaction.on_commit', lambda func: func())
+    @patch('surveys.views.run_export_job.delay')
+    def test_post(self, delay):
+        view = self.view.as_view()
+        data = {
+            'kind': ExportJob.KIND_RESPONSES,
+            'survey': self.survey.pk,
+            'format': ExportJob.FORMAT_CSV,
+        }
+        request = self.create_request('post', user=self.user, data=data)
+        response = view(request)
+
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.user, self.user)
+        self.assertEqual(job.status, ExportJob.STATUS_QUEUED)
+        self.assertEqual(
+            json.loads(response.content.decode('utf-8'))['status_url'],
+            job.get_status_url(),
+        )
+        delay.assert_called_once_with(job.pk)
+
+    @patch('surveys.views.run_export_job.delay')
+    def test_post_responses_without_survey(self, delay):
+        view = self.view.as_view()
+        data = {'kind': ExportJob.KIND_RESPONSES}
+        request = self.create_request('post', user=self.user, data=data)
+        response = view(request)
+
+        self.assertEqual(response.status_code, 400)
+        errors = json.loads(response.content.decode('utf-8'))['errors']
+        self.assertIn('survey', errors)
+        self.assertFalse(ExportJob.objects.exists())
+        delay.assert_not_called()
+
+    @patch('surveys.views.run_export_job.delay')
+    def test_post_invitations_user_role(self, delay):
+        assign_role(self.user, 'user')
+        view = self.view.as_view()
+        data = {'kind': ExportJob.KIND_INVITATIONS}
+        request = self.create_request('post', user=self.user, data=data)
+        response = view(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+
+class TestExportJobStatusView(RequestTestCase):
+    view = views.ExportJobStatusView
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory.create()
+        self.job = ExportJob.objects.create(
+            user=self.user,
+            kind=ExportJob.KIND_INVITATIONS,
+            status=ExportJob.STATUS_RUNNING,
+            progress=40,
+        )
+
+    def test_get(self):
+        view = self.view.as_view()
+        request = self.create_request(user=self.user)
+        response = view(request, pk=self.job.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content.decode('utf-8')),
+            {'status': 'running', 'progress': 40, 'url': None, 'error': ''},
+        )
+
+    def test_get_other_user(self):
+        view = self.view.as_view()
+        request = self.create_request()
+        with self.assertRaises(Http404):
+            view(request, pk=self.job.pk)
@@ -15,6 +15,11 @@ urlpatterns = [
             views.SurveySectionView.as_view(),
             name='survey-section',
         ),
+        url(
+            r'^(?P<section>\d+)/level/(?P<level>\d+)/?$',
+            views.SurveySectionLevelView.as_view(),
+            name='survey-section-level',
+        ),
         url(
             r'^start/?$',
             views.SurveySectionView.as_view(),
@@ -25,6 +30,11 @@ urlpatterns = [
             views.SurveyAnswerView.as_view(),
             name='survey-answer'
         ),
+        url(
+            r'^answers/?$',
+            views.SurveyAnswerBulkView.as_view(),
+            name='survey-answer-bulk',
+        ),
         url(
             r'^progress/?$',
             views.SurveyProgresssReport.as_view(),
@@ -45,6 +55,11 @@ urlpatterns = [
             views.SubmitSurveyResponse.as_view(),
             name='survey-submit',
         ),
+        url(
+            r'^export/?$',
+            views.ExportSurveyResponseView.as_view(),
+            name='survey-response-export',
+        ),
     ])),
     url(
         r'^invite/?$',
@@ -86,4 +101,19 @@ urlpatterns = [
         views.ExportSurveyQuestionView.as_view(),
         name='survey-export',
     ),
+    url(
+        r'^export/(?P<pk>\d+)/responses/?$',
+        views.ExportSurveyResponsesView.as_view(),
+        name='survey-responses-export',
+    ),
+    url(
+        r'^exports/?$',
+        views.ExportJobCreateView.as_view(),
+        name='export-job-create',
+    ),
+    url(
+        r'^exports/(?P<pk>\d+)/?$',
+        views.ExportJobStatusView.as_view(),
+        name='export-job-status',
+    ),
 ]
@@ -1,30 +1,35 @@
-import xlwt
+import json
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.urlresolvers import reverse, reverse_lazy
-from django.db.models import OuterRef, Prefetch, Q, Subquery
-from django.http import Http404, HttpResponse
+from django.db import transaction
+from django.db.models import Count
+from django.http import Http404, JsonResponse
 from django.http.response import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, redirect
 from django.utils import timezone
 from django.utils.functional import cached_property
-from django.utils.html import strip_tags
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import CreateView, ListView, TemplateView, View
 from django.views.generic import DeleteView, RedirectView, UpdateView
-from rolepermissions.checkers import has_role
 
 from core.mixins import AjaxMixin, AppMixin, PaginationMixin
 from users.models import Invitation as InvitationModel
+from users.roles import has_role
+from users.tasks import send_invitation_emails
 
+from .exports import EXPORT_RESPONSES, survey_question_rows, survey_response_rows
 from .forms import (
+    ExportJobForm,
     InvitationForm,
     SubmitForm,
+    SurveyAnswerBulkForm,
     SurveyAnswerForm,
     SurveyLevelForm,
 )
 from .models import (
+    ExportJob,
     get_level_name,
     LEVEL_CHOICES,
     Survey,
@@ -32,8 +37,9 @@ from .models import (
     SurveyAnswerDocument,
     SurveyQuestion,
     SurveyResponse,
-    SurveySection,
 )
+from .reports import get_full_report
+from .tasks import run_export_job
 
 
 class SurveyViewMixin:
@@ -96,7 +102,11 @@ class SurveyStartView(LoginRequiredMixin, RedirectView):
         return super().get(request, *args, **kwargs)
 
     def get_redirect_url(self, *args, **kwargs):
-        first_section = SurveyQuestion.objects.next_section(self.survey)
+        structure = self.survey.get_structure()
+        first_section = (
+            structure.first_section(self.survey_response.level) or
+            structure.first_section()
+        )
         if not first_section:
             raise Http404('No Section found')
         return reverse('survey-section', kwargs={
@@ -113,6 +123,25 @@ class SurveyAnswerFormMixin(SurveyViewMixin):
             'response': self.survey_response,
         }
 
+    def get_section_questions(self, section):
+        return SurveyQuestion.objects.for_section(
+            survey=self.survey,
+            section=section,
+        ).select_related(
+            'section__area',
+        ).prefetch_related(
+            'options',
+        )
+
+    def get_section_answers(self, section):
+        return SurveyAnswer.objects.filter(
+            response=self.survey_response,
+            question__section=section,
+        ).prefetch_related(
+            'options',
+            'documents__document',
+        )
+
 
 class SurveySectionView(
     LoginRequiredMixin,
@@ -123,23 +152,22 @@ class SurveySectionView(
     template_name = 'surveys/section.html'
     model = SurveyResponse
     form_class = SurveyLevelForm
+    query_budget = 12
 
     def get_section(self):
+        structure = self.survey.get_structure()
         try:
-            section_id = self.kwargs['section']
+            section_id = int(self.kwargs['section'])
         except KeyError:
-            first_question = SurveyQuestion.objects.filter(
-                survey=self.survey,
-            ).select_related(
-                'section__area',
-            ).first()
-            if first_question is None:
-                raise Http404('No SurveySection found')
+            section_id = (
+                structure.first_section(self.level) or
+                structure.first_section()
+            )
 
-            return first_question.section
-        else:
-            qs = SurveySection.objects.select_related('area')
-            return get_object_or_404(qs, pk=section_id)
+        section = structure.get_section(section_id)
+        if section is None:
+            raise Http404('No SurveySection found')
+        return section
 
     def get_success_url(self):
         return reverse('survey-section', kwargs={
@@ -153,22 +181,12 @@ class SurveySectionView(
         but before we need to use it. We need them on both GET and POST.
         """
         self.section = self.get_section()
-        self.questions = SurveyQuestion.objects.for_section(
-            survey=self.survey,
-            section=self.section,
-        ).select_related(
-            'section__area',
-        ).prefetch_related(
-            'options',
+        # The forms of the levels above the response's are loaded when they're shown.
+        self.questions = self.get_section_questions(self.section).filter(
+            level__lte=self.level,
         )
-        self.answers = SurveyAnswer.objects.filter(
-            response=self.survey_response,
-        ).prefetch_related(
-            'options',
-            'documents__document',
-        ).order_by(
-            'question__level',
-            'question__question_number',
+        self.answers = self.get_section_answers(self.section).filter(
+            question__level__lte=self.level,
         )
         self.answers_lookup = self.answers.by_question()
         return self.survey_response
@@ -177,10 +195,8 @@ class SurveySectionView(
         return self.object.get_summary_url(self.progress['is_complete'])
 
     def get_next_url(self):
-        section = SurveyQuestion.objects.next_section(
-            self.survey,
-            self.section,
-        )
+        structure = self.survey.get_structure()
+        section = structure.next_section(self.section.pk, self.level)
         if not section:
             return None
 
@@ -190,10 +206,8 @@ class SurveySectionView(
         })
 
     def get_previous_url(self):
-        section = SurveyQuestion.objects.previous_section(
-            self.survey,
-            self.section,
-        )
+        structure = self.survey.get_structure()
+        section = structure.previous_section(self.section.pk, self.level)
         if not section:
             return None
 
@@ -224,15 +238,34 @@ class SurveySectionView(
         )
 
     def get_levels(self):
-        return (
-            {
+        """
+        Return each level with the answer forms of its questions in the section.
+
+        Forms are only built for the levels that are shown. Hidden levels with
+        questions have the `url` of their forms instead (see `SurveySectionLevelView`).
+        """
+        section_levels = self.survey.get_structure().get_section_info(
+            self.section.pk,
+        ).levels
+        levels = []
+        for level, label in LEVEL_CHOICES:
+            info = {
                 'level': level,
                 'label': label,
                 'hide': level > self.object.level,
-                'forms': self.get_answer_forms(level)
+                'url': None,
             }
-            for level, label in LEVEL_CHOICES
-        )
+            if info['hide'] and level in section_levels:
+                info['url'] = reverse('survey-section-level', kwargs={
+                    'pk': self.object.pk,
+                    'section': self.section.pk,
+                    'level': level,
+                })
+                info['forms'] = None
+            else:
+                info['forms'] = self.get_answer_forms(level)
+            levels.append(info)
+        return levels
 
     def get_context_data(self, **kwargs):
         kwargs.update(
@@ -246,6 +279,39 @@ class SurveySectionView(
         return super().get_context_data(**kwargs)
 
 
+class SurveySectionLevelView(
+    AjaxMixin,
+    LoginRequiredMixin,
+    SurveyAnswerFormMixin,
+    TemplateView,
+):
+    """The answer forms of a level of a section, for the section to load when shown."""
+    template_name = 'surveys/_section_level.html'
+
+    def get_context_data(self, **kwargs):
+        section = self.survey.get_structure().get_section(int(kwargs['section']))
+        level = int(kwargs['level'])
+        if section is None or level not in dict(LEVEL_CHOICES):
+            raise Http404('No SurveySection found')
+
+        questions = self.get_section_questions(section).filter(level=level)
+        answers_lookup = self.get_section_answers(section).filter(
+            question__level=level,
+        ).by_question()
+        kwargs.update(formset={
+            'level': level,
+            'label': get_level_name(level),
+            'forms': [
+                SurveyAnswerForm(
+                    instance=answers_lookup.get(question.pk),
+                    **self.get_answer_form_kwargs(question)
+                )
+                for question in questions
+            ],
+        })
+        return super().get_context_data(**kwargs)
+
+
 class SurveyAnswerView(
     AjaxMixin,
     LoginRequiredMixin,
@@ -298,6 +364,95 @@ class SurveyAnswerView(
             return None
 
 
+class SurveyAnswerBulkView(LoginRequiredMixin, SurveyViewMixin, View):
+    """
+    Save many answers of a response in one request.
+
+    Expects a JSON body like `{"answers": [{"question": 1, "value": "no",
+    "explanation": "...", "due_date": "2030-01-31", "options": [2, 3]}]}` and replies
+    with the result of each question, keyed by question pk. Nothing is saved unless
+    every answer is valid.
+    """
+    http_method_names = ['post']
+
+    def get_answers_data(self, request):
+        try:
+            answers = json.loads(request.body.decode('utf-8'))['answers']
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not isinstance(answers, list):
+            return None
+        if not all(isinstance(data, dict) for data in answers):
+            return None
+        return answers
+
+    def get_forms(self, answers_data):
+        """Return a form per answer and the errors of answers with no form."""
+        structure = self.survey.get_structure()
+        questions = {}
+        errors = {}
+        for data in answers_data:
+            try:
+                question = structure.get_question(int(data.get('question')))
+            except (TypeError, ValueError):
+                question = None
+            if question is None:
+                errors[str(data.get('question'))] = {'question': [_('Unknown question')]}
+            elif question.pk in questions:
+                errors[str(question.pk)] = {'question': [_('Answered more than once')]}
+            else:
+                questions[question.pk] = (question, data)
+
+        answers = SurveyAnswer.objects.filter(
+            response=self.survey_response,
+            question_id__in=questions,
+        ).annotate(
+            documents_count=Count('documents'),
+        )
+        answers_lookup = answers.by_question()
+
+        forms = [
+            SurveyAnswerBulkForm(question, answers_lookup.get(question.pk), data=data)
+            for question, data in questions.values()
+        ]
+        return forms, errors
+
+    def post(self, request, *args, **kwargs):
+        answers_data = self.get_answers_data(request)
+        if answers_data is None:
+            return JsonResponse({'error': _('Invalid answers')}, status=400)
+
+        forms, errors = self.get_forms(answers_data)
+        for form in forms:
+            if not form.is_valid():
+                errors[str(form.question.pk)] = {
+                    field: list(field_errors)
+                    for field, field_errors in form.errors.items()
+                }
+
+        if errors:
+            results = {
+                question_id: {'status': 'invalid', 'errors': question_errors}
+                for question_id, question_errors in errors.items()
+            }
+            return JsonResponse({'answers': results}, status=400)
+
+        SurveyAnswer.objects.bulk_save(
+            [form.get_answer(self.survey_response) for form in forms],
+            {form.question.pk: form.cleaned_data['options'] for form in forms},
+        )
+
+        results = {
+            str(form.question.pk): {
+                'status': 'created' if form.answer is None else 'updated',
+            }
+            for form in forms
+        }
+        responses = SurveyResponse.objects.filter(pk=self.survey_response.pk)
+        progress = next(responses.with_progress()).progress
+        return JsonResponse({'answers': results, 'progress': progress})
+
+
 class SurveyAnswerDocumentDelete(
     AjaxMixin,
     LoginRequiredMixin,
@@ -466,33 +621,11 @@ class SurveyFullReport(SurveyReportBase):
     grantee_template_name = 'surveys/full-report.html'
     grantor_template_name = 'surveys/full-report-grantor.html'
     report_name = 'Full'
+    query_budget = 9
 
     def get_survey_queryset(self, user):
-        """
-        Return SurveyResponse objects available to grantee or grantor.
-
-        The grantee user's organisation must match organisation.
-        The  grantor user's organisation must be the grantor of an accepted invitation
-        the same survey that has the survey_responses organisation as the grantee.
-        """
-        queryset = SurveyResponse.objects.filter(
-            survey__questions__isnull=False,
-        ).distinct()
-        invitations = InvitationModel.objects.filter(
-            survey=OuterRef('survey'),
-            grantee=OuterRef('organisation'),
-            accepted=True,
-            grantor_id=user.organisation_id
-        )
-        queryset = queryset.annotate(
-            invitation_id=Subquery(invitations.values('pk')[:1]),
-        ).filter((
-            Q(organisation__pk=user.organisation_id) |
-            Q(
-                submitted__isnull=False,
-                invitation_id__isnull=False,
-            )
-        ))
+        """Return SurveyResponse objects available to grantee or grantor."""
+        queryset = SurveyResponse.objects.viewable_by(user)
         return queryset.select_related('organisation')
 
     def is_owner(self):
@@ -531,42 +664,11 @@ class SurveyFullReport(SurveyReportBase):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        stats = self.object.get_level_compliance()
-        compliance = stats['compliance']
-
-        stats_lookup = {step['section'].pk: step for step in compliance['sections']}
-
-        questions = SurveyQuestion.objects.filter(
-            survey=self.survey,
-            level__lte=self.object.level,
-        ).select_related(
-            'section__area',
-        ).prefetch_related(
-            'options',
-        )
-
-        documents = SurveyAnswerDocument.objects.select_related('document')
-        answers = SurveyAnswer.objects.filter(
-            response=self.object,
-            question__level__lte=self.object.level,
-        ).prefetch_related(
-            'options',
-            Prefetch('documents', queryset=documents),
-        )
-        answers_lookup = answers.by_question()
-        for question in questions:
-            question.answer = answers_lookup.get(question.pk)
-            step = stats_lookup.get(question.section.pk)
-            try:
-                step['questions'].append(question)
-            except KeyError:
-                step['questions'] = [question]
-
+        report = get_full_report(self.object)
         context.update(
-            questions=questions,
-            progress=stats['progress'],
-            compliance=compliance,
+            progress=report['stats']['progress'],
+            compliance=report['stats']['compliance'],
+            report_table=report['table'],
         )
         return context
 
@@ -688,10 +790,11 @@ class CreateInviteView(LoginRequiredMixin, InvitesMixin, UserPassesTestMixin, Cr
     def form_valid(self, form):
         response = super().form_valid(form)
 
-        if form.cleaned_data.get('is_organisation_invite'):
-            self.object.send_invites()
-        else:
-            self.object.send_invites_unregistered()
+        invitation_id = self.object.pk
+        registered = bool(form.cleaned_data.get('is_organisation_invite'))
+        transaction.on_commit(
+            lambda: send_invitation_emails.delay(invitation_id, registered),
+        )
 
         messages.success(self.request, (
             'Invitation sent successfully'
@@ -815,7 +918,7 @@ class ResendInviteView(LoginRequiredMixin, UserPassesTestMixin, View):
 
     def post(self, request, *args, **kwargs):
         invitation = self._get_current_invite(**kwargs)
-        invitation.send_invites()
+        transaction.on_commit(lambda: send_invitation_emails.delay(invitation.pk))
 
         invitation.last_sent = timezone.now()
         invitation.save()
@@ -827,64 +930,111 @@ class ResendInviteView(LoginRequiredMixin, UserPassesTestMixin, View):
         return redirect(reverse('survey-invite'))
 
 
-class ExportSurveyQuestionView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+class ExportMixin:
+    """Stream rows as a download in the format given by the `format` GET parameter."""
+    default_export_format = 'xlsx'
+
+    def export(self, rows, filename):
+        export_format = self.request.GET.get('format', self.default_export_format)
+        try:
+            export_response = EXPORT_RESPONSES[export_format]
+        except KeyError:
+            raise Http404('Unknown export format')
+        return export_response(rows, filename)
+
 
+class ExportSurveyQuestionView(
+    LoginRequiredMixin,
+    UserPassesTestMixin,
+    ExportMixin,
+    View,
+):
     def test_func(self):
         return has_role(self.request.user, ['admin', 'manager', 'user'])
 
-    def _get_survey_questions(self, survey):
-        return SurveyQuestion.objects.filter(survey=survey)
-
     def _get_survey(self, **kwargs):
         pk = kwargs.pop('pk')
         return get_object_or_404(Survey, id=pk)
 
     def get(self, request, *args, **kwargs):
-
         survey = self._get_survey(**kwargs)
+        return self.export(survey_question_rows(survey), survey.name)
 
-        response = HttpResponse(content_type='application/ms-excel')
-        content_disposition = 'attachment; filename="{}.xls"'.format(survey.name)
-        response['Content-Disposition'] = content_disposition
-
-        wb = xlwt.Workbook(encoding='utf-8')
-        ws = wb.add_sheet('Survey')
-
-        row_num = 0
-        sheet_style = xlwt.XFStyle()
-        sheet_style.font.bold = True
-
-        columns = [
-            'Code',
-            'Question',
-            'Upload Required',
-            'Notes',
-            'Answer (yes/no)',
-            'Explanation',
-            'Due Date',
-        ]
 
-        for col_num, column in enumerate(columns):
-            ws.write(row_num, col_num, column, sheet_style)
+class ExportSurveyResponseView(
+    LoginRequiredMixin,
+    UserPassesTestMixin,
+    SurveyViewMixin,
+    ExportMixin,
+    View,
+):
+    """Export a response with its answers."""
+    def test_func(self):
+        return has_role(self.request.user, ['admin', 'manager', 'user'])
 
-        sheet_style = xlwt.XFStyle()
-        sheet_style.alignment.wrap = 1
-        survey_questions = list(self._get_survey_questions(survey))
+    def get_survey_queryset(self, user):
+        return SurveyResponse.objects.viewable_by(user).select_related('organisation')
 
-        for question in survey_questions:
-            row_num += 1
-            ws.write(row_num, 0, question.get_code(), sheet_style)
-            ws.write(row_num, 1, strip_tags(question.name), sheet_style)
-            ws.write(row_num, 2, question.get_upload_type_display(), sheet_style)
-            ws.write(row_num, 3, strip_tags(question.notes or ''), sheet_style)
+    def get(self, request, *args, **kwargs):
+        responses = SurveyResponse.objects.filter(pk=self.survey_response.pk)
+        filename = '{} - {}'.format(self.survey_response.organisation, self.survey.name)
+        return self.export(survey_response_rows(responses), filename)
 
-            for col_num in range(4, 7):
-                ws.write(row_num, col_num, '', sheet_style)
 
-        base_width = ws.col(1).width  # 2962
-        ws.col(1).width = base_width * 3
-        ws.col(3).width = base_width * 2
-        ws.col(5).width = base_width * 3
+class ExportSurveyResponsesView(
+    LoginRequiredMixin,
+    UserPassesTestMixin,
+    ExportMixin,
+    View,
+):
+    """Export the latest response of every organisation the user can view for a survey."""
+    def test_func(self):
+        return has_role(self.request.user, ['admin', 'manager', 'user'])
 
-        wb.save(response)
-        return response
+    def get(self, request, *args, **kwargs):
+        survey = get_object_or_404(Survey, pk=kwargs['pk'])
+        responses = SurveyResponse.objects.viewable_by(request.user).filter(
+            survey=survey,
+        )
+        responses = SurveyResponse.objects.filter(
+            pk__in=responses.values('pk'),
+        ).latest_per_survey()
+        return self.export(survey_response_rows(responses), survey.name)
+
+
+class ExportJobCreateView(LoginRequiredMixin, View):
+    """
+    Queue an export to run in the background.
+
+    Replies with the url to poll for the job's status, see `ExportJobStatusView`.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        form = ExportJobForm(request.user, data=request.POST)
+        if not form.is_valid():
+            errors = {
+                field: list(field_errors)
+                for field, field_errors in form.errors.items()
+            }
+            return JsonResponse({'errors': errors}, status=400)
+
+        job = form.save()
+        transaction.on_commit(lambda: run_export_job.delay(job.pk))
+        return JsonResponse(
+            {'id': job.pk, 'status_url': job.get_status_url()},
+            status=202,
+        )
+
+
+class ExportJobStatusView(LoginRequiredMixin, View):
+    """Report the progress of one of the user's export jobs."""
+    def get(self, request, *args, **kwargs):
+        job = get_object_or_404(ExportJob, pk=kwargs['pk'], user=request.user)
+        done = job.status == ExportJob.STATUS_DONE
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress,
+            'url': job.file.url if done and job.file else None,
+            'error': job.error,
+        })
@@ -2,9 +2,12 @@ from copy import deepcopy
 
 from countries.models import Country
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.utils.translation import ugettext_lazy as _
 from orderable.admin import OrderableAdmin
 from user_management.models.admin import UserAdmin as BaseUserAdmin
 
+from surveys.models import Survey
 from users.models import Invitation, Organisation, OrganisationType, User
 
 
@@ -45,6 +48,22 @@ class InvitationAdmin(admin.ModelAdmin):
     list_filter = ('grantor', 'grantee', 'survey', 'accepted')
 
 
+class OrganisationChangeList(ChangeList):
+    def get_results(self, request):
+        """Load the latest assessment progress of the whole page in one go."""
+        super().get_results(request)
+
+        surveys = Survey.objects.filter(is_active=True)
+        progress = surveys.latest_response_progress(self.result_list)
+
+        for organisation in self.result_list:
+            organisation.assessment_progress = [
+                (survey, progress[organisation.pk, survey.pk].progress)
+                for survey in surveys
+                if (organisation.pk, survey.pk) in progress
+            ]
+
+
 class OrganisationAdmin(admin.ModelAdmin):
     list_display = (
         'legal_name',
@@ -52,6 +71,7 @@ class OrganisationAdmin(admin.ModelAdmin):
         'parent_organisation',
         'phone_number',
         'last_updated',
+        'get_assessment_progress',
     )
     list_filter = ('types', 'country')
     search_fields = (
@@ -69,6 +89,17 @@ class OrganisationAdmin(admin.ModelAdmin):
     filter_horizontal = ('types',)
     readonly_fields = ['last_updated']
 
+    def get_changelist(self, request, **kwargs):
+        return OrganisationChangeList
+
+    def get_assessment_progress(self, obj):
+        progress = getattr(obj, 'assessment_progress', [])
+        return ', '.join(
+            '{}: {}%'.format(survey, survey_progress['percentage'])
+            for survey, survey_progress in progress
+        ) or '-'
+    get_assessment_progress.short_description = _('assessment progress')
+
 
 class CountryAdmin(admin.ModelAdmin):
     list_display = ('name', 'code')
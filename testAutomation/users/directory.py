@@ -0,0 +1,52 @@
+"""
+Cached counts of organisations in the directory, in total and by type.
+
+The counts are kept in the Django cache until an organisation is added or removed or
+the types of one change (see `users.signals`).
+"""
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import models
+
+
+COUNTS_CACHE_KEY = 'users:directory:counts'
+COUNTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def build_counts():
+    from users.models import Organisation, OrganisationType
+
+    org_types = OrganisationType.objects.annotate(
+        value=models.Count('organisation'),
+    ).values('pk', 'name', 'value')
+    return {
+        'total': Organisation.objects.count(),
+        'types': list(org_types),
+    }
+
+
+def get_counts():
+    counts = cache.get(COUNTS_CACHE_KEY)
+    if counts is None:
+        counts = build_counts()
+        cache.set(COUNTS_CACHE_KEY, counts, COUNTS_CACHE_TIMEOUT)
+    return counts
+
+
+def get_sidebar():
+    """Return the directory sidebar: every organisation, then each type in order."""
+    counts = get_counts()
+    sidebar = OrderedDict({'total': {
+        'name': 'All',
+        'value': counts['total'],
+    }})
+    sidebar.update({
+        org_type['pk']: dict(org_type)
+        for org_type in counts['types']
+    })
+    return sidebar
+
+
+def invalidate():
+    cache.delete(COUNTS_CACHE_KEY)
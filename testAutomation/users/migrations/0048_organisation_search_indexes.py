@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# `icontains` lookups are `UPPER("column"::text) LIKE UPPER(%s)` on Postgres, so
+# trigram indexes on the same expression let the directory search use them.
+SEARCH_FIELDS = ('legal_name', 'known_as', 'acronym', 'city', 'province')
+CREATE_INDEX = '''
+    CREATE INDEX "users_organisation_{field}_trgm"
+        ON "users_organisation"
+     USING gin (UPPER("{field}"::text) gin_trgm_ops)
+'''
+DROP_INDEX = 'DROP INDEX "users_organisation_{field}_trgm"'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0047_org_last_updated_auto_now'),
+    ]
+
+    operations = [TrigramExtension()] + [
+        migrations.RunSQL(
+            CREATE_INDEX.format(field=field),
+            DROP_INDEX.format(field=field),
+        )
+        for field in SEARCH_FIELDS
+    ]
@@ -5,8 +5,10 @@ from django.contrib.auth.tokens import default_token_generator
 from django.contrib.postgres.fields import CIEmailField
 from django.contrib.sites.models import Site
 from django.core import signing
+from django.core.mail import EmailMessage, get_connection
 from django.core.validators import RegexValidator
 from django.db import models
+from django.template.loader import get_template
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.functional import cached_property
@@ -16,12 +18,10 @@ from django.utils.translation import ugettext_lazy as _
 from incuna_mail import send
 from orderable.models import Orderable
 
-from rolepermissions.checkers import has_role
-from rolepermissions.roles import get_user_roles
-
-from user_management.models.mixins import VerifyEmailMixin
+from user_management.models.mixins import VerifyEmailManager, VerifyEmailMixin
 
 from surveys.models import get_level_name, LEVEL_CHOICES, Survey
+from . import roles
 
 
 def get_invitation_status(level):
@@ -36,6 +36,30 @@ class OrganisationType(Orderable):
         return self.name
 
 
+class OrganisationQueryset(models.QuerySet):
+    SEARCH_FIELDS = ('legal_name', 'known_as', 'acronym', 'city', 'province')
+
+    def search(self, query):
+        """
+        Return the organisations matching every word of the query by name, location,
+        type or country.
+
+        The name and location lookups use the trigram indexes of the directory, and
+        types and countries are matched with subqueries so no row is repeated.
+        """
+        queryset = self
+        for word in query.split():
+            condition = models.Q(
+                pk__in=Organisation.types.through.objects.filter(
+                    organisationtype__name__icontains=word,
+                ).values('organisation_id'),
+            ) | models.Q(country__name__icontains=word)
+            for field in self.SEARCH_FIELDS:
+                condition |= models.Q(**{field + '__icontains': word})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
 class Organisation(models.Model):
     SIZE_CHOICES = (
         ('0-10', '0 - 10'),
@@ -170,6 +194,8 @@ class Organisation(models.Model):
     privacy_acceptance_date = models.DateTimeField(default=timezone.now)
     last_updated = models.DateTimeField(auto_now=True)
 
+    objects = OrganisationQueryset.as_manager()
+
     class Meta:
         ordering = ('legal_name',)
 
@@ -177,18 +203,38 @@ class Organisation(models.Model):
         return self.legal_name
 
     @cached_property
+    def entitlement(self):
+        """The organisation's subscriptions and invites, from the cache if possible."""
+        from subscriptions.entitlements import get_entitlement
+        return get_entitlement(self.pk)
+
+    @property
     def active_subscription(self):
-        from subscriptions.models import Subscription
-        return Subscription.objects.active_for_organisation(self)
+        return self.entitlement.active_subscription
 
-    @cached_property
+    @property
     def latest_subscription(self):
-        from subscriptions.models import Subscription
-        return Subscription.objects.latest_for_organisation(self)
+        return self.entitlement.latest_subscription
 
-    @cached_property
+    @property
     def remaining_invites(self):
-        return Invitation.objects.get_remaining_invites(self)
+        return self.entitlement.remaining_invites
+
+    @property
+    def pending_purchases(self):
+        return self.entitlement.pending_purchases
+
+
+class UserQueryset(models.QuerySet):
+    def with_role(self, *role_names):
+        """
+        Return the users with any of these roles.
+
+        Superusers are included, as `has_role` is always true for them.
+        """
+        return self.filter(
+            models.Q(groups__name__in=role_names) | models.Q(is_superuser=True),
+        ).distinct()
 
 
 class User(PermissionsMixin, VerifyEmailMixin, AbstractBaseUser):
@@ -207,11 +253,13 @@ class User(PermissionsMixin, VerifyEmailMixin, AbstractBaseUser):
     job_role = models.CharField(max_length=255, default='')
     organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE)
 
+    objects = VerifyEmailManager.from_queryset(UserQueryset)()
+
     def send_welcome_invite(self, token_generator=default_token_generator):
         site = Site.objects.get_current()
         subject = 'Welcome to the Global Grant Community'
         user = self
-        user_role = get_user_roles(user)[0].get_name()
+        user_role = roles.get_role(user)
 
         context = {
             'site': site,
@@ -315,31 +363,66 @@ class Invitation(models.Model):
 
         return False
 
-    def send_invites(self, token_generator=default_token_generator):
-        users = User.objects.filter(organisation=self.grantee)
-        site = Site.objects.get_current()
-        subject = 'Invitation to submit assessment'
+    def get_invite_messages(self):
+        """
+        Return an invitation email to each admin and manager of the grantee.
 
-        grantor_name = self.grantor.legal_name
+        The recipients are found with one query and the template is only loaded once.
+        """
+        users = User.objects.filter(organisation=self.grantee_id).with_role(
+            'admin',
+            'manager',
+        )
+        site = Site.objects.get_current()
+        template = get_template('surveys/emails/invitation.txt')
+        context = {
+            'survey_level': get_level_name(self.level),
+            'survey_name': self.survey.name,
+            'grantor_name': self.grantor.legal_name,
+            'site_domain': site.domain,
+            'survey_url': '',
+            'site_name': site.name,
+        }
 
+        messages = []
         for user in users:
-            if has_role(user, ['admin', 'manager']):
-                context = {
-                    'user_name': user.name,
-                    'survey_level': get_level_name(self.level),
-                    'survey_name': self.survey.name,
-                    'grantor_name': grantor_name,
-                    'email': user.email,
-                    'site_domain': site.domain,
-                    'survey_url': '',
-                    'site_name': site.name,
-                }
-                send(
-                    to=user.email,
-                    subject=subject,
-                    template_name='surveys/emails/invitation.txt',
-                    context=context,
-                )
+            context.update({
+                'user_name': user.name,
+                'email': user.email,
+            })
+            messages.append(EmailMessage(
+                subject='Invitation to submit assessment',
+                body=template.render(context),
+                to=[user.email],
+            ))
+        return messages
+
+    def send_invites(self, connection=None, sent=None):
+        """
+        Send the invitation emails to the grantee over a single connection.
+
+        The address of each email is added to the `sent` list once it's sent and
+        addresses already in it are skipped, so a failed send can be resumed.
+        """
+        if sent is None:
+            sent = []
+        messages = [
+            message for message in self.get_invite_messages()
+            if message.to[0] not in sent
+        ]
+        if not messages:
+            return 0
+
+        connection = connection or get_connection()
+        opened = connection.open()
+        try:
+            for message in messages:
+                connection.send_messages([message])
+                sent.append(message.to[0])
+        finally:
+            if opened:
+                connection.close()
+        return len(messages)
 
     def send_invites_unregistered(self, token_generator=default_token_generator):
         site = Site.objects.get_current()
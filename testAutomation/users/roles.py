@@ -0,0 +1,96 @@
+"""
+Cached lookups of the rolepermissions roles of users.
+
+A user's roles are the names of their rolepermissions groups. They are loaded with
+one query, kept on the user object for the rest of the request and in the Django
+cache until the user's groups change (see `users.signals`).
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rolepermissions.roles import RolesManager
+
+
+ROLES_CACHE_KEY = 'users:roles:{user_id}'
+ROLES_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Most privileged first, see `get_role`.
+ROLE_ORDER = ('admin', 'manager', 'user')
+
+
+def _get_role_names():
+    return set(RolesManager.get_roles_names())
+
+
+def get_cache_key(user_id):
+    return ROLES_CACHE_KEY.format(user_id=user_id)
+
+
+def get_roles(user):
+    """Return the frozenset of the names of a user's roles."""
+    if user.is_anonymous:
+        return frozenset()
+
+    roles = getattr(user, '_role_names', None)
+    if roles is not None:
+        return roles
+
+    key = get_cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user.groups.filter(
+            name__in=_get_role_names(),
+        ).values_list('name', flat=True))
+        cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+    user._role_names = roles
+    return roles
+
+
+def load_roles(users):
+    """
+    Load the roles of many users with one query and keep them on each user.
+
+    Return the users as a list.
+    """
+    users = list(users)
+    if not users:
+        return users
+
+    through = get_user_model().groups.through
+    memberships = through.objects.filter(
+        user_id__in=[user.pk for user in users],
+        group__name__in=_get_role_names(),
+    ).values_list('user_id', 'group__name')
+    roles = {}
+    for user_id, name in memberships:
+        roles.setdefault(user_id, set()).add(name)
+
+    for user in users:
+        user._role_names = frozenset(roles.get(user.pk, ()))
+    cache.set_many(
+        {get_cache_key(user.pk): user._role_names for user in users},
+        ROLES_CACHE_TIMEOUT,
+    )
+    return users
+
+
+def get_role(user):
+    """Return the name of the most privileged role of a user or None."""
+    roles = get_roles(user)
+    for role in ROLE_ORDER:
+        if role in roles:
+            return role
+    return next(iter(sorted(roles)), None)
+
+
+def has_role(user, roles):
+    """A cached version of `rolepermissions.checkers.has_role`."""
+    if user and user.is_superuser:
+        return True
+    if isinstance(roles, str):
+        roles = [roles]
+    return bool(get_roles(user) & set(roles))
+
+
+def invalidate(user_ids):
+    """Forget the cached roles of these users."""
+    cache.delete_many([get_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from users import directory, roles
+from users.models import Organisation, OrganisationType, User
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Forget cached roles when `assign_role`, `remove_role` or `clear_roles` run."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.__dict__.pop('_role_names', None)
+            roles.invalidate([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        roles.invalidate(pk_set)
+    elif action == 'pre_clear':
+        # The group's users aren't known any more once it is cleared.
+        roles.invalidate(instance.user_set.values_list('pk', flat=True))
+
+
+def _invalidate_directory():
+    directory.invalidate()
+    transaction.on_commit(directory.invalidate)
+
+
+@receiver(post_save, sender=Organisation)
+def invalidate_directory_organisation(sender, instance, created, **kwargs):
+    if created:
+        _invalidate_directory()
+
+
+@receiver(post_delete, sender=Organisation)
+@receiver([post_save, post_delete], sender=OrganisationType)
+def invalidate_directory_counts(sender, instance, **kwargs):
+    _invalidate_directory()
+
+
+@receiver(m2m_changed, sender=Organisation.types.through)
+def invalidate_directory_types(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _invalidate_directory()
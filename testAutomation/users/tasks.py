@@ -0,0 +1,37 @@
+from __future__ import absolute_import, unicode_literals
+
+from smtplib import SMTPException
+
+from celery import shared_task
+
+from users.models import Invitation
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_invitation_emails(self, invitation_id, registered=True, sent=()):
+    """
+    Send the emails of an invitation, either to the admins and managers of the
+    grantee organisation or to the email address of an unregistered grantee.
+
+    Sending is retried when the mail server can't be reached. The retry is passed the
+    addresses already `sent`, so they aren't sent again.
+    """
+    try:
+        invitation = Invitation.objects.select_related('grantor', 'survey').get(
+            pk=invitation_id,
+        )
+    except Invitation.DoesNotExist:
+        return
+
+    sent = list(sent)
+    try:
+        if registered:
+            invitation.send_invites(sent=sent)
+        else:
+            invitation.send_invites_unregistered()
+    except (SMTPException, OSError) as e:
+        raise self.retry(
+            exc=e,
+            args=(invitation_id, registered),
+            kwargs={'sent': sent},
+        )
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from .factories import OrganisationFactory
+from .. import directory
+from ..models import Organisation, OrganisationType
+
+
+@patch('users.signals.transaction.on_commit', lambda func: func())
+class TestDirectoryCounts(TestCase):
+    def setUp(self):
+        self.org_type = OrganisationType.objects.first()
+        self.organisation = OrganisationFactory.create()
+        self.organisation.types.add(self.org_type)
+        directory.invalidate()
+
+    def test_build(self):
+        """Building the counts takes two queries, one for the total and types each."""
+        with self.assertNumQueries(2):
+            sidebar = directory.get_sidebar()
+
+        self.assertEqual(sidebar['total'], {
+            'name': 'All',
+            'value': Organisation.objects.count(),
+        })
+        self.assertEqual(sidebar[self.org_type.pk]['name'], self.org_type.name)
+        self.assertEqual(
+            sidebar[self.org_type.pk]['value'],
+            self.org_type.organisation_set.count(),
+        )
+        self.assertEqual(list(sidebar)[1], self.org_type.pk)
+
+    def test_cached(self):
+        directory.get_sidebar()
+        with self.assertNumQueries(0):
+            directory.get_sidebar()
+
+    def test_not_invalidated_by_update(self):
+        directory.get_counts()
+        self.organisation.city = 'Nairobi'
+        self.organisation.save()
+        with self.assertNumQueries(0):
+            directory.get_counts()
+
+    def test_invalidated_by_organisation(self):
+        total = directory.get_counts()['total']
+        OrganisationFactory.create()
+        self.assertEqual(directory.get_counts()['total'], total + 1)
+
+        self.organisation.delete()
+        self.assertEqual(directory.get_counts()['total'], total)
+
+    def test_invalidated_by_types(self):
+        value = directory.get_sidebar()[self.org_type.pk]['value']
+        self.organisation.types.remove(self.org_type)
+        self.assertEqual(directory.get_sidebar()[self.org_type.pk]['value'], value - 1)
@@ -1,5 +1,7 @@
 from datetime import date, timedelta
 
+from countries.models import Country
+from django.contrib.sites.models import Site
 from django.core import mail
 from django.test import TestCase
 from django.utils import timezone
@@ -8,7 +10,13 @@ from rolepermissions.roles import assign_role
 from surveys.tests.factories import SurveyResponseFactory
 
 from .factories import InvitationFactory, OrganisationFactory, UserFactory
-from ..models import get_invitation_status, Invitation, OrganisationType
+from ..models import (
+    get_invitation_status,
+    Invitation,
+    Organisation,
+    OrganisationType,
+    User,
+)
 
 
 class TestOrganisationType(TestCase):
@@ -23,6 +31,44 @@ class TestOrganisation(TestCase):
         self.assertEqual(str(organisation), organisation.legal_name)
 
 
+class TestOrganisationQueryset(TestCase):
+    def test_search(self):
+        org_type = OrganisationType.objects.first()
+        by_name = OrganisationFactory.create(legal_name='Green Fields Trust')
+        by_acronym = OrganisationFactory.create(acronym='GFT', city='Nairobi')
+        by_type = OrganisationFactory.create(city='Mombasa')
+        by_type.types.add(org_type)
+        by_country = OrganisationFactory.create(
+            country=Country.objects.get(code='KE'),
+        )
+        OrganisationFactory.create(city='London')
+
+        search = Organisation.objects.search
+        self.assertSequenceEqual(search('green fields'), [by_name])
+        self.assertSequenceEqual(search('gft'), [by_acronym])
+        self.assertSequenceEqual(search(org_type.name), [by_type])
+        self.assertIn(by_country, search('kenya'))
+        self.assertSequenceEqual(search('gft nairobi'), [by_acronym])
+        self.assertSequenceEqual(search('gft mombasa'), [])
+
+
+class TestUserQueryset(TestCase):
+    def test_with_role(self):
+        admin = UserFactory.create()
+        assign_role(admin, 'admin')
+        manager = UserFactory.create()
+        assign_role(manager, 'manager')
+        assign_role(manager, 'user')
+        superuser = UserFactory.create(is_superuser=True)
+        user = UserFactory.create()
+        assign_role(user, 'user')
+
+        self.assertEqual(
+            set(User.objects.with_role('admin', 'manager')),
+            {admin, manager, superuser},
+        )
+
+
 class TestInvitation(TestCase):
     def test_str(self):
         invitation = InvitationFactory.create()
@@ -70,6 +116,54 @@ class TestInvitation(TestCase):
         self.assertIn(admin.email, to_addresses)
         self.assertIn(manager.email, to_addresses)
 
+    def test_get_invite_messages(self):
+        manager = UserFactory.create()
+        assign_role(manager, 'manager')
+        assign_role(manager, 'admin')
+        superuser = UserFactory.create(
+            organisation=manager.organisation,
+            is_superuser=True,
+        )
+        UserFactory.create(organisation=manager.organisation)
+        invitation = InvitationFactory.create(grantee=manager.organisation)
+        invitation = Invitation.objects.select_related('grantor', 'survey').get(
+            pk=invitation.pk,
+        )
+
+        Site.objects.get_current()
+
+        """
+        Select the recipients, the current site is cached.
+        """
+        with self.assertNumQueries(1):
+            messages = invitation.get_invite_messages()
+
+        self.assertEqual(
+            sorted(message.to[0] for message in messages),
+            sorted([manager.email, superuser.email]),
+        )
+        self.assertIn(manager.name, next(
+            message.body for message in messages if message.to == [manager.email]
+        ))
+
+    def test_send_invites_sent(self):
+        """Addresses in `sent` are skipped and the ones sent are added to it."""
+        admin = UserFactory.create()
+        other_admin = UserFactory.create(organisation=admin.organisation)
+        assign_role(admin, 'admin')
+        assign_role(other_admin, 'admin')
+        invitation = InvitationFactory.create(grantee=admin.organisation)
+
+        sent = [admin.email]
+        self.assertEqual(invitation.send_invites(sent=sent), 1)
+        self.assertEqual(mail.outbox[0].to, [other_admin.email])
+        self.assertEqual(sent, [admin.email, other_admin.email])
+
+    def test_send_invites_no_recipients(self):
+        invitation = InvitationFactory.create()
+        self.assertEqual(invitation.send_invites(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
     def test_send_invites_unregistered(self):
         invitation = InvitationFactory.create(
             grantee_email='grantee@new-organisation.com',
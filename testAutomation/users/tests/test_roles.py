@@ -0,0 +1,75 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+from rolepermissions.roles import assign_role, clear_roles, remove_role
+
+from .factories import UserFactory
+from .. import roles
+from ..models import User
+
+
+class TestRoles(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        assign_role(self.user, 'manager')
+
+    def test_get_roles(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(roles.get_roles(self.user), {'manager'})
+
+    def test_get_roles_cached(self):
+        roles.get_roles(self.user)
+        user = User.objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(roles.get_roles(user), {'manager'})
+            self.assertTrue(roles.has_role(user, ['admin', 'manager']))
+
+    def test_get_roles_anonymous(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(roles.get_roles(AnonymousUser()), set())
+
+    def test_assign_role(self):
+        roles.get_roles(self.user)
+        assign_role(self.user, 'admin')
+
+        self.assertEqual(roles.get_roles(self.user), {'admin', 'manager'})
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(roles.get_roles(user), {'admin', 'manager'})
+
+    def test_remove_role(self):
+        roles.get_roles(self.user)
+        remove_role(self.user, 'manager')
+        self.assertEqual(roles.get_roles(self.user), set())
+
+    def test_clear_roles(self):
+        roles.get_roles(self.user)
+        clear_roles(self.user)
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(roles.get_roles(user), set())
+
+    def test_load_roles(self):
+        admin = UserFactory.create()
+        assign_role(admin, 'admin')
+        nobody = UserFactory.create()
+        users = User.objects.filter(pk__in=[self.user.pk, admin.pk, nobody.pk])
+
+        with self.assertNumQueries(2):
+            users = roles.load_roles(users)
+            self.assertEqual(
+                {user.pk: roles.get_role(user) for user in users},
+                {self.user.pk: 'manager', admin.pk: 'admin', nobody.pk: None},
+            )
+
+    def test_get_role(self):
+        assign_role(self.user, 'admin')
+        self.assertEqual(roles.get_role(self.user), 'admin')
+
+    def test_has_role(self):
+        self.assertTrue(roles.has_role(self.user, 'manager'))
+        self.assertFalse(roles.has_role(self.user, ['admin', 'user']))
+
+    def test_has_role_superuser(self):
+        user = UserFactory.create(is_superuser=True)
+        with self.assertNumQueries(0):
+            self.assertTrue(roles.has_role(user, ['admin']))
@@ -0,0 +1,68 @@
+from smtplib import SMTPException
+from unittest.mock import patch
+
+from celery.exceptions import Retry
+from django.core import mail
+from django.test import TestCase
+from rolepermissions.roles import assign_role
+
+from .factories import InvitationFactory, UserFactory
+from ..tasks import send_invitation_emails
+
+
+class TestSendInvitationEmails(TestCase):
+    def test_registered(self):
+        admin = UserFactory.create()
+        assign_role(admin, 'admin')
+        invitation = InvitationFactory.create(grantee=admin.organisation)
+
+        send_invitation_emails(invitation.pk)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [admin.email])
+
+    def test_unregistered(self):
+        invitation = InvitationFactory.create(
+            grantee=None,
+            grantee_email='grantee@new-organisation.com',
+        )
+
+        send_invitation_emails(invitation.pk, registered=False)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [invitation.grantee_email])
+
+    def test_deleted(self):
+        send_invitation_emails(0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @patch('users.models.Invitation.send_invites', side_effect=SMTPException)
+    def test_retry(self, send_invites):
+        invitation = InvitationFactory.create()
+        with patch.object(send_invitation_emails, 'retry', side_effect=Retry) as retry:
+            with self.assertRaises(Retry):
+                send_invitation_emails(invitation.pk)
+        self.assertIsInstance(retry.call_args[1]['exc'], SMTPException)
+
+    def test_retry_sent(self):
+        """A retry doesn't send the emails sent before the failure again."""
+        invitation = InvitationFactory.create()
+        admins = UserFactory.create_batch(2, organisation=invitation.grantee)
+        for admin in admins:
+            assign_role(admin, 'admin')
+
+        send_messages = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        retry_patch = patch.object(send_invitation_emails, 'retry', side_effect=Retry)
+        with patch(send_messages, side_effect=[1, SMTPException]), retry_patch as retry:
+            with self.assertRaises(Retry):
+                send_invitation_emails(invitation.pk)
+        sent = retry.call_args[1]['kwargs']['sent']
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(retry.call_args[1]['args'], (invitation.pk, True))
+
+        send_invitation_emails(invitation.pk, True, sent=sent)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            sorted(sent + mail.outbox[0].to),
+            sorted(admin.email for admin in admins),
+        )
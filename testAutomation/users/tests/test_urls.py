@@ -18,3 +18,10 @@ class TestUsers(URLTestCase):
             expected_url='/login/',
             url_name='login',
         )
+
+    def test_directory_results(self):
+        self.assert_url_matches_view(
+            view=views.DirectoryResultsView,
+            expected_url='/directory/results/',
+            url_name='directory-results',
+        )
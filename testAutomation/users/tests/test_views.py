@@ -1,4 +1,6 @@
 import os
+from unittest.mock import patch
+from urllib.parse import urlencode
 
 from countries.models import Country
 from django.core import mail, signing
@@ -10,8 +12,10 @@ from rolepermissions.checkers import has_role
 from rolepermissions.roles import assign_role
 
 from core.tests.utils import AnonymouseTestMixin, RequestTestCase
-from .factories import InvitationFactory, UserFactory
-from .. import views
+from subscriptions import entitlements
+from subscriptions.entitlements import get_entitlement
+from .factories import InvitationFactory, OrganisationFactory, UserFactory
+from .. import directory, views
 from ..models import Organisation, OrganisationType, User
 
 
@@ -717,6 +721,9 @@ class TestOrganizationDetailView(AnonymouseTestMixin, RequestTestCase):
     def test_get_queries(self):
         assign_role(self.user, 'user')
         request = self.create_request(user=self.user)
+        # The entitlement and directory counts are cached between requests.
+        get_entitlement(self.user.organisation_id)
+        directory.get_counts()
         """
         SELECT FROM "users_organisation"
          WHERE "users_organisation"."id" = 2988
@@ -730,19 +737,6 @@ class TestOrganizationDetailView(AnonymouseTestMixin, RequestTestCase):
             AND "auth_group"."name" IN ('manager', 'admin', 'user')
            )
          ORDER BY "auth_group"."name" ASC
-        SELECT COUNT(*) AS "__count"
-          FROM "users_organisation"
-        SELECT
-            "users_organisationtype"."id",
-            "users_organisationtype"."name",
-            COUNT("users_organisation_types"."organisation_id") AS "value"
-          FROM "users_organisationtype"
-          LEFT OUTER
-          JOIN "users_organisation_types"
-            ON ("users_organisationtype"."id" =
-                "users_organisation_types"."organisationtype_id")
-         GROUP BY "users_organisationtype"."id"
-         ORDER BY "users_organisationtype"."sort_order" ASC
         SELECT FROM "page_page"
          WHERE (
            "page_page"."active" = true
@@ -762,17 +756,8 @@ class TestOrganizationDetailView(AnonymouseTestMixin, RequestTestCase):
             ON ("surveys_surveyresponse"."survey_id" = "surveys_survey"."id")
          WHERE "surveys_surveyresponse"."organisation_id" = 2988
          ORDER BY "surveys_surveyresponse"."created" ASC
-        SELECT "subscriptions_subscription"."id", "subscriptions_subscription"."order_id",
-          "subscriptions_subscription"."start_date",
-          "subscriptions_subscription"."end_date", "subscriptions_subscription"."price",
-          "subscriptions_subscription"."created"
-          FROM "subscriptions_subscription" INNER JOIN "subscriptions_order" ON (
-            "subscriptions_subscription"."order_id" = "subscriptions_order"."id")
-          WHERE ("subscriptions_order"."organisation_id" = 248648
-          AND NOT ("subscriptions_order"."status" = 'canceled'))
-          ORDER BY "subscriptions_subscription"."start_date" DESC LIMIT 1
         """
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(5):
             response = self.view(request, pk=self.user.organisation.id)
             response.render()
         self.assertEqual(response.status_code, 200)
@@ -800,6 +785,9 @@ class TestDirectoryView(AnonymouseTestMixin, RequestTestCase):
     def test_get_queries(self):
         assign_role(self.user, 'user')
         request = self.create_request(user=self.user)
+        # The entitlement and directory counts are cached between requests.
+        get_entitlement(self.user.organisation_id)
+        directory.get_counts()
         """
         SELECT "auth_group"."id", "auth_group"."name"
           FROM "auth_group"
@@ -811,19 +799,6 @@ class TestDirectoryView(AnonymouseTestMixin, RequestTestCase):
            AND "auth_group"."name" IN ('admin', 'user', 'manager')
                )
          ORDER BY "auth_group"."name" ASC
-        SELECT COUNT(*) AS "__count"
-          FROM "users_organisation"
-        SELECT
-            "users_organisationtype"."id",
-            "users_organisationtype"."name",
-            COUNT("users_organisation_types"."organisation_id") AS "value"
-          FROM "users_organisationtype"
-          LEFT OUTER
-          JOIN "users_organisation_types"
-            ON ("users_organisationtype"."id"
-                = "users_organisation_types"."organisationtype_id")
-         GROUP BY "users_organisationtype"."id"
-         ORDER BY "users_organisationtype"."sort_order" ASC
         SELECT FROM "page_page"
          WHERE (
                    "page_page"."active" = true
@@ -831,6 +806,11 @@ class TestDirectoryView(AnonymouseTestMixin, RequestTestCase):
                )
          ORDER BY "_url_length" DESC LIMIT 1
         SELECT FROM "users_organisation"
+          LEFT OUTER
+          JOIN "countries_country"
+            ON
+         ORDER BY "users_organisation"."legal_name" ASC
+         LIMIT 51
         SELECT FROM "users_organisationtype"
          INNER
           JOIN "users_organisation_types"
@@ -838,17 +818,99 @@ class TestDirectoryView(AnonymouseTestMixin, RequestTestCase):
             = "users_organisation_types"."organisationtype_id")
          WHERE "users_organisation_types"."organisation_id" IN (3019)
          ORDER BY "users_organisationtype"."sort_order" ASC
-        SELECT "subscriptions_subscription"."id", "subscriptions_subscription"."order_id",
-          "subscriptions_subscription"."start_date",
-          "subscriptions_subscription"."end_date", "subscriptions_subscription"."price",
-          "subscriptions_subscription"."created"
-          FROM "subscriptions_subscription" INNER JOIN "subscriptions_order" ON (
-            "subscriptions_subscription"."order_id" = "subscriptions_order"."id")
-          WHERE ("subscriptions_order"."organisation_id" = 248648
-          AND NOT ("subscriptions_order"."status" = 'canceled'))
-          ORDER BY "subscriptions_subscription"."start_date" DESC LIMIT 1
         """
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(4):
             response = self.view(request, pk=self.user.organisation.id)
             response.render()
         self.assertEqual(response.status_code, 200)
+
+    def test_get_queries_entitlement_not_cached(self):
+        assign_role(self.user, 'user')
+        request = self.create_request(user=self.user)
+        directory.get_counts()
+        entitlements.invalidate(self.user.organisation_id)
+        """
+        The queries above, and the orders of the organisation with their
+        subscriptions, purchases and invitations used to build its entitlement.
+        """
+        with self.assertNumQueries(5):
+            response = self.view(request)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_budget(self):
+        assign_role(self.user, 'user')
+        OrganisationFactory.create_batch(3)
+        request = self.create_request(user=self.user)
+        get_entitlement(self.user.organisation_id)
+        directory.get_counts()
+        response = self.assertWithinQueryBudget(self.view, request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_search(self):
+        match = OrganisationFactory.create(legal_name='Green Fields Trust')
+        request = self.create_request(user=self.user, data={'q': 'fields'})
+        response = self.view(request)
+        self.assertSequenceEqual(response.context_data['organisation_list'], [match])
+        self.assertEqual(response.context_data['query'], 'fields')
+
+    def test_get_type(self):
+        org_type = OrganisationType.objects.first()
+        self.user.organisation.types.add(org_type)
+        request = self.create_request(user=self.user, data={'type': org_type.pk})
+        response = self.view(request)
+        self.assertSequenceEqual(
+            response.context_data['organisation_list'],
+            [self.user.organisation],
+        )
+
+    def test_get_letter(self):
+        match = OrganisationFactory.create(legal_name='Zebra Aid')
+        request = self.create_request(user=self.user, data={'letter': 'z'})
+        response = self.view(request)
+        self.assertSequenceEqual(response.context_data['organisation_list'], [match])
+
+    @patch('users.views.DirectorySearchMixin.page_size', 2)
+    def test_get_pages(self):
+        organisations = sorted(
+            OrganisationFactory.create_batch(2) + [self.user.organisation],
+            key=lambda organisation: organisation.legal_name,
+        )
+        request = self.create_request(user=self.user)
+        response = self.view(request)
+        context = response.context_data
+        self.assertSequenceEqual(context['organisation_list'], organisations[:2])
+        self.assertEqual(
+            context['next_url'],
+            '{}?{}'.format(
+                reverse('directory-results'),
+                urlencode({'after': organisations[1].legal_name}),
+            ),
+        )
+
+        request = self.create_request_ajax(
+            user=self.user,
+            data={'after': organisations[1].legal_name},
+        )
+        response = views.DirectoryResultsView.as_view()(request)
+        context = response.context_data
+        self.assertSequenceEqual(context['organisation_list'], organisations[2:])
+        self.assertIsNone(context['next_url'])
+
+
+class TestDirectoryResultsView(AnonymouseTestMixin, RequestTestCase):
+    view = views.DirectoryResultsView
+
+    def test_get_not_ajax(self):
+        request = self.create_request()
+        with self.assertRaises(Http404):
+            self.view.as_view()(request)
+
+    def test_get(self):
+        match = OrganisationFactory.create(legal_name='Green Fields Trust')
+        request = self.create_request_ajax(data={'q': 'green'})
+        response = self.view.as_view()(request)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertSequenceEqual(response.context_data['organisation_list'], [match])
+        self.assertIn(match.legal_name, response.content.decode())
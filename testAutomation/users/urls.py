@@ -3,6 +3,7 @@ from django.conf.urls import url
 from .views import (
     AddUserView,
     DeleteUserView,
+    DirectoryResultsView,
     DirectoryView,
     EditOrganizationView,
     EditProfileView,
@@ -19,6 +20,10 @@ urlpatterns = [
     url(r'^organization/$', OrganizationView.as_view(), name='organization'),
     url(r'^organization/adduser/$', AddUserView.as_view(), name='add-user'),
     url(r'^directory/$', DirectoryView.as_view(), name='directory'),
+    url(
+        r'^directory/results/$',
+        DirectoryResultsView.as_view(), name='directory-results'
+    ),
     url(
         r'^directory/(?P<pk>\d+)$',
         OrganizationDetailView.as_view(), name='organization-detail'
@@ -1,11 +1,8 @@
-from collections import OrderedDict
-
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import PasswordChangeView
 from django.core import signing
-from django.core.urlresolvers import reverse_lazy
-from django.db import models
+from django.core.urlresolvers import reverse, reverse_lazy
 from django.shortcuts import redirect
 from django.views.generic import (
     DeleteView,
@@ -15,12 +12,13 @@ from django.views.generic import (
     TemplateView,
     UpdateView
 )
-from rolepermissions.checkers import has_role
-from rolepermissions.roles import assign_role, clear_roles, get_user_roles
+from rolepermissions.roles import assign_role, clear_roles
 
 from core.mixins import AjaxMixin, AppMixin
 from surveys.models import SurveyResponse
-from users.models import Invitation, Organisation, OrganisationType, User
+from users import directory
+from users.models import Invitation, Organisation, User
+from users.roles import get_role, has_role, load_roles
 from .forms import (
     AddUserForm,
     OrganisationForm,
@@ -171,7 +169,8 @@ class OrganizationView(OrganizationMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         users = User.objects.filter(organisation=self.request.user.organisation)
         context.update({
-            'user_list': users,
+            # Load every user's role at once for the `get_permission` filter.
+            'user_list': load_roles(users),
             'current_user': self.request.user,
             'organisation': self.request.user.organisation
         })
@@ -229,10 +228,7 @@ class EditUserView(OrganizationMixin, FetchUserMixin, UpdateView):
         return has_role(self.request.user, ['admin'])
 
     def _get_permission(self, user):
-        try:
-            return get_user_roles(user)[0].get_name()
-        except IndexError:
-            return AddUserForm.USER_TYPE_CHOICES[-1][0]
+        return get_role(user) or AddUserForm.USER_TYPE_CHOICES[-1][0]
 
     def form_invalid(self, form, **kwargs):
         messages.warning(
@@ -320,27 +316,10 @@ class DirectoryMixin(LoginRequiredMixin, AppMixin):
     sidebar_item = 'directory'
     page_title = 'Directory'
 
-    def _get_sidebar(self):
-        org_types = OrganisationType.objects.annotate(
-            value=models.Count('organisation'),
-        ).values('pk', 'name', 'value')
-
-        sidebar = OrderedDict({'total': {
-            'name': 'All',
-            'value': Organisation.objects.count(),
-        }})
-
-        sidebar.update({
-            org_type['pk']: org_type
-            for org_type in org_types
-        })
-
-        return sidebar
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        sidebar = self._get_sidebar()
+        sidebar = directory.get_sidebar()
         context.update({
             'directory_sidebar': sidebar
         })
@@ -348,12 +327,75 @@ class DirectoryMixin(LoginRequiredMixin, AppMixin):
         return context
 
 
-class DirectoryView(DirectoryMixin, ListView):
-    template_name = 'organization/directory.html'
+class DirectorySearchMixin:
+    """
+    List the organisations matching the `q`, `type` and `letter` parameters a page at
+    a time.
+
+    Pages are keyed by the last legal name shown (`after`) rather than an offset, so
+    each one is a single indexed range query however far into the directory it is.
+    """
     model = Organisation
+    context_object_name = 'organisation_list'
+    page_size = 50
 
     def get_queryset(self):
-        return super().get_queryset().prefetch_related('types')
+        queryset = super().get_queryset().select_related('country').prefetch_related(
+            'types',
+        ).order_by('legal_name')
+
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            queryset = queryset.search(query)
+
+        org_type = self.request.GET.get('type', '')
+        if org_type.isdigit():
+            queryset = queryset.filter(types=org_type)
+
+        letter = self.request.GET.get('letter', '')
+        if len(letter) == 1 and letter.isalpha():
+            queryset = queryset.filter(legal_name__istartswith=letter)
+
+        after = self.request.GET.get('after')
+        if after:
+            queryset = queryset.filter(legal_name__gt=after)
+        return queryset
+
+    def get_next_url(self, organisations):
+        params = self.request.GET.copy()
+        params['after'] = organisations[-1].legal_name
+        return '{}?{}'.format(reverse('directory-results'), params.urlencode())
+
+    def get_context_data(self, **kwargs):
+        # One more row than is shown tells if there is a next page.
+        organisations = list(self.object_list[:self.page_size + 1])
+        next_url = None
+        if len(organisations) > self.page_size:
+            organisations = organisations[:self.page_size]
+            next_url = self.get_next_url(organisations)
+
+        kwargs['object_list'] = organisations
+        context = super().get_context_data(**kwargs)
+        context.update({
+            'next_url': next_url,
+            'query': self.request.GET.get('q', ''),
+        })
+        return context
+
+
+class DirectoryView(DirectoryMixin, DirectorySearchMixin, ListView):
+    template_name = 'organization/directory.html'
+    query_budget = 4
+
+
+class DirectoryResultsView(
+    AjaxMixin,
+    LoginRequiredMixin,
+    DirectorySearchMixin,
+    ListView
+):
+    """A page of directory search results for the directory to load with AJAX."""
+    template_name = 'organization/_directory_results.html'
 
 
 class OrganizationDetailView(DirectoryMixin, DetailView):